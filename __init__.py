@@ -1,3 +1 @@
-print('I am in the mint.__init__ file people.')
-
 #__all__ = ['transactions', 'datatools', 'printtools']
@@ -0,0 +1,269 @@
+'''
+Benchmarks for loading and reporting on Mint transaction files.
+
+Synthetic Mint exports are generated with the same columns as a real download, a realistic
+mix of merchants, categories, accounts and labels, credits, credit card payments and hidden
+transactions. Each size is benchmarked in a fresh interpreter so that the load is cold and
+the peak memory is for that size alone.
+
+Every stage is timed and written as one JSON record per line, so that runs can be kept and
+compared:
+    {"rows": 100000, "stage": "load", "seconds": 1.2, "rows_per_second": 83333.3, "peak_rss_mb": 180.5}
+
+Usage:
+    python benchmark.py                        # 10k and 100k rows
+    python benchmark.py --sizes 10k 1m 10m --output results.jsonl
+    python benchmark.py --compare results.jsonl   # exit code 1 if a stage got slower
+'''
+import os
+import io
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import datetime
+import tempfile
+import subprocess
+
+
+SIZES = {'10k': 10000, '100k': 100000, '1m': 1000000, '10m': 10000000}
+DEFAULT_SIZES = ['10k', '100k']
+
+# A stage is a regression when it is this much slower than the baseline.
+REGRESSION_TOLERANCE = 0.25
+
+HEADER = ['Date', 'Description', 'Original Description', 'Amount', 'Transaction Type',
+          'Category', 'Account Name', 'Labels', 'Notes']
+
+# (category, merchants, lowest amount, highest amount, weight)
+DEBITS = [
+    ('Groceries', ['Stop & Shop', 'Whole Foods', 'Trader Joe\'s', 'ShopRite'], 10, 250, 18),
+    ('Restaurants', ['Starbucks', 'Chipotle', 'Panera Bread', 'Olive Garden'], 5, 120, 15),
+    ('Gas & Fuel', ['Shell', 'Exxon', 'Mobil'], 20, 80, 8),
+    ('Shopping', ['Amazon', 'Target', 'Best Buy', 'Home Depot'], 10, 600, 14),
+    ('Utilities', ['PSEG', 'Verizon', 'Comcast'], 40, 300, 4),
+    ('Mortgage & Rent', ['Wells Fargo Home Mortgage'], 1500, 2500, 1),
+    ('Entertainment', ['Netflix', 'Spotify', 'AMC Theatres'], 8, 60, 5),
+    ('Travel', ['Delta', 'Marriott', 'Uber'], 15, 900, 3),
+    ('Doctor', ['CVS Pharmacy', 'Quest Diagnostics'], 10, 300, 3),
+    ('Credit Card Payment', ['Chase Credit Card Payment', 'Amex Payment'], 100, 3000, 3),
+    ('Hide from Budgets & Trends', ['Online Transfer'], 50, 2000, 2),
+]
+CREDITS = [
+    ('Paycheck', ['ACME Corp Payroll'], 2000, 4000, 4),
+    ('Interest Income', ['Savings Interest'], 1, 20, 1),
+    ('Credit Card Payment', ['Payment Thank You'], 100, 3000, 3),
+    ('Transfer', ['Online Transfer'], 50, 2000, 1),
+]
+ACCOUNTS = ['Visa', 'Amex', 'Checking', 'Savings']
+LABELS = ['', '', '', '', '', '', 'Keith', 'Eileen', 'Lake House', 'Keith Split', 'Eileen Split']
+
+# Share of rows that are credits.
+CREDIT_SHARE = 0.12
+
+
+def synthetic_rows(row_count, seed=0, end_date=None, rows_per_day=12):
+    '''
+    Yields row_count rows of a Mint export, newest first the way Mint writes them.
+    The same seed always gives the same rows.
+    '''
+    generator = random.Random(seed)
+    if end_date is None:
+        end_date = datetime.date(2024, 12, 31)
+
+    debit_weights = [weight for *_, weight in DEBITS]
+    credit_weights = [weight for *_, weight in CREDITS]
+    day = end_date
+    for row in range(row_count):
+        if row > 0 and row % rows_per_day == 0:
+            day -= datetime.timedelta(days=1)
+
+        if generator.random() < CREDIT_SHARE:
+            tran_type = 'credit'
+            category, merchants, low, high, _ = generator.choices(CREDITS, credit_weights)[0]
+        else:
+            tran_type = 'debit'
+            category, merchants, low, high, _ = generator.choices(DEBITS, debit_weights)[0]
+        merchant = generator.choice(merchants)
+        amount = round(generator.uniform(low, high), 2)
+        yield ['{0}/{1:02d}/{2}'.format(day.month, day.day, day.year),
+               merchant,
+               merchant.upper() + ' ' + str(generator.randint(1000, 9999)),
+               '{0:.2f}'.format(amount),
+               tran_type,
+               category,
+               generator.choice(ACCOUNTS),
+               generator.choice(LABELS),
+               'reimbursed' if generator.random() < 0.01 else '']
+
+
+def generate(path, row_count, seed=0, end_date=None):
+    ''' Writes a synthetic Mint export of row_count rows to path. The newest rows are on end_date. '''
+    with open(path, 'w', newline='') as fhand:
+        writer = csv.writer(fhand, quoting=csv.QUOTE_ALL)
+        writer.writerow(HEADER)
+        rows = synthetic_rows(row_count, seed, end_date)
+        while True:
+            chunk = [row for _, row in zip(range(10000), rows)]
+            if not chunk:
+                break
+            writer.writerows(chunk)
+
+
+def synthetic_file(row_count, directory, seed=0):
+    ''' Returns the path of a synthetic export of row_count rows in directory, generating it if needed. '''
+    path = os.path.join(directory, 'mint-synthetic-{0}-{1}.csv'.format(row_count, seed))
+    if not os.path.isfile(path):
+        generate(path + '.tmp', row_count, seed)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def peak_rss_mb():
+    ''' Returns the peak resident memory of this process in MB, or None where it is not available. '''
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def timed(records, rows, stage, function, work=None):
+    '''
+    Runs function, adds a record of how long it took to records and returns its result.
+    work is the number of rows the stage goes through and is used for the throughput.
+    '''
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    work = rows if work is None else work
+    records.append({'rows': rows, 'stage': stage, 'seconds': round(seconds, 6),
+                    'rows_per_second': round(work / seconds, 1) if seconds > 0 else None,
+                    'peak_rss_mb': peak_rss_mb()})
+    return result
+
+
+def run_stages(data_file, rows):
+    '''
+    Times loading data_file and the main queries and reports over its whole date range.
+    Returns a list of records.
+    '''
+    import data
+    import reports
+
+    records = []
+    snapshot_path = data_file + '.snapshot'
+    if os.path.exists(snapshot_path):
+        os.remove(snapshot_path)
+
+    transactions = timed(records, rows, 'load', lambda: data.Transactions(data_file))
+    timed(records, rows, 'load_snapshot', lambda: data.Transactions(data_file))
+
+    store = transactions.store
+    transactions.start_date = datetime.date.fromordinal(min(store.dates))
+    transactions.end_date = datetime.date.fromordinal(max(store.dates))
+
+    debits = timed(records, rows, 'get_transactions_by_type',
+                   lambda: transactions.get_transactions_by_type('debit'))
+    categories = timed(records, rows, 'get_categories', lambda: transactions.get_categories(debits), len(debits))
+    timed(records, rows, 'get_category_totals', lambda: transactions.get_category_totals(categories), len(debits))
+    timed(records, rows, 'get_daily_spending', transactions.get_daily_spending, len(debits))
+    timed(records, rows, 'render_transactions',
+          lambda: reports.print_transactions('Debits', debits, io.StringIO()), len(debits))
+    timed(records, rows, 'render_totals',
+          lambda: reports.print_totals(transactions.get_category_totals_by_type('debit'), io.StringIO()), len(debits))
+    timed(records, rows, 'query_category_month',
+          lambda: transactions.query(('category', 'month'), ('sum', 'count', 'min', 'max'), tran_type='debit'),
+          len(debits))
+    return records
+
+
+def run_size(row_count, directory, seed=0):
+    ''' Benchmarks one size in a fresh interpreter and returns its records. '''
+    data_file = synthetic_file(row_count, directory, seed)
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--stages', data_file, str(row_count)],
+                            stdout=subprocess.PIPE, universal_newlines=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return [json.loads(line) for line in result.stdout.splitlines() if line.startswith('{')]
+
+
+def compare(records, baseline, tolerance=REGRESSION_TOLERANCE):
+    '''
+    Compares records with baseline records (matched on rows and stage).
+    Returns a list of (rows, stage, baseline seconds, seconds) for the stages that are
+    more than tolerance slower.
+    '''
+    previous = {(record['rows'], record['stage']): record['seconds'] for record in baseline}
+    slower = []
+    for record in records:
+        key = (record['rows'], record['stage'])
+        if key in previous and record['seconds'] > previous[key] * (1 + tolerance):
+            slower.append((record['rows'], record['stage'], previous[key], record['seconds']))
+    return slower
+
+
+def print_records(records, out=None):
+    ''' Prints records as a table. '''
+    import reports
+    table = reports.Table([reports.Column('Rows', 12), reports.Column('Stage', 28),
+                           reports.Column('Seconds', 12, '{:.4f}'.format),
+                           reports.Column('Rows/second', 16, lambda value: '{:,.0f}'.format(value or 0)),
+                           reports.Column('Peak MB', 10)])
+    reports.write([table.headings] + table.rows(
+        (record['rows'], record['stage'], record['seconds'], record['rows_per_second'], record['peak_rss_mb'])
+        for record in records), out)
+
+
+def read_records(path):
+    with open(path, 'r') as fhand:
+        return [json.loads(line) for line in fhand if line.strip()]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Benchmarks loading and reporting on synthetic Mint exports.')
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=DEFAULT_SIZES,
+                        help='sizes to benchmark (default: ' + ' '.join(DEFAULT_SIZES) + ')')
+    parser.add_argument('--directory', default=os.path.join(tempfile.gettempdir(), 'mint-benchmark'),
+                        help='where synthetic exports are kept between runs')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the synthetic data')
+    parser.add_argument('--output', help='append the records to this JSON Lines file')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='JSON Lines file of earlier records. Exits with 1 if a stage is more than ' +
+                             str(int(REGRESSION_TOLERANCE * 100)) + '%% slower.')
+    parser.add_argument('--stages', nargs=2, metavar=('FILE', 'ROWS'), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.stages:
+        # Runs in the child interpreter started by run_size.
+        for record in run_stages(args.stages[0], int(args.stages[1])):
+            print(json.dumps(record))
+        return 0
+
+    os.makedirs(args.directory, exist_ok=True)
+    records = []
+    for size in args.sizes:
+        records.extend(run_size(SIZES[size], args.directory, args.seed))
+    print_records(records)
+
+    if args.output:
+        with open(args.output, 'a') as fhand:
+            fhand.write(''.join(json.dumps(record) + '\n' for record in records))
+
+    if args.compare:
+        slower = compare(records, read_records(args.compare))
+        for rows, stage, before, after in slower:
+            print('Slower: {0} rows {1} {2:.4f}s -> {3:.4f}s'.format(rows, stage, before, after))
+        if slower:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
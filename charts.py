@@ -15,37 +15,200 @@ The default ``startangle`` is 0, which would start the "Frogs" slice on the
 positive x-axis. This example sets ``startangle = 90`` such that everything is
 rotated counter-clockwise by 90 degrees, and the frog slice starts on the
 positive y-axis.
+
+matplotlib is only imported when a chart is drawn so that importing this module (which
+mint.py does at start up) stays cheap.
+
+Charts can also be written to PNG or SVG files on a Figure with its own Agg canvas, which
+needs no display and leaves the pyplot backend used by the interactive charts alone. Files are kept in settings.CHART_DIRECTORY and named after a hash
+of everything the chart is drawn from (the aggregates, the date range and
+settings.OTHER_LIMIT), so asking for the same chart again returns the file that is
+already there without drawing anything.
 """
-import matplotlib.pyplot as plt
+import os
+import json
+import hashlib
 import settings
+import convert
+import profiling
+
+
+# Image formats that can be written.
+IMAGE_FORMATS = ('png', 'svg')
+
+# Part of every cache key. Change it when the way charts are drawn changes so old files are not reused.
+CHART_VERSION = 1
+
+
+def pyplot():
+    ''' Imports and returns matplotlib.pyplot. '''
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def headless_figure(figsize=(8, 6)):
+    '''
+    Returns a matplotlib Figure drawn by its own Agg canvas, which needs no display.
+    pyplot is not used so the backend of the interactive charts does not change.
+    '''
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
 
 
 def category_pie_chart(categories):
     ''' Pie chart, where the slices will be ordered and plotted counter-clockwise.'''
 
-    # Create a list of totals for each category.
+    # Create a dictionary of totals for each category.
+    category_totals = dict()
+    for category_name in categories.keys():
+        cents = 0
+        for transaction in categories[category_name]:
+            cents += transaction.cents
+        category_totals[category_name] = convert.to_dollars(cents)
+    category_totals_pie_chart(category_totals)
+
+
+def category_totals_pie_chart(category_totals):
+    ''' Pie chart of a dictionary of category totals.'''
+    plt = pyplot()
+    fig1, ax1 = plt.subplots()
+    draw_pie(ax1, category_totals, settings.OTHER_LIMIT)
+    plt.show()
+
+
+def pie_slices(category_totals, other_limit):
+    '''
+    Returns the labels and sizes of the pie slices for a dictionary of category totals.
+    Categories with a total of other_limit or less are put together in an Other slice.
+    '''
     labels = []
     sizes = []
-    explode = []
     other_total = 0
-    for category_name in categories.keys():
-        total = 0
-        for transaction in categories[category_name]:
-            total += transaction.amount
-        
-        if total <= settings.OTHER_LIMIT:
+    for category_name in category_totals.keys():
+        total = category_totals[category_name]
+
+        if total <= other_limit:
             other_total += total
         else:
             labels.append(category_name)
             sizes.append(total)
-            explode.append(0)
 
     labels.append('Other')
     sizes.append(other_total)
-    explode.append(0)
-    
-    fig1, ax1 = plt.subplots()
-    ax1.pie(sizes, explode=explode, labels=labels, autopct='%1.1f%%', shadow=True, startangle=90)
-    ax1.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
+    return labels, sizes
 
-    plt.show()
+
+def draw_pie(ax, category_totals, other_limit):
+    labels, sizes = pie_slices(category_totals, other_limit)
+    explode = [0] * len(sizes)
+    ax.pie(sizes, explode=explode, labels=labels, autopct='%1.1f%%', shadow=True, startangle=90)
+    ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
+
+
+def draw_monthly_trend(ax, months, trend, other_limit):
+    '''
+    Stacked bars of spending by category with one bar per month.
+    Categories whose largest month is other_limit or less are stacked together as Other.
+    '''
+    labels = ['{0}-{1:02d}'.format(year, month) for year, month in months]
+    series = dict()
+    other = [0] * len(months)
+    for name in sorted(trend, key=lambda name: sum(trend[name]), reverse=True):
+        if max(trend[name]) <= other_limit:
+            other = [a + b for a, b in zip(other, trend[name])]
+        else:
+            series[name] = trend[name]
+    if any(other):
+        series['Other'] = other
+
+    bottoms = [0] * len(months)
+    positions = list(range(len(months)))
+    for name, totals in series.items():
+        ax.bar(positions, totals, bottom=bottoms, label=name)
+        bottoms = [a + b for a, b in zip(bottoms, totals)]
+    ax.set_xticks(positions)
+    ax.set_xticklabels(labels)
+    ax.set_ylabel('Spending')
+    ax.legend(fontsize='small')
+
+
+def draw_daily_spending(ax, days):
+    ''' Line of spending per day. days is the dictionary returned by Transactions.get_daily_spending. '''
+    ordered = sorted(days)
+    ax.plot(ordered, [days[day] for day in ordered], marker='.')
+    ax.set_ylabel('Spending')
+    ax.figure.autofmt_xdate()
+
+
+def chart_key(kind, inputs):
+    '''
+    Returns a hash of everything a chart is drawn from.
+    inputs must be something json can encode. Amounts are rounded to cents first so that
+    floating point noise in a total does not change the key.
+    '''
+    def rounded(value):
+        if isinstance(value, float):
+            return round(value, 2)
+        if isinstance(value, dict):
+            return {str(key): rounded(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [rounded(item) for item in value]
+        return value
+
+    encoded = json.dumps([CHART_VERSION, kind, rounded(inputs)], sort_keys=True, default=str)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+def chart_path(kind, inputs, image_format='png', directory=None):
+    ''' Returns the file a chart is cached in. '''
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError('Unknown image format: ' + image_format)
+    if directory is None:
+        directory = settings.CHART_DIRECTORY
+    return os.path.join(directory, kind + '-' + chart_key(kind, inputs)[0:16] + '.' + image_format)
+
+
+@profiling.timed('render')
+def render(kind, inputs, draw, image_format='png', directory=None):
+    '''
+    Writes a chart to an image file unless it is already cached and returns the path of the file.
+    draw is called with a matplotlib Axes to draw the chart on.
+    '''
+    path = chart_path(kind, inputs, image_format, directory)
+    if os.path.isfile(path):
+        return path
+
+    fig = headless_figure()
+    draw(fig.add_subplot())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + '.tmp'
+    fig.savefig(temp_path, format=image_format, bbox_inches='tight')
+    os.replace(temp_path, path)
+    return path
+
+
+def category_pie_image(category_totals, start_date, end_date, image_format='png', directory=None):
+    ''' Writes a pie chart of category totals for a date range. Returns the path of the image. '''
+    other_limit = settings.OTHER_LIMIT
+    inputs = {'start': start_date, 'end': end_date, 'totals': category_totals, 'other_limit': other_limit}
+    return render('pie', inputs, lambda ax: draw_pie(ax, category_totals, other_limit), image_format, directory)
+
+
+def monthly_trend_image(months, trend, image_format='png', directory=None):
+    '''
+    Writes stacked bars of spending by category for each month. months and trend are the
+    arguments and result of Transactions.get_monthly_trend. Returns the path of the image.
+    '''
+    other_limit = settings.OTHER_LIMIT
+    inputs = {'months': months, 'trend': trend, 'other_limit': other_limit}
+    return render('trend', inputs, lambda ax: draw_monthly_trend(ax, months, trend, other_limit),
+                  image_format, directory)
+
+
+def daily_spending_image(days, image_format='png', directory=None):
+    ''' Writes a line chart of the result of Transactions.get_daily_spending. Returns the path of the image. '''
+    inputs = {'days': [[day.isoformat(), days[day]] for day in sorted(days)]}
+    return render('day', inputs, lambda ax: draw_daily_spending(ax, days), image_format, directory)
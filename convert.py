@@ -1,7 +1,12 @@
 '''
 Datatype conversion Tools
 '''
+import math
 import datetime
+import operator
+import functools
+import itertools
+from array import array
 
 
 class InvalidDateFormat(ValueError):
@@ -9,50 +14,151 @@ class InvalidDateFormat(ValueError):
     pass
 
 
+# Date formats understood by to_date.
+DATE_FORMATS = ('mm/dd/yyyy', 'dd/mm/yyyy', 'yyyymmdd', 'yyyy/mm/dd')
+
+# Number of distinct date strings remembered for each date format.
+DATE_CACHE_SIZE = 8192
+
+
 def to_date(value, date_format='mm/dd/yyyy'):
     '''
     Convert a string to a date. Values that can be processed are:
         dd/mm/yyyy, dd-mm-yyyy, dd.mm.yyyy
         mm/dd/yyyy, mm-dd-yyyy, mm.dd.yyyy
+        yyyy/mm/dd, yyyy-mm-dd, yyyy.mm.dd
         yyyymmdd
+    Results are memoized since a file of transactions repeats the same dates many times.
     '''
+    parser = DATE_PARSERS.get(date_format)
+    if parser is None:
+        # Return None if no value is present.
+        if len(value.strip()) == 0:
+            return None
+        # If we get this far then the passed in value is in an unknown format.
+        raise InvalidDateFormat('Invalid date format ' + date_format + '.')
+    return parser(value)
+
+
+def _date_pieces(value):
+    ''' Splits a date on any of the supported separators. Returns None for an empty value. '''
     value = value.strip()
-    value = value.replace('-', '/')
-    value = value.replace('.', '/')
+    if len(value) == 0:
+        return None
+    return value.replace('-', '/').replace('.', '/').split('/')
 
-    # Return None if no value is present.
+
+def _parse_dd_mm_yyyy(value):
+    pieces = _date_pieces(value)
+    if pieces is None:
+        return None
+    day = int(pieces[0])
+    month = int(pieces[1])
+    year = int(pieces[2])
+    return datetime.date(year, month, day)
+
+
+def _parse_mm_dd_yyyy(value):
+    pieces = _date_pieces(value)
+    if pieces is None:
+        return None
+    month = int(pieces[0])
+    day = int(pieces[1])
+    year = int(pieces[2])
+    return datetime.date(year, month, day)
+
+
+def _parse_yyyy_mm_dd(value):
+    pieces = _date_pieces(value)
+    if pieces is None:
+        return None
+    year = int(pieces[0])
+    month = int(pieces[1])
+    day = int(pieces[2])
+    return datetime.date(year, month, day)
+
+
+def _parse_yyyymmdd(value):
+    value = value.strip()
     if len(value) == 0:
         return None
+    year = int(value[0:4])
+    month = int(value[4:6])
+    day = int(value[6:8])
+    return datetime.date(year, month, day)
 
-    # Looking for a format of dd/mm/yyyy
-    elif date_format == 'dd/mm/yyyy':
-        pieces = value.split('/')
-        day = int(pieces[0])
-        month = int(pieces[1])
-        year = int(pieces[2])
-        return_date = datetime.date(year, month, day)
-        return return_date
-
-    # Looking for a format of mm/dd/yyyy
-    elif date_format == 'mm/dd/yyyy':
-        pieces = value.split('/')
-        month = int(pieces[0])
-        day = int(pieces[1])
-        year = int(pieces[2])
-        return_date = datetime.date(year, month, day)
-        return return_date
-
-    # Looking for a format of yyyymmdd
-    elif date_format == 'yyyymmdd':
-        year = int(value[0:4])
-        month = int(value[4:6])
-        day = int(value[6:8])
-        return_date = datetime.date(year, month, day)
-        return return_date
-
-    # If we get this far then the passed in value is in an unknown format.
-    else:
+
+def _to_ordinal(parser):
+    ''' Wraps a date parser so that it returns a date ordinal. Empty values become 0. '''
+    def parse(value):
+        date = parser(value)
+        return 0 if date is None else date.toordinal()
+    return parse
+
+
+_PARSERS = {
+    'mm/dd/yyyy': _parse_mm_dd_yyyy,
+    'dd/mm/yyyy': _parse_dd_mm_yyyy,
+    'yyyymmdd': _parse_yyyymmdd,
+    'yyyy/mm/dd': _parse_yyyy_mm_dd
+}
+
+# Memoized parsers for each date format.
+DATE_PARSERS = {name: functools.lru_cache(maxsize=DATE_CACHE_SIZE)(parser) for name, parser in _PARSERS.items()}
+ORDINAL_PARSERS = {name: functools.lru_cache(maxsize=DATE_CACHE_SIZE)(_to_ordinal(parser))
+                   for name, parser in _PARSERS.items()}
+
+
+def detect_date_format(values, sample_size=100):
+    '''
+    Works out the date format of a column of date strings by looking at its first values.
+    Day first and month first dates can only be told apart by a value over 12 so month
+    first (the Mint format) is returned when the sample does not settle it.
+    '''
+    checked = 0
+    for value in values:
+        pieces = _date_pieces(value)
+        if pieces is None:
+            continue
+        checked += 1
+        if len(pieces) == 1:
+            if len(pieces[0]) == 8 and pieces[0].isdigit():
+                return 'yyyymmdd'
+        elif len(pieces[0]) == 4:
+            return 'yyyy/mm/dd'
+        elif pieces[0].isdigit() and int(pieces[0]) > 12:
+            return 'dd/mm/yyyy'
+        elif pieces[1].isdigit() and int(pieces[1]) > 12:
+            return 'mm/dd/yyyy'
+        if checked >= sample_size:
+            break
+    return 'mm/dd/yyyy'
+
+
+def _get_parsers(date_format, values, parsers):
+    if date_format is None:
+        date_format = detect_date_format(values)
+    if date_format not in parsers:
         raise InvalidDateFormat('Invalid date format ' + date_format + '.')
+    return parsers[date_format]
+
+
+def to_dates(values, date_format=None):
+    '''
+    Converts a whole column of date strings to a list of dates.
+    The format is detected from the values when date_format is None.
+    Empty values become None.
+    '''
+    return list(map(_get_parsers(date_format, values, DATE_PARSERS), values))
+
+
+def to_ordinals(values, date_format=None):
+    '''
+    Converts a whole column of date strings to an array of date ordinals.
+    The format is detected from the values when date_format is None.
+    Empty values become 0, which is not the ordinal of any date.
+    '''
+    return array('i', map(_get_parsers(date_format, values, ORDINAL_PARSERS), values))
 
 
 def to_int(value):
@@ -65,18 +171,116 @@ def to_int(value):
 
 
 def to_float(value):
-    f = 0
+    f = _parse_amount(value)
+    if f is None:
+        return 0
+    return f
 
-    value = value.replace(',', '')
 
-    if len(value) < 1:
+def to_cent(value):
+    '''
+    Converts an amount string to whole cents. Amounts that cannot be converted, including
+    nan, infinity and amounts too large for the cents column, are 0.
+    '''
+    f = _parse_amount(value)
+    if f is None or abs(f) >= MAX_AMOUNT:
         return 0
+    return round(f * 100)
+
+
+# Amounts must be below this so that their cents fit the 64 bit cents column.
+MAX_AMOUNT = float(1 << 63) / 100
+
+
+def to_dollars(cents):
+    '''
+    Converts whole cents to a float amount. The float is the one closest to the exact
+    amount, the same float that parsing the amount as written would give.
+    '''
+    return cents / 100
 
-    if value[0] == '$':
-        value = value[1:]
 
+def total_amounts(amounts):
+    '''
+    Adds float amounts exactly by adding them as whole cents.
+    Adding floats one after the other drifts by fractions of a cent over many values.
+    '''
+    return sum(map(round, map(operator.mul, amounts, itertools.repeat(100)))) / 100
+
+
+# Characters removed from an amount before it is converted. Currency symbols,
+# thousands separators and spaces.
+_AMOUNT_DELETE = str.maketrans('', '', '$\u20ac\u00a3\u00a5, ')
+
+
+def _parse_amount(value):
+    '''
+    Converts an amount such as $1,234.56, -$5.00 or (5.00) to a float.
+    Returns None if the value is empty or cannot be converted. nan and infinity are not amounts.
+    '''
+    value = value.strip()
+    negative = False
+    if value[0:1] == '(' and value[-1:] == ')':
+        negative = True
+        value = value[1:-1]
+    value = value.translate(_AMOUNT_DELETE)
+    if len(value) == 0:
+        return None
     try:
         f = float(value)
-    except Exception:
-        f = 0
-    return f
+    except ValueError:
+        return None
+    if not math.isfinite(f):
+        return None
+    return -f if negative else f
+
+
+def to_floats(values):
+    '''
+    Converts a whole column of amount strings to an array of floats.
+    Returns the array and a mask (a bytearray with one byte per value) where 1 marks a
+    value that could not be converted. Those values are 0 in the array.
+    Plain numbers are converted in one go. Only a column that holds currency symbols,
+    thousands separators or parentheses, or a value such as nan or inf that float accepts
+    but is not an amount, is converted value by value.
+    '''
+    try:
+        floats = array('d', map(float, values))
+        # The sum is only nan or infinite if a value is (or the values are huge).
+        if math.isfinite(sum(floats)):
+            return floats, bytearray(len(values))
+    except ValueError:
+        pass
+
+    floats = array('d', bytes(8 * len(values)))
+    mask = bytearray(len(values))
+    for position, value in enumerate(values):
+        f = _parse_amount(value)
+        if f is None:
+            mask[position] = 1
+        else:
+            floats[position] = f
+    return floats, mask
+
+
+def to_cents(values):
+    '''
+    Converts a whole column of amount strings to an array of whole cents.
+    Returns the array and a mask in the same way as to_floats.
+    Amounts are written with at most two decimals, so rounding the float amount times 100
+    gives the exact number of cents for any amount below a hundred billion.
+    Amounts too large for the array are masked like amounts that cannot be converted.
+    '''
+    floats, mask = to_floats(values)
+    try:
+        return array('q', map(round, map(operator.mul, floats, itertools.repeat(100)))), mask
+    except OverflowError:
+        pass
+
+    cents = array('q', bytes(8 * len(floats)))
+    for position, f in enumerate(floats):
+        if abs(f) >= MAX_AMOUNT:
+            mask[position] = 1
+        else:
+            cents[position] = round(f * 100)
+    return cents, mask
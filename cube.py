@@ -0,0 +1,171 @@
+'''
+Monthly rollup of transactions.
+The cube holds the total and count of the transactions for every combination of
+month, transaction type, category and account so that reports over whole months
+do not have to look at individual transactions.
+'''
+import datetime
+import calendar
+import convert
+
+
+# Positions of the dimensions in a cell key.
+DIMENSIONS = {'type': 0, 'category': 1, 'account': 2}
+
+
+def month_key(date):
+    ''' Returns the key of the month a date falls in, for example 201703 for March 2017. '''
+    return date.year * 100 + date.month
+
+
+def month_range(first_month, last_month):
+    ''' Returns the keys of the months from first_month to last_month inclusive. '''
+    months = []
+    year, month = divmod(first_month, 100)
+    while year * 100 + month <= last_month:
+        months.append(year * 100 + month)
+        month += 1
+        if month > 12:
+            year += 1
+            month = 1
+    return months
+
+
+def month_dates(year, month):
+    ''' Returns the first and last day of a month. '''
+    last_day = calendar.monthrange(year, month)[1]
+    return datetime.date(year, month, 1), datetime.date(year, month, last_day)
+
+
+def previous_month(year, month):
+    ''' Returns the (year, month) before a month. '''
+    if month == 1:
+        return year - 1, 12
+    return year, month - 1
+
+
+def last_months(end_date, month_count):
+    '''
+    Returns a list of (year, month) tuples for the month_count months ending with
+    the month of end_date. The oldest month is first.
+    '''
+    months = []
+    year, month = end_date.year, end_date.month
+    for _ in range(month_count):
+        months.insert(0, (year, month))
+        year, month = previous_month(year, month)
+    return months
+
+
+def whole_months(start_date, end_date):
+    '''
+    Returns the keys of the first and last month of a date range if the range starts on the
+    first day of a month and ends on the last day of a month. Otherwise returns None.
+    '''
+    if start_date.day != 1:
+        return None
+    if end_date.day != calendar.monthrange(end_date.year, end_date.month)[1]:
+        return None
+    if end_date < start_date:
+        return None
+    return month_key(start_date), month_key(end_date)
+
+
+class MonthlyCube:
+    '''
+    Totals of a store by (month, type, category, account).
+    cells[month][(type code, category code, account code)] = [total in whole cents, count]
+    '''
+
+    def __init__(self, store):
+        self.store = store
+        self.cells = dict()
+        self.add_rows(0)
+
+
+    def add_rows(self, first_row):
+        ''' Adds the rows from first_row to the end of the store to the cube. '''
+        store = self.store
+        months = dict()
+        cents = store.cents
+        rows = range(first_row, len(store))
+        for row in rows:
+            day = store.dates[row]
+            month = months.get(day)
+            if month is None:
+                month = months[day] = month_key(datetime.date.fromordinal(day))
+            key = (store.types[row], store.categories[row], store.accounts[row])
+            cells = self.cells.get(month)
+            if cells is None:
+                cells = self.cells[month] = dict()
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = [cents[row], 1]
+            else:
+                cell[0] += cents[row]
+                cell[1] += 1
+
+
+    def months(self):
+        ''' Returns the keys of the months that have transactions, in order. '''
+        return sorted(self.cells)
+
+
+    def _names(self, dimension):
+        ''' Returns the list of names for the codes of a dimension. '''
+        if dimension == 'type':
+            return self.store.type_names.values
+        if dimension == 'category':
+            return self.store.category_names.values
+        if dimension == 'account':
+            return self.store.account_names.values
+        raise ValueError('Unknown dimension: ' + dimension)
+
+
+    def totals(self, first_month, last_month, type_codes=None, dimension='category'):
+        '''
+        Returns a dictionary of name -> total for a dimension over a range of months.
+        type_codes limits the totals to those transaction types.
+        Totals are added up in whole cents and only turned into amounts at the end.
+        '''
+        position = DIMENSIONS[dimension]
+        names = self._names(dimension)
+        totals = dict()
+        for month in month_range(first_month, last_month):
+            for key, cell in self.cells.get(month, {}).items():
+                if type_codes is not None and key[0] not in type_codes:
+                    continue
+                name = names[key[position]]
+                if name in totals:
+                    totals[name] += cell[0]
+                else:
+                    totals[name] = cell[0]
+        return {name: convert.to_dollars(total) for name, total in totals.items()}
+
+
+    def counts(self, first_month, last_month, type_codes=None, dimension='category'):
+        ''' Returns a dictionary of name -> number of transactions for a dimension over a range of months. '''
+        position = DIMENSIONS[dimension]
+        names = self._names(dimension)
+        counts = dict()
+        for month in month_range(first_month, last_month):
+            for key, cell in self.cells.get(month, {}).items():
+                if type_codes is not None and key[0] not in type_codes:
+                    continue
+                name = names[key[position]]
+                counts[name] = counts.get(name, 0) + cell[1]
+        return counts
+
+
+    def trend(self, months, type_codes=None, dimension='category'):
+        '''
+        Returns a dictionary of name -> list of totals, one for each month in months.
+        months does not have to be consecutive, which allows year over year comparisons.
+        '''
+        trend = dict()
+        for position, month in enumerate(months):
+            for name, total in self.totals(month, month, type_codes, dimension).items():
+                if name not in trend:
+                    trend[name] = [0] * len(months)
+                trend[name][position] = total
+        return trend
@@ -1,69 +1,285 @@
 '''
 Contains the Transaction class and logic to load the file downloaded from Mint.
 '''
+import io
+import sys
 import csv
-import re
 import os
+import hashlib
+import itertools
+import functools
+import glob
 import convert
 import datetime
 import calendar
 import settings
+import snapshot
+import indexes
+import cube
+import search
+import sources
+import queries
+import profiling
+from array import array
+from collections import Counter
 
 
 TAGS = ['Keith', 'Eileen', 'Split', 'Lake House', 'Glen Rock House']
 
+# Key of a Rows view that covers every loaded transaction.
+ALL_ROWS = ('all',)
+
+# Number of group by results kept for views that came from a query.
+GROUP_CACHE_SIZE = 64
+
+# Extensions of the files the loader writes next to a transaction file.
+DERIVED_EXTENSIONS = (snapshot.EXTENSION, search.TEXT_INDEX_EXTENSION, '.tmp')
+
+# Number of lines of the transaction file converted to columns at a time.
+CHUNK_SIZE = 10000
+
+# Number of distinct dates shared between Transaction objects (see shared_date).
+DATE_CACHE_SIZE = 8192
+
 class MissingTransactionFile(Exception):
     '''Custom exception to be thrown when the transaction file is missing.'''
     pass
 
 
+# Errors raised when a transaction file is missing or cannot be read.
+LOAD_ERRORS = (MissingTransactionFile, sources.UnknownFileFormat, sources.InvalidDate, convert.InvalidDateFormat,
+               UnicodeDecodeError, csv.Error)
+
+
+def read_chunks(reader, size=CHUNK_SIZE):
+    ''' Yields lists of up to size lines from a csv reader. Blank lines are dropped. '''
+    while True:
+        chunk = [line for line in itertools.islice(reader, size) if line]
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+@profiling.timed('parse')
+def read_transaction_file(data_file, file_format=None):
+    '''
+    Parses a transaction file into a new ColumnStore.
+    file_format names the sources.Source to read the file with. By default it is
+    picked from the header of the file.
+    Returns the store and a dictionary with the number of transactions in the file
+    (including hidden ones), the format and header of the file, its date format and
+    the number of amounts that could not be converted.
+    The file is read a chunk at a time and each column of a chunk is converted in one go.
+    '''
+    # Setup needed variables
+    line_count = 0
+    invalid_amounts = 0
+    store = ColumnStore()
+    header = []
+    date_format = None
+
+    with open(data_file, 'r') as fhand:
+        reader = csv.reader(fhand)
+
+        # The first line contains the column headers.
+        header = next(reader, None)
+        if header is None:
+            header = []
+            if file_format is None:
+                file_format = sources.MINT.name
+        else:
+            parser = sources.parser_for(header, file_format)
+            file_format = parser.source.name
+
+            for lines in read_chunks(reader):
+                line_count += len(lines)
+                # Do not add any transactions in a hidden category.
+                lines = parser.visible(lines)
+                if date_format is None and len(lines) > 0:
+                    date_format = parser.date_format(lines)
+                invalid_amounts += store.extend_lines(lines, parser, date_format)
+
+    profiling.rows(line_count, len(store))
+
+    return store, {'count': line_count, 'format': file_format, 'header': header, 'date_format': date_format,
+                   'invalid_amounts': invalid_amounts}
+
+
+def file_layout(data_file):
+    '''
+    Describes the bytes of a transaction file so that a later version of the file can be
+    checked for rows that were added to the top or the bottom of it.
+    '''
+    with open(data_file, 'rb') as fhand:
+        header = fhand.readline()
+    size = os.path.getsize(data_file)
+    return {
+        'source': snapshot.source_key(data_file),
+        'header_sha1': hashlib.sha1(header).hexdigest(),
+        'header_length': len(header),
+        'body_length': size - len(header),
+        'body_sha1': snapshot.file_hash(data_file, len(header))
+    }
+
+
+def find_new_lines(data_file, layout):
+    '''
+    Looks for the previously ingested body of the file (described by layout) at the start or
+    at the end of the current body of data_file. Mint puts the newest transactions first
+    so a new download usually has its new rows at the top.
+    Returns the byte range (start, end) holding the new lines or None if the old body
+    is not intact in the current file or the new lines do not start on a line of their own
+    (the last line of the old file had no line break and was added to).
+    '''
+    size = os.path.getsize(data_file)
+    with open(data_file, 'rb') as fhand:
+        header = fhand.readline()
+    if hashlib.sha1(header).hexdigest() != layout['header_sha1']:
+        return None
+
+    start = len(header)
+    length = layout['body_length']
+    if size < start + length:
+        return None
+
+    # New rows added to the bottom of the file.
+    if snapshot.file_hash(data_file, start, length) == layout['body_sha1']:
+        if not ends_line(data_file, start + length):
+            return None
+        return (start + length, size)
+    # New rows added to the top of the file.
+    if snapshot.file_hash(data_file, size - length, length) == layout['body_sha1']:
+        if not ends_line(data_file, size - length):
+            return None
+        return (start, size - length)
+    return None
+
+
+def ends_line(data_file, position):
+    ''' Returns True if the byte before position in data_file is a line break (or position is the start of the file). '''
+    if position == 0:
+        return True
+    with open(data_file, 'rb') as fhand:
+        fhand.seek(position - 1)
+        return fhand.read(1) == b'\n'
+
+
+def read_lines(data_file, start, end):
+    ''' Returns a csv reader over the lines found between two byte offsets of data_file. '''
+    with open(data_file, 'rb') as fhand:
+        fhand.seek(start)
+        chunk = fhand.read(end - start)
+    return csv.reader(io.TextIOWrapper(io.BytesIO(chunk)))
+
+
+def find_files(data_file):
+    '''
+    Returns the list of transaction files for data_file, which can be a path, a glob
+    pattern (such as exports/*.csv) or a list of paths.
+    The snapshots, text indexes and temporary files written next to transaction files are
+    never matched by a pattern.
+    '''
+    if isinstance(data_file, (list, tuple)):
+        return list(data_file)
+    if glob.has_magic(data_file):
+        return sorted(path for path in glob.glob(data_file) if not path.endswith(DERIVED_EXTENSIONS))
+    return [data_file]
+
+
+def load_file(data_file, use_snapshot=True, file_format=None):
+    '''
+    Loads one transaction file into a ColumnStore, using its snapshot if it is current and
+    writing a new snapshot if it is not.
+    file_format names the format of the file (see read_transaction_file).
+    Returns the store and its meta dictionary (see read_transaction_file and file_layout).
+    '''
+    store = ColumnStore()
+    meta = None
+    if use_snapshot:
+        meta = snapshot.load(data_file, store)
+        # A snapshot read with another format does not count.
+        if meta is not None and file_format is not None and meta['format'] != file_format:
+            store = ColumnStore()
+            meta = None
+
+    if meta is None:
+        store, meta = read_transaction_file(data_file, file_format)
+        meta.update(file_layout(data_file))
+        if use_snapshot:
+            snapshot.save(data_file, store, meta)
+    return store, meta
+
+
+def _load_detached(data_file, use_snapshot, file_format):
+    ''' Loads a file in a worker process. The store is copied out of its snapshot so that it can be pickled. '''
+    store, meta = load_file(data_file, use_snapshot, file_format)
+    store.detach()
+    return store, meta
+
+
+def load_files(data_files, use_snapshot=True, workers=None, file_format=None):
+    '''
+    Loads several transaction files into one ColumnStore.
+    The files are parsed in a pool of worker processes (one per CPU unless workers says
+    otherwise) and then merged in the order given. Each file keeps its own parser and
+    date format, so files from different banks can be loaded together. Unless file_format
+    names the format of every file, the format of each file is picked from its header.
+    The workers are given the sources registered in this process.
+    A transaction that is in more than one file is only kept once.
+    Returns the store and a meta dictionary with the total count and the meta of each file.
+    '''
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(data_files))
+
+    use_snapshots = [use_snapshot] * len(data_files)
+    file_formats = [file_format] * len(data_files)
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers, initializer=sources.restore,
+                                 initargs=(list(sources.SOURCES.values()),)) as executor:
+            results = list(executor.map(_load_detached, data_files, use_snapshots, file_formats))
+    else:
+        results = list(map(load_file, data_files, use_snapshots, file_formats))
+
+    store = ColumnStore()
+    files = dict()
+    for data_file, (file_store, meta) in zip(data_files, results):
+        store.extend_store(file_store, dedupe=True)
+        files[data_file] = meta
+
+    return store, {'count': sum(meta['count'] for meta in files.values()), 'files': files}
+
+
 class Transactions:
     '''
     Transactions class
     Holds a list of collection objects as well as all the functions that process transaction objects.
     '''
 
-    def __init__(self, data_file = None):
+    def __init__(self, data_file = None, use_snapshot = True, workers = None, file_format = None):
         '''
         Loads the transaction file specified in settings into memory.
         This function does not load hidden transactions.
+        Transactions are held column by column in a ColumnStore. Transaction objects
+        are only created when transaction_list is used or when a Rows view is iterated.
+        Unless use_snapshot is False a binary snapshot kept next to the transaction file
+        is used in place of parsing the file whenever the file has not changed.
+        data_file can also be a list of files or a glob pattern. The files are then loaded
+        in parallel by up to workers processes (one per CPU by default) and merged.
+        file_format names the sources.Source files are read with. By default the format
+        of each file is picked from its header.
         '''
         if data_file is None:
             data_file = settings.DATA_FILE
+        if file_format is None:
+            file_format = settings.FILE_FORMAT
 
-        # Setup needed variables
-        line_count = 0
-        transactions = []
-
-        if not os.path.isfile(data_file):
-            raise MissingTransactionFile('Missing transaction file: ' + data_file)
-
-        fhand = open(data_file, 'r')
-        reader = csv.reader(fhand)
-
-        # Read through each line of the file.
-        for line in reader:
-            line_count += 1
-
-            '''
-            The first line contains the column headers.
-            Determines the index into the transaction list for each field.
-            By not hard coding these values we are insulated from changes to the underlying export file.
-            '''
-            if line_count == 1:
-                field_count = len(line)
-                for i in range(0, field_count):
-                    Transaction.index_dict[line[i].lower()] = i
-            else:
-                transaction = Transaction(line)
-                # Do not add any transactions in a 'hide*' category.
-                if transaction.category.lower()[0:4] != 'hide':
-                    transactions.append(transaction)
-
-        fhand.close()
-
-        self.count = line_count - 1
-        self.transaction_list = transactions
+        self.data_file = data_file
+        self.file_format = file_format
+        self.use_snapshot = use_snapshot
+        self.workers = workers
+        self.load()
 
         # Get the current year and month.
         now = datetime.datetime.now()
@@ -79,6 +295,309 @@ class Transactions:
         self.end_date = datetime.date(year, month, last_day)
 
 
+    @profiling.timed('load')
+    def load(self):
+        '''
+        (Re)loads the transaction file. The snapshot is used if it is current, otherwise
+        the file is parsed and a new snapshot is written.
+        '''
+        data_files = find_files(self.data_file)
+        if len(data_files) == 0:
+            raise MissingTransactionFile('No transaction files match: ' + str(self.data_file))
+        for data_file in data_files:
+            if not os.path.isfile(data_file):
+                raise MissingTransactionFile('Missing transaction file: ' + data_file)
+
+        if self.is_multi_file():
+            store, meta = load_files(data_files, self.use_snapshot, self.workers, self.file_format)
+        else:
+            store, meta = load_file(data_files[0], self.use_snapshot, self.file_format)
+
+        self.data_files = data_files
+        self.count = meta['count']
+        self.ingest_state = meta
+        self.store = store
+        self._transaction_list = None
+        self._date_index = None
+        self._group_indexes = dict()
+        self._group_cache = dict()
+        self._cube = None
+        self._name_indexes = dict()
+        self._text_index = None
+        profiling.rows(len(store))
+
+
+    @profiling.timed('load')
+    def refresh(self):
+        '''
+        Brings the loaded transactions up to date with the transaction file.
+        When the file is the previous file plus new rows at the top or the bottom only the
+        new rows are parsed. Otherwise every line is matched against the loaded rows using
+        the key of sources.Parser.key and only unmatched lines are added. If rows have been removed from the
+        file everything is loaded again.
+        When several files are loaded and any of them has changed they are all loaded again
+        (the unchanged ones from their snapshots).
+        Returns the number of transactions added, which after a full load is the number of
+        rows that were not loaded before.
+        '''
+        if self.is_multi_file():
+            return self._refresh_files()
+
+        if not os.path.isfile(self.data_file):
+            raise MissingTransactionFile('Missing transaction file: ' + self.data_file)
+
+        if snapshot.source_key(self.data_file) == self.ingest_state['source']:
+            return 0
+
+        first_row = len(self.store)
+        new_range = find_new_lines(self.data_file, self.ingest_state)
+        if new_range is None:
+            if not self._merge_file():
+                return self._reload()
+        else:
+            lines = read_lines(self.data_file, new_range[0], new_range[1])
+            parser = sources.parser_for(self.ingest_state['header'], self.ingest_state['format'])
+            self.count += self._append_lines(lines, parser, self.ingest_state['date_format'])
+
+        self.ingest_state['count'] = self.count
+        self.ingest_state.update(file_layout(self.data_file))
+        if self.use_snapshot:
+            snapshot.save(self.data_file, self.store, self.ingest_state)
+
+        if self._transaction_list is not None:
+            self._transaction_list.extend(Rows(self.store, range(first_row, len(self.store))))
+        if self._date_index is not None:
+            self._date_index.add_rows(first_row)
+        for index in self._group_indexes.values():
+            index.add_rows(first_row)
+        if self._cube is not None:
+            self._cube.add_rows(first_row)
+        if self._text_index is not None:
+            self._text_index.add_rows(first_row)
+            self._save_text_index()
+        self._group_cache = dict()
+        return len(self.store) - first_row
+
+
+    def is_multi_file(self):
+        ''' Returns True when data_file is a list of files or a glob pattern. '''
+        return isinstance(self.data_file, (list, tuple)) or glob.has_magic(self.data_file)
+
+
+    def _refresh_files(self):
+        ''' refresh for several files. Loads everything again if any file was added, removed or changed. '''
+        data_files = find_files(self.data_file)
+        files = self.ingest_state['files']
+        changed = list(files) != data_files
+        for data_file in data_files:
+            if changed:
+                break
+            changed = (not os.path.isfile(data_file) or
+                       snapshot.source_key(data_file) != files[data_file]['source'])
+        if not changed:
+            return 0
+        return self._reload()
+
+
+    def _reload(self):
+        ''' Loads everything again. Returns the number of rows that were not loaded before. '''
+        existing = self.store.row_keys()
+        self.load()
+        return sum((self.store.row_keys() - existing).values())
+
+
+    @profiling.timed('parse')
+    def _append_lines(self, lines, parser, date_format):
+        '''
+        Adds lines of the transaction file to the store with a sources.Parser skipping
+        hidden transactions. Returns the number of lines read.
+        '''
+        self.store.make_writable()
+        first_row = len(self.store)
+        line_count = 0
+        for chunk in read_chunks(iter(lines)):
+            line_count += len(chunk)
+            chunk = parser.visible(chunk)
+            if date_format is None and len(chunk) > 0:
+                date_format = parser.date_format(chunk)
+                self.ingest_state['date_format'] = date_format
+            invalid_amounts = self.store.extend_lines(chunk, parser, date_format)
+            self.ingest_state['invalid_amounts'] = self.ingest_state.get('invalid_amounts', 0) + invalid_amounts
+        profiling.rows(line_count, len(self.store) - first_row)
+        return line_count
+
+
+    @profiling.timed('parse')
+    def _merge_file(self):
+        '''
+        Reads the whole transaction file and adds the lines that are not already loaded.
+        Lines are matched on the key of sources.Parser.key. Identical lines are counted so
+        that two identical purchases on the same day are both kept.
+        Returns False without changing anything if a loaded row is no longer in the file.
+        '''
+        existing = self.store.row_keys()
+        with open(self.data_file, 'r') as fhand:
+            reader = csv.reader(fhand)
+            header = next(reader, [])
+            lines = [line for line in reader if line]
+
+        parser = sources.parser_for(header, self.file_format)
+        line_count = len(lines)
+        lines = parser.visible(lines)
+        date_format = self.ingest_state['date_format'] or parser.date_format(lines)
+        seen = Counter()
+        new_lines = []
+        for line in lines:
+            key = parser.key(line, date_format)
+            seen[key] += 1
+            if seen[key] > existing.get(key, 0):
+                new_lines.append(line)
+
+        for key in existing:
+            if seen[key] < existing[key]:
+                return False
+
+        self._append_lines(new_lines, parser, date_format)
+        self.count = line_count
+        self.ingest_state['format'] = parser.source.name
+        self.ingest_state['header'] = header
+        return True
+
+
+    @property
+    def transaction_list(self):
+        '''
+        List of Transaction objects for every loaded transaction.
+        The list is only built the first time it is asked for. Code that can work
+        against the columns directly should use all_rows() instead.
+        '''
+        if self._transaction_list is None:
+            self._transaction_list = list(self.all_rows())
+        return self._transaction_list
+
+
+    @property
+    def date_index(self):
+        '''
+        Index of the transactions in date order, partitioned by transaction type.
+        Built the first time it is needed and kept up to date by refresh.
+        '''
+        if self._date_index is None:
+            self._date_index = indexes.DateIndex(self.store)
+        return self._date_index
+
+
+    @property
+    def cube(self):
+        '''
+        Monthly rollup of the transactions by type, category and account.
+        Built the first time it is needed and kept up to date by refresh.
+        '''
+        if self._cube is None:
+            self._cube = cube.MonthlyCube(self.store)
+        return self._cube
+
+
+    @property
+    def text_index(self):
+        '''
+        Index of the words in the description, original description and notes of the transactions.
+        The index is saved next to the transaction file (unless use_snapshot is False) so
+        that it only has to be built again when the file changes. refresh keeps it up to date.
+        '''
+        if self._text_index is None:
+            key = self._text_index_key()
+            if key is not None:
+                self._text_index = search.load_text_index(self.data_file, self.store, key)
+            if self._text_index is None:
+                self._text_index = search.TextIndex(self.store)
+                self._save_text_index()
+        return self._text_index
+
+
+    def _text_index_key(self):
+        ''' Returns the key the text index is saved under or None if it should not be saved. '''
+        if not self.use_snapshot or self.is_multi_file():
+            return None
+        return [self.ingest_state['header_sha1'], self.ingest_state['body_sha1'], len(self.store)]
+
+
+    def _save_text_index(self):
+        key = self._text_index_key()
+        if key is not None:
+            search.save_text_index(self.data_file, self._text_index, key)
+
+
+    def group_index(self, dimension):
+        '''
+        Returns the GroupIndex for a dimension which is 'category', 'account' or 'tag'.
+        Each index is built the first time it is needed and kept up to date by refresh.
+        '''
+        if dimension not in self._group_indexes:
+            store = self.store
+            if dimension == 'category':
+                index = indexes.GroupIndex(store, 'categories',
+                                           lambda code: [store.category_names.values[code]])
+            elif dimension == 'account':
+                index = indexes.GroupIndex(store, 'accounts',
+                                           lambda code: [store.account_names.values[code]])
+            elif dimension == 'tag':
+                index = indexes.GroupIndex(store, 'tags',
+                                           lambda code: [tag for tag in TAGS if tag in store.tag_names.values[code]])
+            else:
+                raise ValueError('Unknown dimension: ' + dimension)
+            self._group_indexes[dimension] = index
+        return self._group_indexes[dimension]
+
+
+    def all_rows(self):
+        ''' Returns a Rows view over every loaded transaction. '''
+        return Rows(self.store, array('I', range(len(self.store))), ALL_ROWS)
+
+
+    @profiling.timed('group')
+    def group_rows(self, dimension, rows):
+        '''
+        Groups a Rows view by dimension ('category', 'account' or 'tag').
+        Returns a dictionary of group name -> Rows.
+        A view over every transaction is answered from the group index. Other views that came
+        from a query (and so have a key) are grouped once and the result is cached until the
+        transactions are reloaded.
+        '''
+        if rows.store is not self.store:
+            return self._group_rows(dimension, rows)
+
+        if rows.key == ALL_ROWS:
+            index = self.group_index(dimension)
+            return {name: Rows(self.store, index.rows[name], cents=index.totals[name]) for name in index.rows}
+
+        if rows.key is None:
+            return self._group_rows(dimension, rows)
+
+        cache_key = (dimension, rows.key)
+        if cache_key not in self._group_cache:
+            if len(self._group_cache) >= GROUP_CACHE_SIZE:
+                self._group_cache = dict()
+            self._group_cache[cache_key] = self._group_rows(dimension, rows)
+        return dict(self._group_cache[cache_key])
+
+
+    def _group_rows(self, dimension, rows):
+        ''' Groups a Rows view by dimension with a pass over its rows. '''
+        store = rows.store
+        if dimension == 'category':
+            groups = rows.group_by(store.categories, store.category_names)
+        elif dimension == 'account':
+            groups = rows.group_by(store.accounts, store.account_names)
+        elif dimension == 'tag':
+            groups = self._get_tags_from_rows(rows)
+        else:
+            raise ValueError('Unknown dimension: ' + dimension)
+        profiling.rows(len(rows), len(groups))
+        return groups
+
+
+    @profiling.timed('group')
     def get_accounts(self):
         '''
         Goes through the list of transactions and creates a dictionary 
@@ -87,37 +606,60 @@ class Transactions:
         Return value: account[account name] = transaction total
         The transaction total is not used anywhere but I set it in the dictionary values anyway.
         '''
+        index = self.group_index('account')
         accounts = dict()
-        for transaction in self.transaction_list:
-            # Do not add any 'Hide' categories.
-            if transaction.account_name in accounts:
-                accounts[transaction.account_name] += transaction.amount
-            else:
-                accounts[transaction.account_name] = transaction.amount
+        for account_name in index.rows:
+            accounts[account_name] = convert.to_dollars(index.totals[account_name])
         return accounts
 
 
-    def get_daily_spending(self):
+    @profiling.timed('group')
+    def get_daily_spending(self, start_date = None, end_date = None):
         '''
-        Creates a dictionary of daily spending for the current data range.
+        Creates a dictionary of daily spending for the current data range
+        unless another range is passed.
         '''
+        if start_date is None:
+            start_date = self.start_date
+
+        if end_date is None:
+            end_date = self.end_date
+
+        store = self.store
+        start = start_date.toordinal()
+        end = end_date.toordinal()
+        debit_codes = store.type_names.find('debit')
+
+        totals = dict()
+        scanned = 0
+        for code in debit_codes:
+            if code not in self.date_index.types:
+                continue
+            partition = self.date_index.types[code]
+            low, high = partition.bounds(start, end)
+            scanned += high - low
+            for day, cents in partition.day_totals(start, end, store.cents):
+                totals[day] = totals.get(day, 0) + cents
+
         days = dict()
-        for transaction in self.transaction_list:
-            if (transaction.transaction_date >= self.start_date) and (transaction.transaction_date <= self.end_date):
-                if transaction.transaction_type.lower() == 'debit':
-                    if transaction.transaction_date in days:
-                        days[transaction.transaction_date] = days[transaction.transaction_date] + transaction.amount
-                    else:
-                        days[transaction.transaction_date] = transaction.amount
+        for day in sorted(totals):
+            days[datetime.date.fromordinal(day)] = convert.to_dollars(totals[day])
+        profiling.rows(scanned, len(days))
         return days
 
 
+    @profiling.timed('group')
     def get_categories(self, transactions_param):
         '''
         Creates a dictionary of categories based on the list of transactions passed in.
         Category names are the keys.
         Total transaction amount are the values.
+        When a Rows view is passed in the values are Rows views as well and the grouping
+        is done with group_rows without creating Transaction objects.
         '''
+        if isinstance(transactions_param, Rows):
+            return self.group_rows('category', transactions_param)
+
         categories = dict()
         for transaction in transactions_param:
             # Do not add any 'Hide' categories.
@@ -134,22 +676,74 @@ class Transactions:
 
     def get_category_by_name(self, search_name, transactions_param):
         '''
-        Returns the first category that matches search_name which is treated as a regular expression.
+        Returns the category that best matches search_name which is treated as a regular expression.
+        See search_categories for how matches are ranked.
         '''
-        categories = self.get_categories(transactions_param)
-        for category_name in categories:
-            if re.search(search_name.lower(), category_name.lower()):
-                return categories[category_name]
+        matches = self.search_categories(search_name, transactions_param)
+        if len(matches) > 0:
+            return matches[0][1]
         # If we get here then nothing was found.
         return None
 
 
+    def search_categories(self, search_name, transactions_param):
+        '''
+        Returns a list of (category name, transactions) for every category of the transactions
+        passed in whose name matches search_name, best match first.
+        search_name is matched as plain text when it has no regular expression syntax in it.
+        '''
+        categories = self.get_categories(transactions_param)
+        return self._search_names(self.name_index('category'), search_name, categories)
+
+
+    def name_index(self, dimension):
+        '''
+        Returns the search.NameIndex for 'category' or 'tag' names.
+        Names added to the store since the index was last used are added to it first.
+        '''
+        if dimension == 'category':
+            names = self.store.category_names.values
+        elif dimension == 'tag':
+            names = TAGS
+        else:
+            raise ValueError('Unknown dimension: ' + dimension)
+
+        if dimension not in self._name_indexes:
+            self._name_indexes[dimension] = search.NameIndex()
+        index = self._name_indexes[dimension]
+        if len(index) < len(names):
+            index.extend(names[len(index):])
+        return index
+
+
+    def _search_names(self, index, search_name, groups):
+        '''
+        Searches the names of groups (a dictionary of name -> transactions) using index.
+        Groups built from a plain list of transactions can have names the index has not
+        seen, in which case a throw away index of the group names is used.
+        '''
+        with profiling.stage('filter'):
+            for name in groups:
+                if name not in index:
+                    index = search.NameIndex(groups)
+                    break
+            matches = [(name, groups[name]) for name in index.search(search_name) if name in groups]
+            profiling.rows(len(groups), len(matches))
+        return matches
+
+
+    @profiling.timed('group')
     def get_tags(self, transactions_param):
         '''
         Creates a dictionary of tags based on the list of transactions passed in.
         Tag names are the keys.
         Total transaction amount are the values.
         '''
+        if isinstance(transactions_param, Rows):
+            tags = self.group_rows('tag', transactions_param)
+            # Keep the order of TAGS so the output matches the object based version.
+            return {tag: tags[tag] for tag in TAGS if tag in tags}
+
         tags_dict = dict()
         for transaction in transactions_param:
             for tag in TAGS:
@@ -163,22 +757,55 @@ class Transactions:
         return tags_dict
 
 
+    def _get_tags_from_rows(self, rows):
+        '''
+        Columnar version of get_tags. Each distinct labels value is matched against TAGS
+        once and the rows are then grouped by their labels code.
+        '''
+        store = rows.store
+        matches = [[tag for tag in TAGS if tag in labels] for labels in store.tag_names.values]
+
+        tag_rows = dict()
+        for row in rows.row_ids:
+            for tag in matches[store.tags[row]]:
+                if tag in tag_rows:
+                    tag_rows[tag].append(row)
+                else:
+                    tag_rows[tag] = array('I', [row])
+
+        tags_dict = dict()
+        for tag in tag_rows:
+            tags_dict[tag] = Rows(store, tag_rows[tag])
+        return tags_dict
+
+
     def get_tag_by_name(self, search_name, transactions_param):
         '''
-        Returns the first tag that matches search_name which is treated as a regular expression.
+        Returns the tag that best matches search_name which is treated as a regular expression.
+        See search_categories for how matches are ranked.
         '''
-        tags = self.get_tags(transactions_param)
-        for tag_name in tags:
-            if re.search(search_name.lower(), tag_name.lower()):
-                return tags[tag_name]
+        matches = self.search_tags(search_name, transactions_param)
+        if len(matches) > 0:
+            return matches[0][1]
         # If we get here then nothing was found.
         return None
 
 
+    def search_tags(self, search_name, transactions_param):
+        '''
+        Returns a list of (tag name, transactions) for every tag of the transactions passed in
+        whose name matches search_name, best match first.
+        '''
+        tags = self.get_tags(transactions_param)
+        return self._search_names(self.name_index('tag'), search_name, tags)
+
+
     def get_transactions_by_type(self, tran_type, start_date = None, end_date = None):
         '''
         Returns a list of transactions for a transaction type which is either
         debit or credit.
+        The list is a Rows view in date order found with the date index so no Transaction
+        objects are created and only the matching rows are looked at.
         '''
         if start_date is None:
             start_date = self.start_date
@@ -186,51 +813,468 @@ class Transactions:
         if end_date is None:
             end_date = self.end_date
 
-        matches = []
-        for transaction in self.transaction_list:
-            if (transaction.transaction_date >= start_date) and (transaction.transaction_date <= end_date):
-                if transaction.transaction_type.lower() == tran_type.lower():
-                    matches.append(transaction)
-        return matches
+        start = start_date.toordinal()
+        end = end_date.toordinal()
+        with profiling.stage('filter'):
+            type_codes = self.store.type_names.find(tran_type)
+            matches = self.date_index.find(start, end, type_codes)
+            profiling.rows(len(matches))
+        return Rows(self.store, matches, ('type', tran_type.lower(), start, end), in_date_order=True)
+
+
+    def find_transactions(self, text, tran_type = None, start_date = None, end_date = None):
+        '''
+        Returns the transactions that have every word of text in their description, original
+        description or notes, in date order. The last word can be the start of a word.
+        Unlike the other queries there is no date limit unless start_date or end_date is passed
+        so that every transaction with a merchant can be found.
+        '''
+        with profiling.stage('filter'):
+            rows = self.text_index.find(text)
+            scanned = len(rows)
+            store = self.store
+            start = start_date.toordinal() if start_date is not None else None
+            end = end_date.toordinal() if end_date is not None else None
+            type_codes = store.type_names.find(tran_type) if tran_type is not None else None
+            if start is not None or end is not None or type_codes is not None:
+                dates = store.dates
+                types = store.types
+                rows = [row for row in rows
+                        if (start is None or dates[row] >= start) and (end is None or dates[row] <= end)
+                        and (type_codes is None or types[row] in type_codes)]
+            matches = array('I', sorted(rows, key=store.dates.__getitem__))
+            profiling.rows(scanned, len(matches))
+        return Rows(store, matches, ('text', ' '.join(search.words(text)), tran_type, start, end), in_date_order=True)
+
+
+    def query(self, group_by = (), aggregates = ('sum',), **filters):
+        '''
+        Filters, groups and aggregates the transactions in a single pass.
+        filters are the predicates of queries.Query: start_date, end_date, tran_type,
+        category, account, tag, min_amount and max_amount. Unlike get_transactions_by_type
+        there is no date limit unless one is passed.
+        Returns a dictionary of group -> {aggregate: value}. See queries.Query.run.
+        '''
+        return queries.Query(group_by=group_by, aggregates=aggregates, **filters).run(self)
+
+
+    def select(self, **filters):
+        ''' Returns a Rows view of the transactions that match filters (see query), in date order. '''
+        query = queries.Query(**filters)
+        return Rows(self.store, query.rows(self), in_date_order=True)
 
 
+    @profiling.timed('group')
     def get_category_totals(self, categories):
-        ''' Create a dictionary of totals by category. '''
+        ''' Create a dictionary of totals by category. Totals are added up in whole cents. '''
         category_totals = dict()
         for category_name in categories.keys():
-            total = 0
-            for transaction in categories[category_name]:
-                total += transaction.amount
-            category_totals[category_name] = total
+            category_totals[category_name] = convert.to_dollars(total_cents(categories[category_name]))
         return category_totals
 
 
+    @profiling.timed('group')
+    def get_category_totals_by_type(self, tran_type, start_date = None, end_date = None):
+        '''
+        Returns a dictionary of totals by category for a transaction type and date range.
+        Date ranges that are whole months are answered from the monthly cube. Any other
+        range is filtered and totalled in one pass over the rows the date index finds.
+        '''
+        if start_date is None:
+            start_date = self.start_date
+
+        if end_date is None:
+            end_date = self.end_date
+
+        totals = self.query(('category',), ('sum',), start_date=start_date, end_date=end_date, tran_type=tran_type)
+        return {name: values['sum'] for name, values in totals.items()}
+
+
+    @profiling.timed('group')
+    def get_monthly_trend(self, tran_type, months, dimension = 'category'):
+        '''
+        Returns a dictionary of name -> list of monthly totals for a transaction type.
+        months is a list of (year, month) tuples which do not need to be consecutive.
+        dimension is 'category' or 'account'.
+        '''
+        keys = [year * 100 + month for year, month in months]
+        type_codes = self.store.type_names.find(tran_type)
+        return self.cube.trend(keys, type_codes, dimension)
+
+
+def total_cents(transactions):
+    ''' Returns the total of a list of transactions or a Rows view in whole cents. '''
+    if isinstance(transactions, Rows):
+        return transactions.cents()
+    return sum(transaction.cents for transaction in transactions)
+
+
+class Dictionary:
+    '''
+    Dictionary encoding for a low cardinality column.
+    Each distinct value is stored once in values and rows hold the index (code) of their value.
+    Values are interned so that every store and every Transaction shares one string
+    object per value and group by keys compare by identity.
+    '''
+
+    def __init__(self):
+        self.values = []
+        self.codes = dict()
+
+
+    def extend(self, values):
+        ''' Adds values to the dictionary in order. Used when restoring a saved dictionary. '''
+        for value in values:
+            self.encode(value)
+
+
+    def __len__(self):
+        return len(self.values)
+
+
+    def encode(self, value):
+        ''' Returns the code for value adding value to the dictionary if it is new. '''
+        code = self.codes.get(value)
+        if code is None:
+            value = sys.intern(value)
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+
+    def encode_all(self, values):
+        ''' Returns an iterator of the codes for a list of values adding any new values to the dictionary. '''
+        # Only the distinct values need to go through encode. dict.fromkeys keeps their order.
+        for value in dict.fromkeys(values):
+            if value not in self.codes:
+                self.encode(value)
+        return map(self.codes.__getitem__, values)
+
+
+    def find(self, value):
+        ''' Returns the set of codes whose value matches value ignoring case. '''
+        value = value.lower()
+        return {code for code, name in enumerate(self.values) if name.lower() == value}
+
+
+class ColumnStore:
+    '''
+    Column oriented storage for transactions.
+    Dates are stored as date ordinals and amounts as whole cents in typed arrays, so that
+    totals are exact and can be added up straight from the array.
+    Transaction type, category, account name and labels are dictionary encoded into small
+    integer codes. The free text fields are kept in plain lists.
+    '''
+
+    # Names of the attributes that hold data. Used by the snapshot module.
+    ARRAY_COLUMNS = ('dates', 'cents', 'types', 'categories', 'accounts', 'tags')
+    TEXT_COLUMNS = ('descriptions', 'original_descriptions', 'notes')
+    DICTIONARIES = ('type_names', 'category_names', 'account_names', 'tag_names')
+    CODED_COLUMNS = (('types', 'type_names'), ('categories', 'category_names'),
+                     ('accounts', 'account_names'), ('tags', 'tag_names'))
+
+    def __init__(self):
+        self.dates = array('i')
+        self.cents = array('q')
+        self.types = array('H')
+        self.categories = array('H')
+        self.accounts = array('H')
+        self.tags = array('H')
+        self.descriptions = []
+        self.original_descriptions = []
+        self.notes = []
+
+        self.type_names = Dictionary()
+        self.category_names = Dictionary()
+        self.account_names = Dictionary()
+        self.tag_names = Dictionary()
+
+        # Memory mapped snapshot the columns point into, if they were loaded from one.
+        self.buffer = None
+
+
+    def make_writable(self):
+        '''
+        Copies any numeric columns that point into a memory mapped snapshot into arrays so that
+        rows can be appended. Text columns from a snapshot can be appended to as they are.
+        '''
+        for name in self.ARRAY_COLUMNS:
+            column = getattr(self, name)
+            if isinstance(column, memoryview):
+                writable = array(column.format)
+                writable.frombytes(column.cast('B'))
+                setattr(self, name, writable)
+
+
+    def detach(self):
+        ''' Copies every column out of a memory mapped snapshot so the store no longer depends on it. '''
+        self.make_writable()
+        for name in self.TEXT_COLUMNS:
+            column = getattr(self, name)
+            if not isinstance(column, list):
+                setattr(self, name, list(column))
+        self.buffer = None
+
+
+    def keys(self):
+        '''
+        Yields the key of every row. The key is the date, original description, amount and
+        account name which together identify a line of the transaction file.
+        '''
+        accounts = self.account_names.values
+        return zip(self.dates, self.original_descriptions, self.cents,
+                   (accounts[code] for code in self.accounts))
+
+
+    def row_keys(self):
+        ''' Returns a Counter of the key of every row. '''
+        return Counter(self.keys())
+
+
+    def row_key(self, row):
+        ''' Returns the key of a single row. See keys. '''
+        return (self.dates[row], self.original_descriptions[row], self.cents[row],
+                self.account_names.values[self.accounts[row]])
+
+
+    def new_rows(self, other):
+        '''
+        Returns the rows of another store that are not already in this one.
+        Only rows dated within the span of dates both stores cover can be duplicates, so only
+        their keys are compared. Identical rows are counted so that a transaction that
+        happens twice on the same day is kept twice.
+        '''
+        if len(self) == 0 or len(other) == 0:
+            return list(range(len(other)))
+
+        low = max(min(self.dates), min(other.dates))
+        high = min(max(self.dates), max(other.dates))
+        existing = Counter(self.row_key(row) for row, day in enumerate(self.dates) if low <= day <= high)
+
+        rows = []
+        seen = Counter()
+        for row, day in enumerate(other.dates):
+            if low <= day <= high:
+                key = other.row_key(row)
+                seen[key] += 1
+                if seen[key] <= existing[key]:
+                    continue
+            rows.append(row)
+        return rows
+
+
+    def extend_store(self, other, dedupe=False):
+        '''
+        Adds the rows of another store to this one. The dictionary codes of other are
+        mapped onto the codes of this store.
+        When dedupe is True rows that are already in this store are skipped (see new_rows).
+        '''
+        self.make_writable()
+        rows = None
+        if dedupe:
+            rows = self.new_rows(other)
+            if len(rows) == len(other):
+                rows = None
+
+        # Every row is being added so whole columns can be copied.
+        if rows is None:
+            self.dates.extend(other.dates)
+            self.cents.extend(other.cents)
+            for name in self.TEXT_COLUMNS:
+                getattr(self, name).extend(getattr(other, name))
+            for codes_name, names_name in self.CODED_COLUMNS:
+                code_map = [getattr(self, names_name).encode(value) for value in getattr(other, names_name).values]
+                getattr(self, codes_name).extend(map(code_map.__getitem__, getattr(other, codes_name)))
+            return
+
+        self.dates.extend(other.dates[row] for row in rows)
+        self.cents.extend(other.cents[row] for row in rows)
+        for name in self.TEXT_COLUMNS:
+            column = getattr(other, name)
+            getattr(self, name).extend(column[row] for row in rows)
+        for codes_name, names_name in self.CODED_COLUMNS:
+            code_map = [getattr(self, names_name).encode(value) for value in getattr(other, names_name).values]
+            codes = getattr(other, codes_name)
+            getattr(self, codes_name).extend(code_map[codes[row]] for row in rows)
+
+
+    def __len__(self):
+        return len(self.dates)
+
+
+    def extend_lines(self, lines, parser, date_format=None):
+        '''
+        Adds lines of a transaction file to the store a column at a time.
+        parser is the sources.Parser for the header of the file.
+        The date format is detected from the lines when date_format is None.
+        Amounts that cannot be converted are stored as 0. Returns the number of them.
+        '''
+        self.dates.extend(parser.ordinals(lines, date_format))
+        self.descriptions.extend(parser.column('description', lines))
+        self.original_descriptions.extend(parser.column('original_description', lines))
+        cents, types, invalid = parser.amounts(lines)
+        self.cents.extend(cents)
+        self.types.extend(self.type_names.encode_all(types))
+        self.categories.extend(self.category_names.encode_all(parser.column('category', lines)))
+        self.accounts.extend(self.account_names.encode_all(parser.column('account_name', lines)))
+        self.tags.extend(self.tag_names.encode_all(parser.column('tags', lines)))
+        self.notes.extend(parser.column('notes', lines))
+        return invalid
+
+
+    def transaction(self, row):
+        '''
+        Creates a Transaction object for a single row.
+        The coded fields are the interned strings of the dictionaries and the date is shared
+        with every other transaction on the same day. Descriptions repeat for every visit
+        to the same merchant so they are interned as well.
+        '''
+        transaction = Transaction.__new__(Transaction)
+        transaction.transaction_date = shared_date(self.dates[row])
+        transaction.description = sys.intern(self.descriptions[row])
+        transaction.original_description = sys.intern(self.original_descriptions[row])
+        transaction.cents = self.cents[row]
+        transaction.transaction_type = self.type_names.values[self.types[row]]
+        transaction.category = self.category_names.values[self.categories[row]]
+        transaction.account_name = self.account_names.values[self.accounts[row]]
+        transaction.tags = self.tag_names.values[self.tags[row]]
+        transaction.notes = self.notes[row]
+        return transaction
+
+
+class Rows:
+    '''
+    A list like view over some of the rows in a ColumnStore.
+    Only the row numbers are held. Transaction objects are created as the view is
+    iterated or indexed so existing code that expects a list of transactions keeps working.
+    key describes the query that produced the rows so that results worked out from them
+    can be cached. Views that were not produced by a query have a key of None.
+    The row_ids array is never changed in place. Sorting replaces it.
+    in_date_order is True when the rows are known to be in date order already.
+    cents is the total of the rows in whole cents when it is already known.
+    '''
+
+    def __init__(self, store, row_ids, key=None, cents=None, in_date_order=False):
+        self.store = store
+        self.row_ids = row_ids
+        self.key = key
+        self._cents = cents
+        self.in_date_order = in_date_order
+
+
+    def __len__(self):
+        return len(self.row_ids)
+
+
+    def __iter__(self):
+        for row in self.row_ids:
+            yield self.store.transaction(row)
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Rows(self.store, self.row_ids[index], in_date_order=self.in_date_order and (index.step or 1) > 0)
+        return self.store.transaction(self.row_ids[index])
+
+
+    def sort(self, key=None, reverse=False):
+        ''' Sorts the view in place the same way list.sort would. '''
+        if key is None:
+            raise TypeError('Rows.sort requires a key function.')
+        transaction = self.store.transaction
+        ordered = sorted(self.row_ids, key=lambda row: key(transaction(row)), reverse=reverse)
+        self.row_ids = array('I', ordered)
+        self.in_date_order = False
+
+
+    def by_date(self):
+        '''
+        Returns a view of the same rows in date order. Rows on the same date keep their order.
+        The rows are sorted on the date column so no Transaction objects are created.
+        '''
+        if self.in_date_order:
+            return self
+        ordered = array('I', sorted(self.row_ids, key=self.store.dates.__getitem__))
+        return Rows(self.store, ordered, self.key, self._cents, True)
+
+
+    def cents(self):
+        ''' Returns the total of the rows in this view in whole cents. '''
+        if self._cents is None:
+            self._cents = sum(map(self.store.cents.__getitem__, self.row_ids))
+        return self._cents
+
+
+    def total(self):
+        ''' Returns the total amount of the rows in this view. It is exact to the cent. '''
+        return convert.to_dollars(self.cents())
+
+
+    def group_by(self, codes, names):
+        '''
+        Groups the rows in this view by a dictionary encoded column.
+        Returns a dictionary of value -> Rows.
+        '''
+        groups = dict()
+        for row in self.row_ids:
+            code = codes[row]
+            if code in groups:
+                groups[code].append(row)
+            else:
+                groups[code] = array('I', [row])
+
+        grouped = dict()
+        for code in groups:
+            grouped[names.values[code]] = Rows(self.store, groups[code])
+        return grouped
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def shared_date(ordinal):
+    ''' Returns the date for a date ordinal. Each date is created once and then shared. '''
+    return datetime.date.fromordinal(ordinal)
+
+
 class Transaction:
     '''
     Transaction class
+    A compact record with __slots__ and no __dict__. amount is worked out from cents
+    when it is read. Transaction type, category, account name and labels repeat on almost
+    every row and descriptions repeat for every visit to a merchant, so they are interned.
     '''
 
-    DATE_HEADER = 'date'
-    DESCRIPTION_HEADER = 'description'
-    ORIGINAL_DESCRIPTION_HEADER = 'original description'
-    AMOUNT_HEADER = 'amount'
-    TRANSACTION_TYPE_HEADER = 'transaction type'
-    CATEGORY_HEADER = 'category'
-    ACCOUNT_NAME_HEADER = 'account name'
-    TAGS_HEADER = 'labels'
-    NOTES_HEADER = 'notes'
-
-    index_dict = dict()
-
-    def __init__(self, transaction_details):
-
-        d = Transaction.index_dict
-        self.transaction_date = convert.to_date(transaction_details[d[Transaction.DATE_HEADER]])
-        self.description = transaction_details[d[Transaction.DESCRIPTION_HEADER]]
-        self.original_description = transaction_details[d[Transaction.ORIGINAL_DESCRIPTION_HEADER]]
-        self.amount = float(transaction_details[d[Transaction.AMOUNT_HEADER]])
-        self.transaction_type = transaction_details[d[Transaction.TRANSACTION_TYPE_HEADER]]
-        self.category = transaction_details[d[Transaction.CATEGORY_HEADER]]
-        self.account_name = transaction_details[d[Transaction.ACCOUNT_NAME_HEADER]]
-        self.tags = transaction_details[d[Transaction.TAGS_HEADER]]
-        self.notes = transaction_details[d[Transaction.NOTES_HEADER]]
+    __slots__ = ('transaction_date', 'description', 'original_description', 'cents',
+                 'transaction_type', 'category', 'account_name', 'tags', 'notes')
+
+    def __init__(self, transaction_details, parser=None, date_format=None):
+        '''
+        Creates a transaction from one line of a transaction file.
+        parser is the sources.Parser for the header of the file. By default the line is
+        read as a line of a Mint export.
+        '''
+        if parser is None:
+            parser = sources.MINT.compile(sources.MINT_HEADER)
+        if date_format is None:
+            date_format = parser.date_format([transaction_details])
+        self.transaction_date = convert.to_date(parser.value('date', transaction_details), date_format)
+        self.description = sys.intern(parser.value('description', transaction_details))
+        self.original_description = sys.intern(parser.value('original_description', transaction_details))
+        cents, transaction_type = parser.amount(transaction_details)
+        self.cents = cents
+        self.transaction_type = sys.intern(transaction_type)
+        self.category = sys.intern(parser.value('category', transaction_details))
+        self.account_name = sys.intern(parser.value('account_name', transaction_details))
+        self.tags = sys.intern(parser.value('tags', transaction_details))
+        self.notes = parser.value('notes', transaction_details)
+
+
+    @property
+    def amount(self):
+        ''' The amount as a float. It is the float closest to the exact amount in cents. '''
+        return convert.to_dollars(self.cents)
+
+
+    @amount.setter
+    def amount(self, value):
+        self.cents = round(value * 100)
@@ -0,0 +1,250 @@
+'''
+Exports reports in machine readable formats.
+
+Every report is first turned into a ReportTable, which holds the report column by column.
+A table can then be written as CSV, as JSON Lines (one object per row) or as a compact
+binary columnar file. Each format is written in bulk from the columns, and nothing is
+padded for display.
+
+Layout of a columnar file:
+    8 byte magic, 4 byte header length, JSON header, then each column padded to 8 bytes.
+Numbers are stored as raw arrays, dates as day ordinals and strings as a utf-8 blob plus
+an array of offsets (see snapshot.encode_strings).
+'''
+import sys
+import csv
+import json
+import struct
+import datetime
+from array import array
+import snapshot
+import profiling
+
+
+FORMATS = ('csv', 'jsonl', 'columns')
+
+COLUMNS_MAGIC = b'MINTCOLS'
+COLUMNS_VERSION = 1
+PREFIX = struct.Struct('<8sI')
+
+# Array type codes used for each column type in a columnar file.
+TYPECODES = {'float': 'd', 'int': 'q', 'date': 'i'}
+
+
+class ReportTable:
+    '''
+    A report held column by column.
+    fields is a list of (name, type) where type is 'str', 'float', 'int' or 'date'.
+    columns holds one sequence per field. Date columns hold day ordinals.
+    '''
+
+    def __init__(self, name, fields, columns):
+        self.name = name
+        self.fields = fields
+        self.columns = columns
+
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+
+    def names(self):
+        return [name for name, _ in self.fields]
+
+
+    def values(self):
+        '''
+        Returns the columns with dates turned into ISO strings, ready for text formats.
+        Each distinct date is only converted once.
+        '''
+        columns = []
+        for (_, kind), column in zip(self.fields, self.columns):
+            if kind == 'date':
+                days = {day: datetime.date.fromordinal(day).isoformat() for day in set(column)}
+                column = list(map(days.__getitem__, column))
+            columns.append(column)
+        return columns
+
+
+def accounts_table(accounts):
+    ''' Table of account name and total for the dictionary returned by Transactions.get_accounts. '''
+    names = list(accounts)
+    return ReportTable('accounts', [('account', 'str'), ('total', 'float')],
+                       [names, [accounts[name] for name in names]])
+
+
+def category_totals_table(category_totals):
+    '''
+    Table of category and total, largest first. Credit card payments are left out the same
+    as in reports.print_totals.
+    '''
+    names = [name for name in sorted(category_totals, key=category_totals.__getitem__, reverse=True)
+             if name.lower() != 'credit card payment']
+    return ReportTable('category_totals', [('category', 'str'), ('total', 'float')],
+                       [names, [category_totals[name] for name in names]])
+
+
+def category_comparison_table(previous_month_totals, current_month_totals):
+    ''' Table with the same rows as reports.print_category_comparison. '''
+    names = sorted(previous_month_totals, key=previous_month_totals.__getitem__, reverse=True)
+    previous = [previous_month_totals[name] for name in names]
+    current = [current_month_totals.get(name, 0) for name in names]
+    return ReportTable('category_comparison',
+                       [('category', 'str'), ('previous', 'float'), ('current', 'float'), ('difference', 'float')],
+                       [names, previous, current, [p - c for p, c in zip(previous, current)]])
+
+
+def daily_spending_table(days):
+    ''' Table of date and amount for the dictionary returned by Transactions.get_daily_spending. '''
+    ordered = sorted(days)
+    return ReportTable('daily_spending', [('date', 'date'), ('amount', 'float')],
+                       [[day.toordinal() for day in ordered], [days[day] for day in ordered]])
+
+
+TRANSACTION_FIELDS = [('date', 'date'), ('description', 'str'), ('original_description', 'str'),
+                      ('amount', 'float'), ('type', 'str'), ('category', 'str'), ('account', 'str'),
+                      ('tags', 'str'), ('notes', 'str')]
+
+
+@profiling.timed('render')
+def transactions_table(transactions):
+    '''
+    Table of transactions in date order.
+    A Rows view is read straight from the columns of its store so no Transaction
+    objects are created. Any other list of transactions is read attribute by attribute.
+    '''
+    if hasattr(transactions, 'by_date'):
+        rows = transactions.by_date()
+        store = rows.store
+        row_ids = rows.row_ids
+
+        def column(values):
+            return [values[row] for row in row_ids]
+
+        def amounts(cents):
+            return [cents[row] / 100 for row in row_ids]
+
+        def coded(codes, names):
+            return [names.values[codes[row]] for row in row_ids]
+
+        columns = [column(store.dates), column(store.descriptions), column(store.original_descriptions),
+                   amounts(store.cents), coded(store.types, store.type_names),
+                   coded(store.categories, store.category_names), coded(store.accounts, store.account_names),
+                   coded(store.tags, store.tag_names), column(store.notes)]
+    else:
+        ordered = sorted(transactions, key=lambda x: x.transaction_date)
+        columns = [[transaction.transaction_date.toordinal() for transaction in ordered]]
+        for name in ('description', 'original_description', 'amount', 'transaction_type',
+                     'category', 'account_name', 'tags', 'notes'):
+            columns.append([getattr(transaction, name) for transaction in ordered])
+    return ReportTable('transactions', TRANSACTION_FIELDS, columns)
+
+
+def table_dict(table):
+    ''' Returns table as a dictionary of name, fields and rows that json can encode. '''
+    return {'name': table.name, 'fields': table.names(), 'rows': [list(row) for row in zip(*table.values())]}
+
+
+def write_csv(table, out):
+    ''' Writes table to a text file as CSV with a header row. '''
+    writer = csv.writer(out)
+    writer.writerow(table.names())
+    writer.writerows(zip(*table.values()))
+
+
+def write_jsonl(table, out):
+    ''' Writes table to a text file as JSON Lines, one object per row. '''
+    names = table.names()
+    encode = json.JSONEncoder().encode
+    out.write(''.join(encode(dict(zip(names, row))) + '\n' for row in zip(*table.values())))
+
+
+def write_columns(table, out):
+    ''' Writes table to a binary file in the columnar layout described at the top of this module. '''
+    sections = []
+    for (name, kind), column in zip(table.fields, table.columns):
+        if kind == 'str':
+            blob, offsets = snapshot.encode_strings(column)
+            sections.append((name, kind, [memoryview(offsets).cast('B'), memoryview(blob)]))
+        else:
+            sections.append((name, kind, [memoryview(array(TYPECODES[kind], column)).cast('B')]))
+
+    header = {'version': COLUMNS_VERSION, 'name': table.name, 'rows': len(table), 'columns': []}
+    position = 0
+    for name, kind, parts in sections:
+        extents = []
+        for part in parts:
+            position += -position % snapshot.ALIGNMENT
+            extents.append([position, part.nbytes])
+            position += part.nbytes
+        header['columns'].append([name, kind, extents])
+
+    encoded_header = json.dumps(header).encode('utf-8')
+    start = PREFIX.size + len(encoded_header)
+    padding = -start % snapshot.ALIGNMENT
+    out.write(PREFIX.pack(COLUMNS_MAGIC, len(encoded_header)) + encoded_header + b'\0' * padding)
+
+    written = 0
+    for (_, _, parts), (_, _, extents) in zip(sections, header['columns']):
+        for part, (offset, _) in zip(parts, extents):
+            out.write(b'\0' * (offset - written))
+            out.write(part)
+            written = offset + part.nbytes
+
+
+def read_columns(fhand):
+    '''
+    Reads a columnar file written by write_columns from a binary file.
+    Returns a ReportTable whose columns are lists.
+    '''
+    magic, header_length = PREFIX.unpack(fhand.read(PREFIX.size))
+    if magic != COLUMNS_MAGIC:
+        raise ValueError('Not a columnar report file.')
+    header = json.loads(fhand.read(header_length).decode('utf-8'))
+    if header['version'] != COLUMNS_VERSION:
+        raise ValueError('Unsupported columnar report version: ' + str(header['version']))
+    start = PREFIX.size + header_length
+    start += -start % snapshot.ALIGNMENT
+    body = memoryview(fhand.read())[start - PREFIX.size - header_length:]
+
+    fields = []
+    columns = []
+    for name, kind, extents in header['columns']:
+        parts = [body[offset:offset + length] for offset, length in extents]
+        if kind == 'str':
+            column = list(snapshot.StringColumn(parts[1], parts[0].cast('q')))
+        else:
+            column = parts[0].cast(TYPECODES[kind]).tolist()
+        fields.append((name, kind))
+        columns.append(column)
+    return ReportTable(header['name'], fields, columns)
+
+
+WRITERS = {'csv': write_csv, 'jsonl': write_jsonl, 'columns': write_columns}
+
+
+@profiling.timed('render')
+def write(table, export_format, out):
+    ''' Writes table to out, which must be a binary file for the columns format. '''
+    if export_format not in WRITERS:
+        raise ValueError('Unknown export format: ' + export_format)
+    WRITERS[export_format](table, out)
+    profiling.rows(len(table))
+
+
+def export(table, export_format, path):
+    ''' Writes table to the file at path. A path of - writes to standard output. '''
+    if path == '-':
+        if export_format == 'columns':
+            write(table, export_format, sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+        else:
+            write(table, export_format, sys.stdout)
+        return
+
+    if export_format == 'columns':
+        with open(path, 'wb') as fhand:
+            write(table, export_format, fhand)
+    else:
+        with open(path, 'w', newline='') as fhand:
+            write(table, export_format, fhand)
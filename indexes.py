@@ -0,0 +1,174 @@
+'''
+Indexes over the columns of a ColumnStore.
+Indexes only hold row ids so they can be used with any store that has the same columns.
+'''
+from array import array
+from itertools import chain
+from bisect import bisect_left, bisect_right
+
+
+class DatePartition:
+    '''
+    Row ids sorted by date along with the date of each row.
+    Rows with the same date stay in the order they were added to the store.
+    '''
+
+    def __init__(self, dates, rows):
+        self.dates = dates
+        self.rows = rows
+
+
+    def __len__(self):
+        return len(self.rows)
+
+
+    def bounds(self, start, end):
+        ''' Returns the positions of the first row on or after start and the first row after end. '''
+        return bisect_left(self.dates, start), bisect_right(self.dates, end)
+
+
+    def find(self, start, end):
+        ''' Returns the row ids with a date between start and end (date ordinals, inclusive). '''
+        low, high = self.bounds(start, end)
+        return self.rows[low:high]
+
+
+    def day_totals(self, start, end, cents):
+        '''
+        Yields (date ordinal, total) for each day between start and end that has rows.
+        cents is the cents column of the store. The rows of a day sit next to each other
+        in the partition so each day is added up with one sum over the column.
+        '''
+        dates = self.dates
+        rows = self.rows
+        position, high = self.bounds(start, end)
+        while position < high:
+            day = dates[position]
+            day_end = bisect_right(dates, day, position, high)
+            yield day, sum(map(cents.__getitem__, rows[position:day_end]))
+            position = day_end
+
+
+    def insert(self, day, row):
+        ''' Adds a row keeping the partition sorted. '''
+        position = bisect_right(self.dates, day)
+        self.dates.insert(position, day)
+        self.rows.insert(position, row)
+
+
+class DateIndex:
+    '''
+    Date index for a store. There is a partition for all rows and one for every
+    transaction type (debit and credit for a Mint export) so that a date range query
+    for a type costs two binary searches plus the rows returned.
+    '''
+
+    def __init__(self, store):
+        self.store = store
+        self.build()
+
+
+    def build(self):
+        ''' Builds the partitions from scratch. '''
+        dates = self.store.dates
+        rows = array('I', sorted(range(len(dates)), key=dates.__getitem__))
+        self.all = DatePartition(array('i', map(dates.__getitem__, rows)), rows)
+
+        # The rows are already in date order so splitting them by type keeps each partition sorted.
+        types = self.store.types
+        partitions = dict()
+        for day, row in zip(self.all.dates, rows):
+            code = types[row]
+            if code not in partitions:
+                partitions[code] = DatePartition(array('i'), array('I'))
+            partitions[code].dates.append(day)
+            partitions[code].rows.append(row)
+        self.types = partitions
+
+
+    def add_rows(self, first_row):
+        '''
+        Adds the rows from first_row to the end of the store to the index.
+        Rows are inserted one at a time unless there are enough of them that sorting
+        everything again is cheaper.
+        '''
+        store = self.store
+        if (len(store) - first_row) * 8 > len(store):
+            self.build()
+            return
+
+        for row in range(first_row, len(store)):
+            day = store.dates[row]
+            code = store.types[row]
+            self.all.insert(day, row)
+            if code not in self.types:
+                self.types[code] = DatePartition(array('i'), array('I'))
+            self.types[code].insert(day, row)
+
+
+    def find(self, start, end, type_codes=None):
+        '''
+        Returns the row ids with a date between start and end (date ordinals, inclusive) in date order.
+        type_codes limits the rows to those transaction types.
+        '''
+        if type_codes is None:
+            return self.all.find(start, end)
+
+        partitions = [self.types[code] for code in type_codes if code in self.types]
+        if len(partitions) == 0:
+            return array('I')
+        if len(partitions) == 1:
+            return partitions[0].find(start, end)
+
+        found = chain.from_iterable(partition.find(start, end) for partition in partitions)
+        return array('I', sorted(found, key=self.store.dates.__getitem__))
+
+
+class GroupIndex:
+    '''
+    Secondary index from the values of a dictionary encoded column to the rows that hold
+    them, with a running total of their amounts in whole cents.
+    groups_for_code maps a code to the names of the groups a row with that code belongs to.
+    This lets a row belong to more than one group (labels can name several tags).
+    '''
+
+    def __init__(self, store, column, groups_for_code):
+        self.store = store
+        self.column = column
+        self.groups_for_code = groups_for_code
+        self.rows = dict()
+        self.totals = dict()
+        self.add_rows(0)
+
+
+    def add_rows(self, first_row):
+        '''
+        Adds the rows from first_row to the end of the store to the index.
+        Existing row arrays are replaced rather than appended to so that views handed out
+        before the rows were added do not change.
+        '''
+        codes = getattr(self.store, self.column)
+        cents = self.store.cents
+        groups = dict()
+        new_rows = dict()
+        new_totals = dict()
+        for row in range(first_row, len(codes)):
+            code = codes[row]
+            names = groups.get(code)
+            if names is None:
+                names = groups[code] = self.groups_for_code(code)
+            for name in names:
+                if name in new_rows:
+                    new_rows[name].append(row)
+                    new_totals[name] += cents[row]
+                else:
+                    new_rows[name] = array('I', [row])
+                    new_totals[name] = cents[row]
+
+        for name in new_rows:
+            if name in self.rows:
+                self.rows[name] = self.rows[name] + new_rows[name]
+                self.totals[name] += new_totals[name]
+            else:
+                self.rows[name] = new_rows[name]
+                self.totals[name] = new_totals[name]
@@ -2,12 +2,15 @@
 CLI interface for the Mint app.
 '''
 import sys
+import argparse
 import datetime
-import calendar
 import convert
+import cube
 import charts
 import reports
 import data
+import profiling
+import settings
 
 
 def print_menu():
@@ -16,27 +19,110 @@ def print_menu():
     '''
     print('\n')
     print('a - to get a list of accounts being tracked by your Mint account.')
-    print('cat [category name] - to see spending by category. If a category name is passed then the details for that category will be shown.')
+    print('cat [category name] - to see spending by category. If a category name is passed then the details for every matching category will be shown, best match first.')
+    print('chart [pie|trend|day] [png|svg] - to write a chart for the current date range to an image file.')
     print('cp - to compare the current month to the previous month.')
     print('day [date] - to show daily spend for the current date range. If a date is passed then the details for that day will be shown.')
     print('dr [start date] [end date] - to change the date range for which pricing data is loaded.')
+    print('export [report] [format] [file] - to write a report (' + ', '.join(EXPORT_REPORTS) + ') as csv, jsonl or columns to a file (- for the screen).')
+    print('find [words] - to see every transaction with those words in its description or notes, with totals.')
     print('help - to show this help menu')
     print('income - to see income for the current date range.')
-    print('lf - to load the transaction file.')
+    print('lf - to load new transactions from the transaction file.')
     print('pie - to see a pie chart of spending by category.')
     print('spending - to see spending for the current date range.')
-    print('tag [tag name] - to see spending by tag. If a tag name is passed then the details for that tag will be shown.')
+    print('tag [tag name] - to see spending by tag. If a tag name is passed then the details for every matching tag will be shown, best match first.')
+    print('trend [months] - to see spending by category for each of the last few months (6 by default) up to the end of the date range.')
     print('quit - to quit this program')
     print('\n')
 
 
-def get_user_requests():
+def get_months(end_date, month_count):
+    '''
+    Returns a list of (year, month) tuples for the month_count months ending with
+    the month of end_date. The oldest month is first.
+    '''
+    return cube.last_months(end_date, month_count)
+
+
+def get_month_comparison(transactions):
+    '''
+    Returns the debit totals by category for the previous month and the current month.
+    '''
+    now = datetime.datetime.now()
+    current_month_totals = transactions.get_category_totals_by_type('debit', *cube.month_dates(now.year, now.month))
+    previous_month = cube.previous_month(now.year, now.month)
+    previous_month_totals = transactions.get_category_totals_by_type('debit', *cube.month_dates(*previous_month))
+    return previous_month_totals, current_month_totals
+
+
+# Charts that can be written to a file with the chart command.
+CHARTS = ['pie', 'trend', 'day']
+
+
+def write_chart(transactions, chart_name, image_format='png'):
+    '''
+    Writes one of CHARTS for the current date range to an image file and returns its path.
+    The trend chart covers the 6 months up to the end of the date range.
+    Charts that were drawn before from the same numbers are not drawn again.
+    '''
+    if chart_name == 'pie':
+        category_totals = transactions.get_category_totals_by_type('debit')
+        return charts.category_pie_image(category_totals, transactions.start_date, transactions.end_date, image_format)
+    if chart_name == 'trend':
+        months = get_months(transactions.end_date, 6)
+        return charts.monthly_trend_image(months, transactions.get_monthly_trend('debit', months), image_format)
+    if chart_name == 'day':
+        return charts.daily_spending_image(transactions.get_daily_spending(), image_format)
+    raise ValueError('Unknown chart: ' + chart_name)
+
+
+# Reports that can be exported with the export command.
+EXPORT_REPORTS = ['a', 'cat', 'cp', 'day', 'income', 'spending']
+
+
+def get_report_table(transactions, report_name):
+    '''
+    Returns an export.ReportTable for one of EXPORT_REPORTS over the current date range.
+    '''
+    import export
+    if report_name == 'a':
+        return export.accounts_table(transactions.get_accounts())
+    if report_name == 'cat':
+        return export.category_totals_table(transactions.get_category_totals_by_type('debit'))
+    if report_name == 'cp':
+        return export.category_comparison_table(*get_month_comparison(transactions))
+    if report_name == 'day':
+        return export.daily_spending_table(transactions.get_daily_spending())
+    if report_name == 'income':
+        return export.transactions_table(transactions.get_transactions_by_type('credit'))
+    if report_name == 'spending':
+        return export.transactions_table(transactions.get_transactions_by_type('debit'))
+    raise ValueError('Unknown report: ' + report_name)
+
+
+def show_transactions(title, transactions, limit=None, offset=0, paging=True):
+    '''
+    Prints a transaction listing. When limit or offset is given only that slice is printed,
+    which is meant for scripts. Otherwise a listing longer than settings.PAGE_SIZE is shown
+    a page at a time when paging is on and the output is a terminal.
+    '''
+    if (paging and limit is None and offset == 0 and sys.stdout.isatty() and
+            len(transactions) > settings.PAGE_SIZE):
+        reports.page_transactions(title, transactions, settings.PAGE_SIZE)
+    else:
+        reports.print_transactions(title, transactions, limit=limit, offset=offset)
+
+
+def get_user_requests(data_file=None, limit=None, offset=0):
     '''
     User request loop. Reads the next command from the user and then calls
     the appropriate function.
+    limit and offset are applied to every transaction listing (see show_transactions).
     '''
 
-    transactions = data.Transactions()
+    with profiling.command('load'):
+        transactions = data.Transactions(data_file)
     print(str(transactions.count) + ' transactions loaded.')
 
     # User request loop
@@ -45,131 +131,307 @@ def get_user_requests():
         prompt = str(transactions.start_date) + ' - ' + str(transactions.end_date)
         command = input(prompt + ' --> ')
 
-        if command[0:2] == 'a':
-            accounts = transactions.get_accounts()
-            reports.print_accounts(accounts)
-            continue
+        if command == 'quit' or command == 'q':
+            break
 
-        if command[0:3] == 'cat':
-            params = command[3:].strip()
-            params_list = params.split(' ')
-            search_name = params_list[0]
-            debits = transactions.get_transactions_by_type('debit')
-
-            if len(search_name) == 0:
-                categories = transactions.get_categories(debits)
-                reports.print_category_totals(categories)
-            else:
-                category_transactions = transactions.get_category_by_name(search_name, debits)
-                if category_transactions is None:
-                    print('No transactions found for category: ' + search_name + '.')
-                else:
-                    reports.print_transactions(search_name, category_transactions)
-            continue
+        with profiling.command(command):
+            known = run_command(transactions, command, limit, offset)
+        if not known:
+            print('*** Unrecognized command ***')
 
-        if command[0:3] == 'tag':
-            params = command[3:].strip()
-            params_list = params.split(' ')
-            search_name = params_list[0]
-            debits = transactions.get_transactions_by_type('debit')
-
-            if len(search_name) == 0:
-                tags = transactions.get_tags(debits)
-                reports.print_category_totals(tags)
-            else:
-                tag_transactions = transactions.get_tag_by_name(search_name, debits)
-                if tag_transactions is None:
-                    print('No transactions found for tag: ' + search_name + '.')
-                else:
-                    reports.print_transactions(search_name, tag_transactions)
-            continue
 
-        if command == 'cp':
-            now = datetime.datetime.now()
-            year = now.year
-            month = now.month
-            # returns a touple which is the day of the week of the first day of the month and
-            # the number of days in the month.
-            last_day = calendar.monthrange(year, month)[1]
-            start_date = datetime.date(year, month, 1)
-            end_date = datetime.date(year, month, last_day)
-            debits = transactions.get_transactions_by_type('debit', start_date, end_date)
-            current_month = transactions.get_categories(debits)
-            current_month_totals = transactions.get_category_totals(current_month)
-
-            # Get previous month.
-            if month == 1:
-                year -= 1
-                month = 12
-            else:
-                month -= 1
-
-            last_day = calendar.monthrange(year, month)[1]
-            start_date = datetime.date(year, month, 1)
-            end_date = datetime.date(year, month, last_day)
-            debits = transactions.get_transactions_by_type('debit', start_date, end_date)
-            previous_month = transactions.get_categories(debits)
-            previous_month_totals = transactions.get_category_totals(previous_month)
-
-            reports.print_category_comparison(previous_month_totals, current_month_totals)
-            continue
+def run_command(transactions, command, limit=None, offset=0, paging=True):
+    '''
+    Runs one command against the loaded transactions.
+    Returns False if the command is not recognized. quit is left to the caller.
+    paging=False turns off paging of long listings, which is what batch mode wants.
+    '''
+    if command[0:2] == 'a':
+        accounts = transactions.get_accounts()
+        reports.print_accounts(accounts)
+        return True
 
-        if command[0:3] == 'day':
-            report_date = command[3:].strip()
-            if len(report_date) > 0:
-                report_date = report_date.split(' ')
-                report_date = convert.to_date(report_date)
-            else:
-                days = transactions.get_daily_spending()
-                reports.print_daily_spending(days)
-            continue
+    if command[0:3] == 'cat':
+        params = command[3:].strip()
+        params_list = params.split(' ')
+        search_name = params_list[0]
+        debits = transactions.get_transactions_by_type('debit')
 
-        if command[0:2] == 'dr':
-            params = command[2:].strip()
-            params_list = params.split(' ')
-            start_date = params_list[0]
-            end_date = params_list[1]
-            transactions.start_date = convert.to_date(start_date)
-            transactions.end_date = convert.to_date(end_date)
-            continue
+        if len(search_name) == 0:
+            category_totals = transactions.get_category_totals_by_type('debit')
+            reports.print_totals(category_totals)
+        else:
+            matches = transactions.search_categories(search_name, debits)
+            if len(matches) == 0:
+                print('No transactions found for category: ' + search_name + '.')
+            for category_name, category_transactions in matches:
+                show_transactions(category_name, category_transactions, limit, offset, paging)
+        return True
 
-        if command == 'help':
-            print_menu()
-            continue
+    if command[0:3] == 'tag':
+        params = command[3:].strip()
+        params_list = params.split(' ')
+        search_name = params_list[0]
+        debits = transactions.get_transactions_by_type('debit')
 
-        if command == 'income':
-            credit_transactions = transactions.get_transactions_by_type('credit')
-            reports.print_transactions('Credits', credit_transactions)
-            reports.print_transaction_totals('Credits', credit_transactions)
-            continue
+        if len(search_name) == 0:
+            tags = transactions.get_tags(debits)
+            reports.print_category_totals(tags)
+        else:
+            matches = transactions.search_tags(search_name, debits)
+            if len(matches) == 0:
+                print('No transactions found for tag: ' + search_name + '.')
+            for tag_name, tag_transactions in matches:
+                show_transactions(tag_name, tag_transactions, limit, offset, paging)
+        return True
 
-        if command == 'spending':
-            debit_transactions = transactions.get_transactions_by_type('debit')
-            reports.print_transactions('Debits', debit_transactions)
-            reports.print_transaction_totals('Debits', debit_transactions)
-            continue
+    if command == 'cp':
+        previous_month_totals, current_month_totals = get_month_comparison(transactions)
+        reports.print_category_comparison(previous_month_totals, current_month_totals)
+        return True
 
-        if command == 'lf':
-            print('Reloading transaction file ...')
-            transactions = transactions.Transactions()
-            continue
+    if command[0:3] == 'day':
+        report_date = command[3:].strip()
+        if len(report_date) > 0:
+            report_date = report_date.split(' ')
+            report_date = convert.to_date(report_date)
+        else:
+            days = transactions.get_daily_spending()
+            reports.print_daily_spending(days)
+        return True
 
-        if command == 'pie':
-            debits = transactions.get_transactions_by_type('debit')
-            categories = transactions.get_categories(debits)
-            charts.category_pie_chart(categories)
-            continue
+    if command[0:2] == 'dr':
+        params = command[2:].strip()
+        params_list = params.split(' ')
+        start_date = params_list[0]
+        end_date = params_list[1]
+        transactions.start_date = convert.to_date(start_date)
+        transactions.end_date = convert.to_date(end_date)
+        return True
+
+    if command[0:6] == 'export':
+        import export
+        params_list = command[6:].split()
+        if (len(params_list) != 3 or params_list[0] not in EXPORT_REPORTS or
+                params_list[1] not in export.FORMATS):
+            print('Usage: export [' + '|'.join(EXPORT_REPORTS) + '] [' + '|'.join(export.FORMATS) + '] [file or -]')
+            return True
+        report_name, export_format, path = params_list
+        export.export(get_report_table(transactions, report_name), export_format, path)
+        return True
+
+    if command[0:4] == 'find':
+        text = command[4:].strip()
+        matches = transactions.find_transactions(text)
+        if len(matches) == 0:
+            print('No transactions found for: ' + text + '.')
+        else:
+            show_transactions(text, matches, limit, offset, paging)
+            print('\n')
+            reports.print_transaction_totals('Debits', transactions.find_transactions(text, 'debit'))
+            reports.print_transaction_totals('Credits', transactions.find_transactions(text, 'credit'))
+        return True
+
+    if command == 'help':
+        print_menu()
+        return True
+
+    if command == 'income':
+        credit_transactions = transactions.get_transactions_by_type('credit')
+        show_transactions('Credits', credit_transactions, limit, offset, paging)
+        reports.print_transaction_totals('Credits', credit_transactions)
+        return True
+
+    if command == 'spending':
+        debit_transactions = transactions.get_transactions_by_type('debit')
+        show_transactions('Debits', debit_transactions, limit, offset, paging)
+        reports.print_transaction_totals('Debits', debit_transactions)
+        return True
+
+    if command == 'lf':
+        print('Reloading transaction file ...')
+        added = transactions.refresh()
+        print(str(added) + ' new transactions loaded.')
+        return True
 
+    if command[0:5] == 'chart':
+        params_list = command[5:].split()
+        chart_name = params_list[0] if len(params_list) > 0 else 'pie'
+        image_format = params_list[1] if len(params_list) > 1 else 'png'
+        if chart_name not in CHARTS or image_format not in charts.IMAGE_FORMATS:
+            print('Usage: chart [' + '|'.join(CHARTS) + '] [' + '|'.join(charts.IMAGE_FORMATS) + ']')
+            return True
+        try:
+            path = write_chart(transactions, chart_name, image_format)
+        except ImportError:
+            print('Charts need matplotlib, which is not installed.')
+            return True
+        print(path)
+        return True
+
+    if command == 'pie':
+        category_totals = transactions.get_category_totals_by_type('debit')
+        try:
+            charts.category_totals_pie_chart(category_totals)
+        except ImportError:
+            print('Charts need matplotlib, which is not installed.')
+        return True
+
+    if command[0:5] == 'trend':
+        params = command[5:].strip()
+        month_count = convert.to_int(params) if len(params) > 0 else 6
+        months = get_months(transactions.end_date, month_count)
+        trend = transactions.get_monthly_trend('debit', months)
+        reports.print_monthly_trend(months, trend)
+        return True
+
+    return False
+
+
+def read_script(script):
+    ''' Returns the lines of a script file. A script of - is read from standard input. '''
+    if script == '-':
+        return sys.stdin.read().splitlines()
+    with open(script, 'r') as fhand:
+        return fhand.read().splitlines()
+
+
+def run_batch(commands, data_file=None, limit=None, offset=0):
+    '''
+    Runs commands one after the other against a single load of the transaction file.
+    Blank lines and lines starting with # are skipped and quit stops the batch.
+    A command that fails or is not recognized is reported on standard error and the
+    rest of the commands are still run.
+    Returns the exit code: EXIT_OK if every command ran and EXIT_FAILED otherwise.
+    '''
+    with profiling.command('load'):
+        transactions = data.Transactions(data_file)
+    exit_code = EXIT_OK
+    for command in commands:
+        command = command.strip()
+        if len(command) == 0 or command[0] == '#':
+            continue
         if command == 'quit' or command == 'q':
             break
+        try:
+            with profiling.command(command):
+                known = run_command(transactions, command, limit, offset, paging=False)
+            if not known:
+                print('*** Unrecognized command: ' + command + ' ***', file=sys.stderr)
+                exit_code = EXIT_FAILED
+        except Exception as error:
+            print('*** Command failed: ' + command + ': ' + repr(error) + ' ***', file=sys.stderr)
+            exit_code = EXIT_FAILED
+    sys.stdout.flush()
+    return exit_code
+
+
+# Exit codes.
+EXIT_OK = 0
+EXIT_FAILED = 1
+
+# Reports that can be run with --stream.
+STREAM_REPORTS = ['a', 'cat', 'day']
+
+
+def run_stream_reports(report_names, data_file=None, start_date=None, end_date=None):
+    '''
+    Runs one-off reports in a single pass over the transaction file without loading it.
+    Meant for files that are too large to keep in memory.
+    '''
+    import stream
+    with profiling.stage('parse'):
+        totals = stream.aggregate(data_file, start_date, end_date)
+        profiling.rows(totals.rows_read, totals.rows_matched)
+    print(str(totals.rows_read) + ' transactions read.')
+
+    for report_name in report_names:
+        if report_name == 'a':
+            reports.print_accounts(totals.accounts)
+        elif report_name == 'cat':
+            reports.print_totals(totals.categories)
+        elif report_name == 'day':
+            reports.print_daily_spending(totals.days)
 
-        print('*** Unrecognized command ***')
+
+def count(value):
+    ''' argparse type for a number of rows. '''
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError('must not be negative: ' + value)
+    return number
+
+
+def parse_args(argv):
+    ''' Parses the command line arguments. '''
+    parser = argparse.ArgumentParser(description='Reports on transactions downloaded from Mint.')
+    parser.add_argument('--file', help='transaction file to use in place of the one in settings')
+    parser.add_argument('--stream', nargs='+', choices=STREAM_REPORTS, metavar='REPORT',
+                        help='run reports (' + ', '.join(STREAM_REPORTS) + ') in one pass over the file '
+                             'without loading it and then exit')
+    parser.add_argument('--start', type=convert.to_date, help='first date for --stream reports (default: no limit)')
+    parser.add_argument('--end', type=convert.to_date, help='last date for --stream reports (default: no limit)')
+    parser.add_argument('-c', '--command', action='append', metavar='COMMAND',
+                        help='run a command (as typed at the prompt) and exit instead of prompting. '
+                             'Can be given more than once. The file is only loaded once.')
+    parser.add_argument('--script', metavar='FILE',
+                        help='run the commands in FILE (one per line, - for standard input) and exit')
+    parser.add_argument('--serve', action='store_true',
+                        help='keep the transactions loaded and answer commands sent as JSON over HTTP on localhost')
+    parser.add_argument('--port', type=int, default=settings.SERVER_PORT,
+                        help='port for --serve (default: ' + str(settings.SERVER_PORT) + ')')
+    parser.add_argument('--timing', metavar='FILE',
+                        help='append a JSON record of the time each command spent loading, parsing, filtering, '
+                             'grouping and rendering to FILE (- for standard error)')
+    parser.add_argument('--profile', action='store_true',
+                        help='add the functions that took the most time (cProfile) to each timing record')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='add the peak memory and the lines that allocated the most (tracemalloc) '
+                             'to each timing record')
+    parser.add_argument('--limit', type=count, help='show at most this many rows of each transaction listing')
+    parser.add_argument('--offset', type=count, default=0, help='skip this many rows of each transaction listing')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    ''' Entry point for the command line. Returns the exit code. '''
+    args = parse_args(argv)
+    timing_file = None
+    try:
+        if args.timing or args.profile or args.trace_memory:
+            timing_file = open_timing_file(args.timing)
+            profiling.start(timing_file, args.profile, args.trace_memory)
+        if args.stream:
+            with profiling.command('stream ' + ' '.join(args.stream)):
+                run_stream_reports(args.stream, args.file, args.start, args.end)
+        elif args.serve:
+            import server
+            server.serve(args.file, port=args.port)
+        elif args.command or args.script:
+            commands = list(args.command or [])
+            if args.script:
+                commands.extend(read_script(args.script))
+            return run_batch(commands, args.file, args.limit, args.offset)
+        else:
+            # This function is a user request loop.
+            get_user_requests(args.file, args.limit, args.offset)
+    except data.LOAD_ERRORS + (OSError,) as error:
+        print(str(error), file=sys.stderr)
+        return EXIT_FAILED
+    finally:
+        profiling.stop()
+        if timing_file is not None and timing_file is not sys.stderr:
+            timing_file.close()
+    return EXIT_OK
+
+
+def open_timing_file(path):
+    ''' Opens the file timing records are appended to. No path or - is standard error. '''
+    if path is None or path == '-':
+        return sys.stderr
+    return open(path, 'a')
 
 
 if __name__ == '__main__':
     # Main execution
-    # Passed arguments
-    print(sys.argv)
-
-    # This function is a user request loop.
-    get_user_requests()
+    sys.exit(main())
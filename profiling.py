@@ -0,0 +1,361 @@
+'''
+Instrumentation for mint.py commands.
+
+While a command is measured the time it spends in each stage is added up:
+    load    reading the transaction file or its snapshot and bringing it up to date
+    parse   turning lines of the file into columns
+    filter  picking out the transactions a command asks for
+    group   grouping and totalling them
+    render  formatting and writing the report
+Stage times are exclusive, so the time spent parsing during a load only counts as parse.
+Time that is not in any stage is the other_seconds of the record. Each stage also counts
+the rows it looked at (rows_scanned) and the rows it handed on (rows_returned).
+
+cProfile and tracemalloc can be turned on as well. They slow every command down, so
+stage times measured with them are only good for comparing with each other.
+
+Each command is written as one JSON record per line so that records from many runs can
+be put together with summarize:
+    {"time": "2017-03-15T10:01:02", "command": "cat", "params": "groceries", "seconds": 0.012,
+     "stages": {"filter": {"seconds": 0.001, "calls": 1, "rows_scanned": 310, "rows_returned": 310}, ...},
+     "other_seconds": 0.0004}
+
+When nothing is being measured stage() hands back a shared context manager that does
+nothing, so the instrumented code in data.py and reports.py costs next to nothing.
+Only the thread that started a command is measured.
+
+Usage:
+    python mint.py --timing timings.jsonl -c cat -c spending
+    python profiling.py timings.jsonl           # average time of each stage of each command
+'''
+import sys
+import json
+import time
+import argparse
+import datetime
+import threading
+import functools
+
+
+STAGES = ('load', 'parse', 'filter', 'group', 'render')
+
+# Number of functions kept from a cProfile run and of lines kept from a tracemalloc snapshot.
+PROFILE_TOP = 25
+MEMORY_TOP = 10
+
+# The recorder set up by start and the command it is measuring.
+_recorder = None
+_measurement = None
+
+
+class _NullStage:
+    ''' Context manager used for stages when nothing is being measured. '''
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_STAGE = _NullStage()
+
+
+class Measurement:
+    ''' Stage times and row counts for one command. '''
+
+    def __init__(self, command):
+        self.command = command
+        self.thread = threading.get_ident()
+        self.stages = dict()
+        self.stack = []
+        self.started = time.perf_counter()
+        self.mark = self.started
+        self.seconds = None
+
+
+    def stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = {'seconds': 0.0, 'calls': 0, 'rows_scanned': 0, 'rows_returned': 0}
+        return self.stages[name]
+
+
+    def enter(self, name):
+        now = time.perf_counter()
+        if self.stack:
+            self.stages[self.stack[-1]]['seconds'] += now - self.mark
+        self.stack.append(name)
+        self.stage(name)['calls'] += 1
+        self.mark = now
+
+
+    def exit(self):
+        now = time.perf_counter()
+        self.stages[self.stack.pop()]['seconds'] += now - self.mark
+        self.mark = now
+
+
+    def count(self, scanned, returned):
+        ''' Adds row counts to the innermost stage that is running. '''
+        if not self.stack:
+            return
+        stage = self.stages[self.stack[-1]]
+        stage['rows_scanned'] += scanned
+        stage['rows_returned'] += returned
+
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+
+
+    def record(self):
+        ''' Returns the measurement as a dictionary that json can encode. '''
+        name, _, params = self.command.strip().partition(' ')
+        stages = {name: dict(stage, seconds=round(stage['seconds'], 6)) for name, stage in self.stages.items()}
+        other = self.seconds - sum(stage['seconds'] for stage in self.stages.values())
+        return {'time': datetime.datetime.now().isoformat(timespec='seconds'),
+                'command': name, 'params': params.strip(),
+                'seconds': round(self.seconds, 6), 'stages': stages,
+                'other_seconds': round(max(other, 0.0), 6)}
+
+
+class _Stage:
+    ''' Context manager that charges the time it is open to a stage of a Measurement. '''
+
+    __slots__ = ('measurement', 'name')
+
+    def __init__(self, measurement, name):
+        self.measurement = measurement
+        self.name = name
+
+
+    def __enter__(self):
+        self.measurement.enter(self.name)
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.measurement.exit()
+        return False
+
+
+def stage(name):
+    '''
+    Returns a context manager that charges the time spent in it to stage name of the
+    command being measured.
+    '''
+    measurement = _measurement
+    if measurement is None or measurement.thread != threading.get_ident():
+        return NULL_STAGE
+    return _Stage(measurement, name)
+
+
+def timed(name):
+    ''' Decorator that runs a function in stage name. '''
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def rows(scanned, returned=None):
+    '''
+    Counts rows for the innermost stage of the command being measured.
+    returned defaults to scanned, for stages that hand on every row they look at.
+    '''
+    measurement = _measurement
+    if measurement is None or measurement.thread != threading.get_ident():
+        return
+    measurement.count(scanned, scanned if returned is None else returned)
+
+
+def profile_record(profiler, top=PROFILE_TOP):
+    ''' Returns the top functions of a cProfile run by cumulative time. '''
+    import pstats
+    stats = pstats.Stats(profiler).stats
+    ordered = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[0:top]
+    return [{'function': '{0}:{1}({2})'.format(*function), 'calls': calls,
+             'total_seconds': round(total, 6), 'cumulative_seconds': round(cumulative, 6)}
+            for function, (_, calls, total, cumulative, _) in ordered]
+
+
+def memory_record(snapshot, peak, top=MEMORY_TOP):
+    ''' Returns the peak traced memory and the lines that allocated the most during a command. '''
+    import tracemalloc
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    statistics = snapshot.statistics('lineno')[0:top]
+    return {'peak_kb': round(peak / 1024, 1),
+            'top': [{'where': '{0}:{1}'.format(stat.traceback[0].filename, stat.traceback[0].lineno),
+                     'size_kb': round(stat.size / 1024, 1), 'count': stat.count} for stat in statistics]}
+
+
+class Recorder:
+    '''
+    Measures commands and writes a record for each one to out (see write).
+    profile adds a cProfile of each command and trace_memory a tracemalloc summary.
+    '''
+
+    def __init__(self, out=None, profile=False, trace_memory=False):
+        self.out = out
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.records = []
+
+
+    def measure(self, command):
+        ''' Context manager that measures one command. '''
+        return _Command(self, command)
+
+
+    def write(self, record):
+        ''' Writes record to out. Without an out the records are kept in the records list. '''
+        if self.out is None:
+            self.records.append(record)
+            return
+        self.out.write(json.dumps(record) + '\n')
+        self.out.flush()
+
+
+class _Command:
+    ''' Context manager that measures one command for a Recorder. '''
+
+    def __init__(self, recorder, command):
+        self.recorder = recorder
+        self.command = command
+        self.outer = None
+        self.profiler = None
+        self.traced = False
+
+
+    def __enter__(self):
+        global _measurement
+        self.outer = _measurement
+        if self.recorder.trace_memory:
+            import tracemalloc
+            self.traced = not tracemalloc.is_tracing()
+            if self.traced:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        if self.recorder.profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+        self.measurement = Measurement(self.command)
+        _measurement = self.measurement
+        if self.profiler is not None:
+            self.profiler.enable()
+        return self.measurement
+
+
+    def __exit__(self, *exc_info):
+        global _measurement
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.measurement.finish()
+        _measurement = self.outer
+
+        record = self.measurement.record()
+        if exc_info[0] is not None:
+            record['error'] = repr(exc_info[1])
+        if self.profiler is not None:
+            record['profile'] = profile_record(self.profiler)
+        if self.recorder.trace_memory:
+            import tracemalloc
+            peak = tracemalloc.get_traced_memory()[1]
+            record['memory'] = memory_record(tracemalloc.take_snapshot(), peak)
+            if self.traced:
+                tracemalloc.stop()
+        self.recorder.write(record)
+        return False
+
+
+def start(out=None, profile=False, trace_memory=False):
+    ''' Sets up the recorder used by command. Returns the Recorder. '''
+    global _recorder
+    _recorder = Recorder(out, profile, trace_memory)
+    return _recorder
+
+
+def stop():
+    global _recorder
+    _recorder = None
+
+
+def command(text):
+    '''
+    Returns a context manager that measures a command when a recorder has been started
+    and does nothing otherwise.
+    '''
+    if _recorder is None:
+        return NULL_STAGE
+    return _recorder.measure(text)
+
+
+def summarize(records):
+    '''
+    Puts together records from many runs.
+    Returns a list of dictionaries with the command, the stage ('total' for the whole
+    command), the number of runs and the mean, largest and total seconds and row counts.
+    '''
+    groups = dict()
+    for record in records:
+        stages = dict(record['stages'])
+        stages['other'] = {'seconds': record['other_seconds']}
+        stages['total'] = {'seconds': record['seconds']}
+        for name, stage in stages.items():
+            key = (record['command'], name)
+            if key not in groups:
+                groups[key] = {'command': record['command'], 'stage': name, 'runs': 0, 'seconds': 0.0,
+                               'max_seconds': 0.0, 'rows_scanned': 0, 'rows_returned': 0}
+            group = groups[key]
+            group['runs'] += 1
+            group['seconds'] += stage['seconds']
+            group['max_seconds'] = max(group['max_seconds'], stage['seconds'])
+            group['rows_scanned'] += stage.get('rows_scanned', 0)
+            group['rows_returned'] += stage.get('rows_returned', 0)
+
+    order = {name: position for position, name in enumerate(STAGES + ('other', 'total'))}
+    summary = []
+    for key in sorted(groups, key=lambda key: (key[0], order.get(key[1], len(order)), key[1])):
+        group = groups[key]
+        group['mean_seconds'] = round(group['seconds'] / group['runs'], 6)
+        group['seconds'] = round(group['seconds'], 6)
+        summary.append(group)
+    return summary
+
+
+def read_records(paths):
+    records = []
+    for path in paths:
+        with open(path, 'r') as fhand:
+            records.extend(json.loads(line) for line in fhand if line.strip())
+    return records
+
+
+def print_summary(summary, out=None):
+    ''' Prints the result of summarize as a table. '''
+    import reports
+    table = reports.Table([reports.Column('Command', 12), reports.Column('Stage', 10),
+                           reports.Column('Runs', 8),
+                           reports.Column('Mean s', 12, '{:.4f}'.format),
+                           reports.Column('Max s', 12, '{:.4f}'.format),
+                           reports.Column('Rows scanned', 16, '{:,}'.format),
+                           reports.Column('Rows returned', 16, '{:,}'.format)])
+    reports.write([table.headings] + table.rows(
+        (group['command'], group['stage'], group['runs'], group['mean_seconds'], group['max_seconds'],
+         group['rows_scanned'], group['rows_returned']) for group in summary), out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarizes timing records written by mint.py --timing.')
+    parser.add_argument('files', nargs='+', metavar='FILE', help='JSON Lines files of timing records')
+    args = parser.parse_args(argv)
+    print_summary(summarize(read_records(args.files)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
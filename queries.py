@@ -0,0 +1,414 @@
+'''
+Queries over the loaded transactions.
+
+A Query filters transactions by date, transaction type, category, account, tag and amount,
+groups them by one or more dimensions and works out aggregates for every group:
+    query = queries.Query(tran_type='debit', start_date=datetime.date(2017, 1, 1),
+                          group_by=('category', 'month'), aggregates=('sum', 'count'))
+    query.run(transactions)    # {('Groceries', 201701): {'sum': 412.5, 'count': 9}, ...}
+
+Before a query runs it is planned. The planner pushes predicates down to the indexes of
+Transactions:
+    cube      whole month totals and counts by type, category and account come straight
+              from the monthly cube without looking at any transaction
+    date      a date range and transaction type are found with two binary searches in
+              the date index
+    category, account, tag
+              an equality predicate is answered from the group index for that column
+    all       nothing can be pushed down so every row is looked at
+The access path that leaves the fewest rows is used. The predicates it does not cover are
+checked in the same pass that groups and aggregates the rows, so a query never makes more
+than one pass over the transactions and never builds a list of Transaction objects.
+'''
+import datetime
+import functools
+import itertools
+from array import array
+import convert
+import cube
+import profiling
+
+
+# Dimensions a query can group by.
+DIMENSIONS = ('type', 'category', 'account', 'tag', 'month', 'day')
+AGGREGATES = ('sum', 'count', 'avg', 'min', 'max')
+
+# Columns of the store that hold the codes of each dictionary encoded dimension.
+CODED_DIMENSIONS = {'type': ('types', 'type_names'),
+                    'category': ('categories', 'category_names'),
+                    'account': ('accounts', 'account_names')}
+COLUMNS = {'type': 'types', 'category': 'categories', 'account': 'accounts', 'tag': 'tags'}
+
+# Dimensions and aggregates the monthly cube can answer.
+CUBE_DIMENSIONS = ('type', 'category', 'account', 'month')
+CUBE_AGGREGATES = ('sum', 'count', 'avg')
+
+# Amount range used for a missing min_amount or max_amount. The cents column is 64 bit.
+UNLIMITED_CENTS = 1 << 63
+
+
+class Plan:
+    '''
+    How a query will be run.
+    access is the access path (see the module docstring) and rows the row ids it found,
+    in date order when access is 'date'. rows is None for the cube.
+    checks are the predicates left for the scan as (dimension, allowed codes) pairs.
+    The date and amount ranges are checked by the scan when check_dates and check_cents are True.
+    '''
+
+    def __init__(self, access, rows, checks, check_dates, check_cents):
+        self.access = access
+        self.rows = rows
+        self.checks = checks
+        self.check_dates = check_dates
+        self.check_cents = check_cents
+
+
+    def __repr__(self):
+        scanned = 0 if self.rows is None else len(self.rows)
+        residual = [dimension for dimension, _ in self.checks]
+        if self.check_dates:
+            residual.append('dates')
+        if self.check_cents:
+            residual.append('cents')
+        return 'Plan(' + self.access + ', rows=' + str(scanned) + ', residual=' + repr(residual) + ')'
+
+
+class Query:
+    '''
+    A declarative query over Transactions. See the module docstring.
+    start_date and end_date limit the dates (inclusive). There is no limit when they are None.
+    tran_type, category, account and tag take a name or a list of names and match them
+    ignoring case. A tag matches the transactions whose labels name it, as get_tags does.
+    min_amount and max_amount limit the amount (inclusive).
+    group_by is a list of DIMENSIONS and aggregates a list of AGGREGATES.
+    '''
+
+    def __init__(self, start_date=None, end_date=None, tran_type=None, category=None, account=None,
+                 tag=None, min_amount=None, max_amount=None, group_by=(), aggregates=('sum',)):
+        if isinstance(group_by, str):
+            group_by = (group_by,)
+        if isinstance(aggregates, str):
+            aggregates = (aggregates,)
+        for dimension in group_by:
+            if dimension not in DIMENSIONS:
+                raise ValueError('Unknown dimension: ' + str(dimension))
+        for aggregate in aggregates:
+            if aggregate not in AGGREGATES:
+                raise ValueError('Unknown aggregate: ' + str(aggregate))
+
+        self.start_date = start_date
+        self.end_date = end_date
+        self.names = {'type': tran_type, 'category': category, 'account': account, 'tag': tag}
+        self.min_cents = None if min_amount is None else round(min_amount * 100)
+        self.max_cents = None if max_amount is None else round(max_amount * 100)
+        self.group_by = tuple(group_by)
+        self.aggregates = tuple(aggregates)
+
+
+    def _matching_names(self, dimension, names):
+        ''' Returns the names of a dimension that the query asks for or None if it does not filter on it. '''
+        wanted = self.names[dimension]
+        if wanted is None:
+            return None
+        if isinstance(wanted, str):
+            wanted = [wanted]
+        wanted = {name.lower() for name in wanted}
+        return [name for name in names if name.lower() in wanted]
+
+
+    def _codes(self, store, dimension):
+        ''' Returns the set of codes the query allows for a coded dimension or None if it allows them all. '''
+        _, names_name = CODED_DIMENSIONS[dimension]
+        names = getattr(store, names_name).values
+        matching = self._matching_names(dimension, names)
+        if matching is None:
+            return None
+        matching = set(matching)
+        return {code for code, name in enumerate(names) if name in matching}
+
+
+    def _date_bounds(self):
+        ''' Returns the date range as ordinals. '''
+        start = self.start_date.toordinal() if self.start_date is not None else 0
+        end = self.end_date.toordinal() if self.end_date is not None else datetime.date.max.toordinal()
+        return start, end
+
+
+    def _cube_months(self, transactions):
+        '''
+        Returns the first and last month for the cube when the query can be answered from it,
+        otherwise None.
+        '''
+        if self.names['tag'] is not None or self.min_cents is not None or self.max_cents is not None:
+            return None
+        if any(dimension not in CUBE_DIMENSIONS for dimension in self.group_by):
+            return None
+        if any(aggregate not in CUBE_AGGREGATES for aggregate in self.aggregates):
+            return None
+
+        months = transactions.cube.months()
+        if len(months) == 0:
+            return None
+        first_month = months[0]
+        last_month = months[-1]
+        if self.start_date is not None:
+            if self.start_date.day != 1:
+                return None
+            first_month = cube.month_key(self.start_date)
+        if self.end_date is not None:
+            if cube.whole_months(self.end_date.replace(day=1), self.end_date) is None:
+                return None
+            last_month = cube.month_key(self.end_date)
+        return first_month, last_month
+
+
+    def plan(self, transactions, use_cube=True):
+        '''
+        Works out how to run the query against transactions. Returns a Plan.
+        use_cube is False when the rows themselves are needed.
+        '''
+        store = transactions.store
+        with profiling.stage('filter'):
+            codes = {dimension: self._codes(store, dimension) for dimension in CODED_DIMENSIONS}
+            dated = self.start_date is not None or self.end_date is not None
+            check_cents = self.min_cents is not None or self.max_cents is not None
+
+            if use_cube and self._cube_months(transactions) is not None:
+                checks = [(dimension, allowed) for dimension, allowed in codes.items() if allowed is not None]
+                return Plan('cube', None, checks, False, False)
+
+            # Every access path with the number of rows it would leave.
+            candidates = [(len(store), 'all')]
+            if dated or codes['type'] is not None:
+                start, end = self._date_bounds()
+                index = transactions.date_index
+                if codes['type'] is None:
+                    partitions = [index.all]
+                else:
+                    partitions = [index.types[code] for code in codes['type'] if code in index.types]
+                size = 0
+                for partition in partitions:
+                    low, high = partition.bounds(start, end)
+                    size += high - low
+                candidates.append((size, 'date'))
+            for dimension in ('category', 'account', 'tag'):
+                if self.names[dimension] is None:
+                    continue
+                groups = transactions.group_index(dimension).rows
+                matching = self._matching_names(dimension, groups)
+                candidates.append((sum(len(groups[name]) for name in matching), dimension))
+
+            size, access = min(candidates, key=lambda candidate: candidate[0])
+            if access == 'date':
+                start, end = self._date_bounds()
+                rows = transactions.date_index.find(start, end, codes['type'])
+            elif access == 'all':
+                rows = range(len(store))
+            else:
+                groups = transactions.group_index(access).rows
+                found = [groups[name] for name in self._matching_names(access, groups)]
+                if len(found) == 1:
+                    rows = found[0]
+                else:
+                    rows = array('I', sorted(set(itertools.chain.from_iterable(found))))
+
+            checks = []
+            for dimension, allowed in codes.items():
+                if allowed is not None and not (access == dimension or (access == 'date' and dimension == 'type')):
+                    checks.append((dimension, allowed))
+            if self.names['tag'] is not None and access != 'tag':
+                checks.append(('tag', self._tag_codes(transactions)))
+            return Plan(access, rows, checks, dated and access != 'date', check_cents)
+
+
+    def _tag_codes(self, transactions):
+        ''' Returns the set of labels codes that name one of the tags the query asks for. '''
+        store = transactions.store
+        groups_for_code = transactions.group_index('tag').groups_for_code
+        wanted = self.names['tag']
+        wanted = {name.lower() for name in ([wanted] if isinstance(wanted, str) else wanted)}
+        return {code for code in range(len(store.tag_names))
+                if any(tag.lower() in wanted for tag in groups_for_code(code))}
+
+
+    def _group_names(self, transactions, dimension):
+        '''
+        Returns two functions for a dimension. The first gives the raw values (codes, month
+        keys or date ordinals) of an iterator of rows, lazily. The second turns a raw value into
+        the list of groups it belongs to. Only tags can put a row in more than one group, or in none.
+        '''
+        store = transactions.store
+        if dimension in CODED_DIMENSIONS:
+            codes_name, names_name = CODED_DIMENSIONS[dimension]
+            codes = getattr(store, codes_name)
+            names = getattr(store, names_name).values
+            return lambda rows: map(codes.__getitem__, rows), lambda code: [names[code]]
+        if dimension == 'tag':
+            return lambda rows: map(store.tags.__getitem__, rows), transactions.group_index('tag').groups_for_code
+
+        dates = store.dates
+        if dimension == 'day':
+            return lambda rows: map(dates.__getitem__, rows), lambda day: [datetime.date.fromordinal(day)]
+
+        # Each distinct day is turned into its month once.
+        month_of = functools.lru_cache(maxsize=None)(lambda day: cube.month_key(datetime.date.fromordinal(day)))
+        return lambda rows: map(month_of, map(dates.__getitem__, rows)), lambda month: [month]
+
+
+    def _filter(self, transactions, plan):
+        '''
+        Returns an iterator over the rows of a plan that pass the predicates the plan left
+        for the scan. Each predicate is a lazy stage over the one before it, so the rows are
+        only gone through once, when the iterator is used.
+        '''
+        store = transactions.store
+        tests = [(getattr(store, COLUMNS[dimension]), allowed.__contains__) for dimension, allowed in plan.checks]
+        if plan.check_dates:
+            start, end = self._date_bounds()
+            tests.append((store.dates, range(start, end + 1).__contains__))
+        if plan.check_cents:
+            low = self.min_cents if self.min_cents is not None else -UNLIMITED_CENTS
+            high = self.max_cents if self.max_cents is not None else UNLIMITED_CENTS
+            tests.append((store.cents, range(low, high + 1).__contains__))
+
+        rows = iter(plan.rows)
+        for column, test in tests:
+            rows, values = itertools.tee(rows)
+            rows = itertools.compress(rows, map(test, map(column.__getitem__, values)))
+        return rows
+
+
+    def _scan(self, transactions, plan):
+        '''
+        Filters, groups and aggregates the rows of a plan in one pass that keeps only a
+        running total, count, smallest and largest amount for each group. Rows are grouped
+        on their raw values (codes, month keys and date ordinals) and those groups are then put together
+        into the named groups of the query.
+        Returns a dictionary of group key -> [total cents, count, smallest cents, largest cents].
+        '''
+        cents = transactions.store.cents
+        dimensions = [self._group_names(transactions, dimension) for dimension in self.group_by]
+        rows = plan.rows
+        if plan.checks or plan.check_dates or plan.check_cents:
+            rows = self._filter(transactions, plan)
+
+        # Each dimension reads its own copy of the rows. The copies are read in step, so
+        # only the row being grouped is held at a time.
+        rows, *copies = itertools.tee(rows, len(dimensions) + 1)
+        if len(dimensions) == 0:
+            keys = itertools.repeat(())
+        elif len(dimensions) == 1:
+            keys = dimensions[0][0](copies[0])
+        else:
+            keys = zip(*[values(copy) for (values, _), copy in zip(dimensions, copies)])
+        want_range = 'min' in self.aggregates or 'max' in self.aggregates
+        raw_groups = dict()
+        for key, amount in zip(keys, map(cents.__getitem__, rows)):
+            totals = raw_groups.get(key)
+            if totals is None:
+                raw_groups[key] = [amount, 1, amount, amount]
+            else:
+                totals[0] += amount
+                totals[1] += 1
+                if want_range:
+                    if amount < totals[2]:
+                        totals[2] = amount
+                    elif amount > totals[3]:
+                        totals[3] = amount
+
+        groups = dict()
+        for key, values in raw_groups.items():
+            if len(dimensions) == 0:
+                names = [()]
+            elif len(dimensions) == 1:
+                names = [(name,) for name in dimensions[0][1](key)]
+            else:
+                names = itertools.product(*[group_names(value) for (_, group_names), value in zip(dimensions, key)])
+            for name in names:
+                totals = groups.get(name)
+                if totals is None:
+                    groups[name] = list(values)
+                else:
+                    totals[0] += values[0]
+                    totals[1] += values[1]
+                    if want_range:
+                        totals[2] = min(totals[2], values[2])
+                        totals[3] = max(totals[3], values[3])
+        profiling.rows(len(plan.rows), len(groups))
+        return groups
+
+
+    def _cube_cells(self, transactions, plan):
+        '''
+        Adds up the cells of the monthly cube the plan covers.
+        Returns a dictionary of group key -> [total cents, count].
+        '''
+        store = transactions.store
+        first_month, last_month = self._cube_months(transactions)
+        allowed = dict(plan.checks)
+        positions = cube.DIMENSIONS
+        names = {dimension: getattr(store, CODED_DIMENSIONS[dimension][1]).values for dimension in CODED_DIMENSIONS}
+
+        groups = dict()
+        cells_read = 0
+        for month in cube.month_range(first_month, last_month):
+            for cell_key, cell in transactions.cube.cells.get(month, {}).items():
+                cells_read += 1
+                if any(cell_key[positions[dimension]] not in codes for dimension, codes in allowed.items()):
+                    continue
+                key = tuple(month if dimension == 'month' else names[dimension][cell_key[positions[dimension]]]
+                            for dimension in self.group_by)
+                values = groups.get(key)
+                if values is None:
+                    groups[key] = [cell[0], cell[1]]
+                else:
+                    values[0] += cell[0]
+                    values[1] += cell[1]
+        profiling.rows(cells_read, len(groups))
+        return groups
+
+
+    @profiling.timed('group')
+    def run(self, transactions):
+        '''
+        Runs the query against a Transactions object.
+        Returns a dictionary of group -> {aggregate: value} sorted by group. A group is the
+        name of the group when there is one dimension and a tuple of names otherwise (so
+        the only group of a query without dimensions is ()). Amounts are added up in
+        whole cents and turned into dollars at the end.
+        '''
+        plan = self.plan(transactions)
+        if plan.access == 'cube':
+            groups = self._cube_cells(transactions, plan)
+        else:
+            groups = self._scan(transactions, plan)
+
+        results = dict()
+        for key in sorted(groups):
+            values = groups[key]
+            result = dict()
+            for aggregate in self.aggregates:
+                if aggregate == 'sum':
+                    result['sum'] = convert.to_dollars(values[0])
+                elif aggregate == 'count':
+                    result['count'] = values[1]
+                elif aggregate == 'avg':
+                    result['avg'] = convert.to_dollars(values[0]) / values[1]
+                elif aggregate == 'min':
+                    result['min'] = convert.to_dollars(values[2])
+                else:
+                    result['max'] = convert.to_dollars(values[3])
+            results[key[0] if len(self.group_by) == 1 else key] = result
+        return results
+
+
+    def rows(self, transactions):
+        ''' Returns the row ids of the transactions the query matches, in date order. '''
+        plan = self.plan(transactions, use_cube=False)
+        with profiling.stage('filter'):
+            matches = array('I', self._filter(transactions, plan))
+            profiling.rows(len(plan.rows), len(matches))
+        if plan.access != 'date':
+            matches = array('I', sorted(matches, key=transactions.store.dates.__getitem__))
+        return matches
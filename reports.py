@@ -1,102 +1,251 @@
 '''
 Tools for printing reports to the console.
+Reports are laid out as tables described by a list of Column specs. A whole report is
+formatted into one string and written with a single call, to sys.stdout unless another
+file-like object is passed as out.
+Everything a report does is timed as the render stage when a command is being measured
+(see profiling.py).
 '''
+import sys
+import convert
+import profiling
 
 
-def print_accounts(accounts):
-    print('\n\nAccounts\n')
-    for account_name in accounts:
-        print(account_name)
-    print('\n')
+def money(amount):
+    ''' Formats an amount the way every report shows money. '''
+    return '${:9,.2f}'.format(amount)
 
 
-def print_transactions(title, transactions):
-    total = 0
-    print('\n\n' + title + '\n')
+class Column:
+    '''
+    Column of a table. Values are padded with spaces or cut to width.
+    formatter turns a value into a string first. Without one str() is used.
+    '''
 
-    # Column headings
-    print(pad('Date', 15) +
-          pad('Description', 35) +
-          pad('Category', 25) +
-          pad('Account', 30) +
-          pad('Amount', 20))
+    def __init__(self, heading, width, formatter=None):
+        self.heading = heading
+        self.width = width
+        self.formatter = formatter
+
+
+class Table:
+    '''
+    Table made of Columns. The format string for a whole row is worked out once so that
+    each row is a single str.format call.
+    '''
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.template = ''.join('{' + str(position) + ('!s' if column.formatter is None else '') +
+                                ':<' + str(column.width) + '.' + str(column.width) + '}'
+                                for position, column in enumerate(columns))
+        self.formatters = [(position, column.formatter) for position, column in enumerate(columns)
+                           if column.formatter is not None]
+        self.headings = self.template.format(*[column.heading for column in columns])
+
+
+    def row(self, values):
+        ''' Returns one row of the table as a string. values has one value per column. '''
+        if self.formatters:
+            values = list(values)
+            for position, formatter in self.formatters:
+                values[position] = formatter(values[position])
+        return self.template.format(*values)
+
+
+    def rows(self, rows):
+        ''' Returns a list with a string for each row in rows. '''
+        if not self.formatters:
+            template = self.template
+            return [template.format(*values) for values in rows]
+        return [self.row(values) for values in rows]
+
+
+def write(lines, out=None):
+    ''' Writes lines followed by a new line to out (sys.stdout by default) in one call. '''
+    if out is None:
+        out = sys.stdout
+    out.write('\n'.join(lines) + '\n')
+    profiling.rows(len(lines))
+
+
+TRANSACTION_TABLE = Table([Column('Date', 15),
+                           Column('Description', 35),
+                           Column('Category', 25),
+                           Column('Account', 30),
+                           Column('Amount', 20, money)])
+
+DAILY_SPENDING_TABLE = Table([Column('Date', 15), Column('Amount', 20, money)])
+
+
+@profiling.timed('render')
+def print_accounts(accounts, out=None):
+    write(['\n\nAccounts\n'] + list(accounts) + ['\n'], out)
+
+
+def by_date(transactions):
+    '''
+    Returns transactions in date order without changing the list passed in.
+    A Rows view is ordered on its date column so only the rows that are printed
+    are turned into Transaction objects.
+    '''
+    if hasattr(transactions, 'by_date'):
+        return transactions.by_date()
+    return sorted(transactions, key=lambda x: x.transaction_date)
 
-    transactions.sort(key=lambda x: x.transaction_date)
-    for transaction in transactions:
-        print(pad(transaction.transaction_date, 15) +
-              pad(transaction.description, 35) +
-              pad(transaction.category, 25) +
-              pad(transaction.account_name, 30) +
-              pad('${:9,.2f}'.format(transaction.amount), 20))
-        total += transaction.amount
 
+def transaction_rows(transactions):
+    ''' Returns the lines of TRANSACTION_TABLE for transactions. '''
+    return TRANSACTION_TABLE.rows((transaction.transaction_date,
+                                   transaction.description,
+                                   transaction.category,
+                                   transaction.account_name,
+                                   transaction.amount) for transaction in transactions)
 
-def print_daily_spending(days):
-    total = 0
-    print('\n\nDaily Spending\n')
 
-    # Column headings
-    print(pad('Date', 15) +
-          pad('Amount', 20))
+@profiling.timed('render')
+def print_transactions(title, transactions, out=None, limit=None, offset=0):
+    '''
+    Prints transactions in date order. limit and offset print a slice of them,
+    the same as --limit and --offset on the command line.
+    '''
+    lines = ['\n\n' + title + '\n', TRANSACTION_TABLE.headings]
+
+    transactions = by_date(transactions)
+    if limit is not None or offset > 0:
+        end = None if limit is None else offset + limit
+        transactions = transactions[offset:end]
+    lines.extend(transaction_rows(transactions))
+    write(lines, out)
+
+
+def page_transactions(title, transactions, page_size, out=None, ask=input):
+    '''
+    Prints transactions in date order a page at a time. Each page is only formatted when
+    it is shown. ask is called with a prompt after every page but the last and paging
+    stops if the answer starts with q.
+    Returns the number of transactions shown.
+    '''
+    transactions = by_date(transactions)
+    lines = ['\n\n' + title + '\n', TRANSACTION_TABLE.headings]
+    shown = 0
+    while True:
+        with profiling.stage('render'):
+            page = transactions[shown:shown + page_size]
+            lines.extend(transaction_rows(page))
+            write(lines, out)
+        shown += len(page)
+        if shown >= len(transactions) or len(page) == 0:
+            break
+        answer = ask(str(shown) + ' of ' + str(len(transactions)) + ' shown. Press Enter for more or q to stop: ')
+        if answer.strip().lower()[0:1] == 'q':
+            break
+        lines = []
+    return shown
+
+
+@profiling.timed('render')
+def print_daily_spending(days, out=None):
+    lines = ['\n\nDaily Spending\n', DAILY_SPENDING_TABLE.headings]
 
     sorted_days = sorted(days.keys())
-    for day in sorted_days:
-        print(pad(day, 15) +
-              pad('${:9,.2f}'.format(days[day]), 20))
-        total += days[day]
+    lines.extend(DAILY_SPENDING_TABLE.rows((day, days[day]) for day in sorted_days))
+    total = convert.total_amounts(days[day] for day in sorted_days)
 
-    print('\n')
-    print(pad('Total', 15) +
-          pad('${:9,.2f}'.format(total), 20))
-    print('\n')
+    lines.append('\n')
+    lines.append(DAILY_SPENDING_TABLE.row(('Total', total)))
+    lines.append('\n')
+    write(lines, out)
 
 
-def print_transaction_totals(title, transactions):
-    total = 0
+def transaction_cents(transactions):
+    '''
+    Returns the total in whole cents of the transactions that are not credit card payments.
+    A Rows view is added up straight from the columns of its store.
+    '''
+    if hasattr(transactions, 'row_ids'):
+        store = transactions.store
+        payments = store.category_names.find('credit card payment')
+        if len(payments) == 0:
+            return transactions.cents()
+        cents = store.cents
+        categories = store.categories
+        return sum(cents[row] for row in transactions.row_ids if categories[row] not in payments)
+
+    cents = 0
     for transaction in transactions:
         if transaction.category.lower() != 'credit card payment':
-            total += transaction.amount
-    print(pad(title, 20) + '\t' + '${:9,.2f}'.format(total))
+            cents += transaction.cents
+    return cents
 
 
-def print_category_totals(categories):
-    print('\n')
+@profiling.timed('render')
+def print_transaction_totals(title, transactions, out=None):
+    write([pad(title, 20) + '\t' + money(convert.to_dollars(transaction_cents(transactions)))], out)
+
+
+@profiling.timed('render')
+def print_category_totals(categories, out=None):
     # Create a dictionary of totals for each category.
     category_totals = dict()
     for category_name in categories.keys():
-        if category_name.lower() == 'credit card payment':
-            continue
-        total = 0
+        cents = 0
         for transaction in categories[category_name]:
-            total += transaction.amount
-        category_totals[category_name] = total
+            cents += transaction.cents
+        category_totals[category_name] = convert.to_dollars(cents)
+    print_totals(category_totals, out)
+
+
+@profiling.timed('render')
+def print_totals(category_totals, out=None):
+    lines = ['\n']
+    category_totals = {name: category_totals[name] for name in category_totals
+                       if name.lower() != 'credit card payment'}
+
+    # Add the totals for each category, largest first.
+    ordered = sorted(category_totals, key=category_totals.__getitem__, reverse=True)
+    for category_name in ordered:
+        lines.append(pad(category_name, 20) + '\t' + money(category_totals[category_name]))
+    grand_total = convert.total_amounts(category_totals[category_name] for category_name in ordered)
+
+    lines.append('\nTotal:  ' + money(grand_total) + '\n')
+    write(lines, out)
 
-    # Loop through and print the totals for each category.
-    grand_total = 0
-    for category_name in sorted(category_totals, key=category_totals.__getitem__, reverse=True):  #sorted(d, key=d.__getitem__)
-        category_total = category_totals[category_name]
-        grand_total += category_total
-        print(pad(category_name, 20) + '\t' + '${:9,.2f}'.format(category_total))
 
-    print('\nTotal:  ' + '${:9,.2f}'.format(grand_total) + '\n')
+COMPARISON_TABLE = Table([Column('Category', 30),
+                          Column('Previous Month', 20, money),
+                          Column('Current Month', 20, money),
+                          Column('Difference', 20, money)])
 
 
-def print_category_comparison(previous_month_totals, current_month_totals):
-    print(pad('Category', 30) + pad('Previous Month', 20) + pad('Current Month', 20) + pad('Difference', 20))
+@profiling.timed('render')
+def print_category_comparison(previous_month_totals, current_month_totals, out=None):
+    table = COMPARISON_TABLE
+    lines = [table.headings]
 
     for category_name in sorted(previous_month_totals, key=previous_month_totals.__getitem__, reverse=True):
         previous = previous_month_totals[category_name]
-        if category_name in current_month_totals:
-            current = current_month_totals[category_name]
-        else:
-            current = 0
-        diff = previous - current
-        print(pad(category_name, 30) + pad('${:9,.2f}'.format(previous), 20) + pad('${:9,.2f}'.format(current), 20) + pad('${:9,.2f}'.format(diff), 20))
+        current = current_month_totals.get(category_name, 0)
+        lines.append(table.row((category_name, previous, current, previous - current)))
+    write(lines, out)
 
 
-def print_categories(categories):
+@profiling.timed('render')
+def print_monthly_trend(months, trend, out=None):
+    ''' Prints one row per category with a column for each month. months is a list of (year, month) tuples. '''
+    table = Table([Column('Category', 30)] +
+                  [Column('{0}-{1:02d}'.format(year, month), 15, money) for year, month in months])
+    lines = ['\n', table.headings]
+
+    for name in sorted(trend, key=lambda name: sum(trend[name]), reverse=True):
+        lines.append(table.row([name] + trend[name]))
+    lines.append('\n')
+    write(lines, out)
+
+
+def print_categories(categories, out=None):
     for category in categories:
-        print_transactions(category, categories[category])
+        print_transactions(category, categories[category], out)
 
 
 def pad(value, width):
@@ -104,13 +253,4 @@ def pad(value, width):
     Turns value into a string and then pads the new string value with spaces
     to produce a string of length width.
     '''
-    display = str(value)
-    length = len(display)
-
-    if length >= width:
-        return display[0:width]
-
-    delta = width - length
-    for _ in range(delta):
-        display = display + ' '
-    return display
+    return '{0!s:<{1}.{1}}'.format(value, width)
@@ -0,0 +1,301 @@
+'''
+Search over category and tag names and over the text of transactions.
+Names are lower cased once when they are added and indexed by trigram so that a
+plain substring search only looks at names that contain every trigram of the search text.
+Searches that use regular expression syntax are compiled once and cached.
+The description, original description and notes of every transaction are split into
+words and kept in an inverted index (word -> rows) which can be saved next to the
+transaction file.
+'''
+import os
+import re
+import sys
+import json
+import bisect
+import functools
+from array import array
+
+
+# Number of compiled search patterns that are kept.
+PATTERN_CACHE_SIZE = 256
+
+# Characters that make a search a regular expression rather than plain text.
+REGEX_CHARACTERS = set('.^$*+?{}[]\\|()')
+
+# Columns of a ColumnStore that are searched by TextIndex.
+TEXT_COLUMNS = ('descriptions', 'original_descriptions', 'notes')
+
+# Words are runs of letters and digits.
+WORD_PATTERN = re.compile(r'[^\W_]+')
+
+TEXT_INDEX_VERSION = 2
+TEXT_INDEX_EXTENSION = '.words'
+
+
+@functools.lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def compile_pattern(pattern):
+    ''' Returns a compiled, case insensitive regular expression for pattern. '''
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def is_plain_text(pattern):
+    ''' Returns True if pattern has no regular expression syntax in it. '''
+    return not any(character in REGEX_CHARACTERS for character in pattern)
+
+
+def trigrams(text):
+    ''' Returns the set of three character substrings of text. '''
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def rank(name, start, end):
+    '''
+    Sort key for a match between start and end in name. Exact matches come first, then
+    matches at the start of the name, then matches at the start of a word and then
+    everything else. Ties go to the earlier match and then to the shorter name.
+    '''
+    if start == 0 and end == len(name):
+        kind = 0
+    elif start == 0:
+        kind = 1
+    elif not name[start - 1].isalnum():
+        kind = 2
+    else:
+        kind = 3
+    return (kind, start, len(name), name)
+
+
+class NameIndex:
+    '''
+    Index over a growing list of names such as the category names of a store.
+    Names are referred to by their position in the list.
+    '''
+
+    def __init__(self, names=()):
+        self.names = []
+        self.lowered = []
+        self.name_ids = dict()
+        self.trigrams = dict()
+        self.extend(names)
+
+
+    def __len__(self):
+        return len(self.names)
+
+
+    def __contains__(self, name):
+        return name in self.name_ids
+
+
+    def extend(self, names):
+        ''' Adds names to the index. '''
+        for name in names:
+            name_id = len(self.names)
+            lowered = name.lower()
+            self.names.append(name)
+            self.lowered.append(lowered)
+            self.name_ids[name] = name_id
+            for trigram in trigrams(lowered):
+                if trigram in self.trigrams:
+                    self.trigrams[trigram].add(name_id)
+                else:
+                    self.trigrams[trigram] = {name_id}
+
+
+    def candidates(self, text):
+        ''' Returns the ids of the names that could contain text. text must be lower case. '''
+        found = None
+        for trigram in trigrams(text):
+            name_ids = self.trigrams.get(trigram)
+            if name_ids is None:
+                return set()
+            found = set(name_ids) if found is None else found & name_ids
+        if found is None:
+            # Text shorter than three characters has no trigrams to narrow the search.
+            return set(range(len(self.names)))
+        return found
+
+
+    def search(self, pattern):
+        '''
+        Returns every name that matches pattern, best match first.
+        A pattern without regular expression syntax is matched as a substring using the
+        trigram index. Any other pattern is treated as a case insensitive regular expression.
+        '''
+        matches = []
+        if is_plain_text(pattern):
+            text = pattern.lower()
+            for name_id in self.candidates(text):
+                start = self.lowered[name_id].find(text)
+                if start >= 0:
+                    name = self.names[name_id]
+                    matches.append((rank(name, start, start + len(text)), name))
+        else:
+            regex = compile_pattern(pattern)
+            for name in self.names:
+                match = regex.search(name)
+                if match:
+                    matches.append((rank(name, match.start(), match.end()), name))
+
+        matches.sort()
+        return [name for _, name in matches]
+
+
+def words(text):
+    ''' Returns the lower case words in text. '''
+    return WORD_PATTERN.findall(text.lower())
+
+
+class TextIndex:
+    '''
+    Inverted index from the words in the text columns of a store to the rows they are in.
+    postings[word] is an array of row ids in row order.
+    '''
+
+    def __init__(self, store, build=True):
+        self.store = store
+        self.postings = dict()
+        self.row_count = 0
+        self._vocabulary = None
+        if build:
+            self.add_rows(0)
+
+
+    def add_rows(self, first_row):
+        '''
+        Adds the rows from first_row to the end of the store to the index.
+        Existing posting arrays are replaced rather than appended to, the same as GroupIndex.
+        '''
+        columns = [getattr(self.store, name) for name in TEXT_COLUMNS]
+        new_postings = dict()
+        for row in range(first_row, len(self.store)):
+            row_words = set()
+            for column in columns:
+                text = column[row]
+                if text:
+                    row_words.update(words(text))
+            for word in row_words:
+                if word in new_postings:
+                    new_postings[word].append(row)
+                else:
+                    new_postings[word] = array('I', [row])
+
+        for word in new_postings:
+            if word in self.postings:
+                self.postings[word] = self.postings[word] + new_postings[word]
+            else:
+                self.postings[word] = new_postings[word]
+        self.row_count = len(self.store)
+        self._vocabulary = None
+
+
+    def vocabulary(self):
+        ''' Returns the indexed words in sorted order. '''
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        return self._vocabulary
+
+
+    def rows_for_prefix(self, prefix):
+        ''' Returns the set of rows that have a word starting with prefix. '''
+        vocabulary = self.vocabulary()
+        rows = set()
+        position = bisect.bisect_left(vocabulary, prefix)
+        while position < len(vocabulary) and vocabulary[position].startswith(prefix):
+            rows.update(self.postings[vocabulary[position]])
+            position += 1
+        return rows
+
+
+    def find(self, text):
+        '''
+        Returns the ids of the rows that have every word of text in them, in row order.
+        The last word may be the start of a word so that a search can be typed in part.
+        '''
+        query = words(text)
+        if len(query) == 0:
+            return array('I')
+
+        sets = []
+        for word in query[:-1]:
+            rows = self.postings.get(word)
+            if rows is None:
+                return array('I')
+            sets.append(rows)
+        sets.append(self.rows_for_prefix(query[-1]))
+
+        # Start with the smallest set so the intersection only gets smaller.
+        sets.sort(key=len)
+        found = set(sets[0])
+        for rows in sets[1:]:
+            found.intersection_update(rows)
+            if not found:
+                break
+        return array('I', sorted(found))
+
+
+def text_index_path(data_file):
+    ''' Returns the location of the saved text index for data_file. '''
+    return data_file + TEXT_INDEX_EXTENSION
+
+
+def save_text_index(data_file, index, key):
+    '''
+    Writes index next to data_file.
+    key identifies the rows that were indexed (for example the content hash of the file
+    and the row count) and has to match for load_text_index to use the index.
+    The file is a JSON header line followed by every posting array, one after the other.
+    Failing to write the index is not an error. It will be built again when it is needed.
+    '''
+    vocabulary = index.vocabulary()
+    lengths = [len(index.postings[word]) for word in vocabulary]
+    header = {
+        'version': TEXT_INDEX_VERSION,
+        'byteorder': sys.byteorder,
+        'key': key,
+        'row_count': index.row_count,
+        'words': vocabulary,
+        'lengths': lengths
+    }
+    path = text_index_path(data_file)
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as fhand:
+            fhand.write(json.dumps(header).encode('utf-8') + b'\n')
+            for word in vocabulary:
+                index.postings[word].tofile(fhand)
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+    return True
+
+
+def load_text_index(data_file, store, key):
+    '''
+    Returns the TextIndex saved for data_file or None if there is no saved index or it
+    was saved with a different key, version or byte order. The posting arrays are read
+    as they were written, so an index saved on a machine with the other byte order is rebuilt.
+    '''
+    try:
+        with open(text_index_path(data_file), 'rb') as fhand:
+            header = json.loads(fhand.readline().decode('utf-8'))
+            if (header.get('version') != TEXT_INDEX_VERSION or header.get('byteorder') != sys.byteorder
+                    or header.get('key') != key):
+                return None
+            rows = array('I')
+            rows.frombytes(fhand.read())
+    except (OSError, ValueError):
+        return None
+    if len(rows) != sum(header['lengths']):
+        return None
+
+    index = TextIndex(store, build=False)
+    position = 0
+    for word, length in zip(header['words'], header['lengths']):
+        index.postings[word] = rows[position:position + length]
+        position += length
+    index.row_count = header['row_count']
+    index._vocabulary = header['words']
+    return index
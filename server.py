@@ -0,0 +1,354 @@
+'''
+Local query server.
+
+Keeps one Transactions object loaded and answers mint.py commands sent as JSON over HTTP
+on localhost, so tools that share a ledger do not each load it again. Requests are handled
+on a pool of threads. A keep-alive connection holds its thread, so connections that sit
+idle for settings.SERVER_IDLE_TIMEOUT seconds are closed to let other clients in. Answers are cached until the transaction file changes. A watcher
+thread checks the file every settings.WATCH_INTERVAL seconds and brings the store up to
+date with Transactions.refresh, which only reads new lines when it can.
+
+A request is a JSON object sent with POST:
+    {"command": "cat groceries", "start": "3/1/2017", "end": "3/31/2017", "limit": 50, "offset": 0}
+or the same fields as a GET query string (/?command=cat&start=3/1/2017&end=3/31/2017).
+Only command is required. start and end default to the current month. limit and offset
+apply to transaction listings.
+The response is a JSON object with the command and either a result or an error.
+'''
+import sys
+import json
+import socket
+import datetime
+import threading
+import urllib.parse
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+import convert
+import cube
+import data
+import export
+import settings
+
+
+# Number of answers kept by a QueryService.
+ANSWER_CACHE_SIZE = 256
+
+COMMANDS = ['a', 'cat', 'cp', 'day', 'find', 'help', 'income', 'lf', 'spending', 'tag', 'trend']
+
+
+class BadRequest(Exception):
+    ''' The request could not be answered because of something in the request. '''
+    pass
+
+
+def current_month():
+    ''' Returns the first and last day of the current month. '''
+    today = datetime.date.today()
+    return cube.month_dates(today.year, today.month)
+
+
+def listing(transactions, limit=None, offset=0):
+    '''
+    Returns a transaction listing in date order along with its count and total.
+    limit and offset pick out a page of the listing.
+    '''
+    rows = transactions.by_date()
+    page = rows[offset:None if limit is None else offset + limit]
+    result = export.table_dict(export.transactions_table(page))
+    result['count'] = len(rows)
+    result['total'] = rows.total()
+    return result
+
+
+def answer(transactions, command, start_date, end_date, limit=None, offset=0):
+    '''
+    Answers one mint.py command for a date range. Returns a value that json can encode.
+    Raises BadRequest for commands that are not known or are missing parameters.
+    '''
+    name, _, params = command.strip().partition(' ')
+    params = params.strip()
+
+    if name == 'a':
+        return export.table_dict(export.accounts_table(transactions.get_accounts()))
+
+    if name == 'cat' or name == 'tag':
+        debits = transactions.get_transactions_by_type('debit', start_date, end_date)
+        if len(params) == 0:
+            if name == 'cat':
+                totals = transactions.get_category_totals_by_type('debit', start_date, end_date)
+            else:
+                totals = transactions.get_category_totals(transactions.get_tags(debits))
+            return export.table_dict(export.category_totals_table(totals))
+        if name == 'cat':
+            matches = transactions.search_categories(params, debits)
+        else:
+            matches = transactions.search_tags(params, debits)
+        return {'matches': [dict(listing(rows, limit, offset), match=match) for match, rows in matches]}
+
+    if name == 'cp':
+        today = datetime.date.today()
+        previous = transactions.get_category_totals_by_type(
+            'debit', *cube.month_dates(*cube.previous_month(today.year, today.month)))
+        current = transactions.get_category_totals_by_type('debit', *cube.month_dates(today.year, today.month))
+        return export.table_dict(export.category_comparison_table(previous, current))
+
+    if name == 'day':
+        return export.table_dict(export.daily_spending_table(transactions.get_daily_spending(start_date, end_date)))
+
+    if name == 'find':
+        if len(params) == 0:
+            raise BadRequest('find needs the words to look for.')
+        result = listing(transactions.find_transactions(params), limit, offset)
+        result['debits'] = transactions.find_transactions(params, 'debit').total()
+        result['credits'] = transactions.find_transactions(params, 'credit').total()
+        return result
+
+    if name == 'help':
+        return {'commands': COMMANDS}
+
+    if name == 'income':
+        return listing(transactions.get_transactions_by_type('credit', start_date, end_date), limit, offset)
+
+    if name == 'spending':
+        return listing(transactions.get_transactions_by_type('debit', start_date, end_date), limit, offset)
+
+    if name == 'trend':
+        month_count = convert.to_int(params) if len(params) > 0 else 6
+        if month_count <= 0:
+            raise BadRequest('trend needs a number of months.')
+        months = cube.last_months(end_date, month_count)
+        trend = transactions.get_monthly_trend('debit', months)
+        return {'months': ['{0}-{1:02d}'.format(year, month) for year, month in months], 'trend': trend}
+
+    raise BadRequest('Unrecognized command: ' + command)
+
+
+def request_date(request, name, default):
+    '''
+    Returns the date parameter name of a request or default if it is not given.
+    Raises BadRequest if the value is not a whole date.
+    '''
+    value = request.get(name)
+    if not value:
+        return default
+    try:
+        date = convert.to_date(str(value))
+    except (ValueError, IndexError) as error:
+        raise BadRequest('Invalid ' + name + ' date ' + repr(value) + ': ' + str(error))
+    if date is None:
+        raise BadRequest('Invalid ' + name + ' date ' + repr(value) + '.')
+    return date
+
+
+class QueryService:
+    '''
+    A loaded Transactions object shared by every request.
+    Answers are worked out one at a time under lock because the indexes of a Transactions
+    object are built and updated lazily. Cached answers are returned without waiting
+    for the lock.
+    '''
+
+    def __init__(self, data_file=None, watch_interval=settings.WATCH_INTERVAL):
+        self.transactions = data.Transactions(data_file)
+        self.watch_interval = watch_interval
+        self.lock = threading.Lock()
+        self.cache = dict()
+        self._stopped = threading.Event()
+        self._watcher = None
+
+
+    def query(self, request):
+        '''
+        Answers a request (a dictionary, see the top of this module).
+        Returns the response encoded as JSON.
+        '''
+        command = str(request.get('command', '')).strip()
+        if command == 'lf':
+            return encode_response(command, {'added': self.refresh()})
+
+        default_start, default_end = current_month()
+        start_date = request_date(request, 'start', default_start)
+        end_date = request_date(request, 'end', default_end)
+        try:
+            limit = int(request['limit']) if request.get('limit') is not None else None
+            offset = int(request.get('offset') or 0)
+        except (TypeError, ValueError) as error:
+            raise BadRequest(str(error))
+
+        key = (command, start_date, end_date, limit, offset)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            body = encode_response(command, answer(self.transactions, command, start_date, end_date, limit, offset))
+            if len(self.cache) >= ANSWER_CACHE_SIZE:
+                self.cache = dict()
+            self.cache[key] = body
+        return body
+
+
+    def refresh(self):
+        '''
+        Brings the transactions up to date with the transaction file and drops the cached
+        answers if anything changed. Returns the number of transactions added.
+        '''
+        with self.lock:
+            store = self.transactions.store
+            added = self.transactions.refresh()
+            if added > 0 or self.transactions.store is not store:
+                self.cache = dict()
+        return added
+
+
+    def start_watching(self):
+        ''' Starts the thread that checks the transaction file for changes. '''
+        if self._watcher is None:
+            self._stopped.clear()
+            self._watcher = threading.Thread(target=self._watch, name='mint-watcher', daemon=True)
+            self._watcher.start()
+
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._stopped.set()
+            self._watcher.join()
+            self._watcher = None
+
+
+    def _watch(self):
+        while not self._stopped.wait(self.watch_interval):
+            try:
+                self.refresh()
+            except Exception as error:
+                # The file may be half written or briefly missing. Keep serving what is
+                # loaded and try again on the next check.
+                print('Refresh failed: ' + repr(error), file=sys.stderr)
+
+
+def encode_response(command, result):
+    return json.dumps({'command': command, 'result': result}).encode('utf-8')
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    ''' HTTP handler that passes requests to the QueryService of its server. '''
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in one write with no Nagle delay. Without this a
+    # keep-alive client waits for a delayed ACK on every request.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        # The socket timeout set up by StreamRequestHandler. A read that times out closes the connection.
+        self.timeout = self.server.idle_timeout
+        super().setup()
+
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        self.respond({name: values[-1] for name, values in query.items()})
+
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+        except ValueError as error:
+            self.send_json(400, json.dumps({'error': 'Invalid JSON: ' + str(error)}).encode('utf-8'))
+            return
+        if not isinstance(request, dict):
+            self.send_json(400, json.dumps({'error': 'The request must be a JSON object.'}).encode('utf-8'))
+            return
+        self.respond(request)
+
+
+    def respond(self, request):
+        try:
+            body = self.server.service.query(request)
+            status = 200
+        except BadRequest as error:
+            body = json.dumps({'command': request.get('command'), 'error': str(error)}).encode('utf-8')
+            status = 400
+        except Exception as error:
+            body = json.dumps({'command': request.get('command'), 'error': repr(error)}).encode('utf-8')
+            status = 500
+        self.send_json(status, body)
+
+
+    def send_json(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        # Requests are not logged. Logging every request to stderr costs more than answering from the cache.
+        pass
+
+
+class QueryServer(HTTPServer):
+    '''
+    HTTPServer that handles each connection on a thread from a pool. Connections that are
+    open when the server is closed are shut down so that their threads stop waiting.
+    '''
+
+    def __init__(self, address, service, threads=settings.SERVER_THREADS,
+                 idle_timeout=settings.SERVER_IDLE_TIMEOUT):
+        super().__init__(address, QueryHandler)
+        self.service = service
+        self.idle_timeout = idle_timeout
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+
+
+    def process_request(self, request, client_address):
+        with self.connections_lock:
+            self.connections.add(request)
+        self.executor.submit(self._process_request, request, client_address)
+
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            with self.connections_lock:
+                self.connections.discard(request)
+            self.shutdown_request(request)
+
+
+    def server_close(self):
+        super().server_close()
+        with self.connections_lock:
+            for connection in self.connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        self.executor.shutdown(wait=True)
+
+
+def serve(data_file=None, host=settings.SERVER_HOST, port=settings.SERVER_PORT,
+          threads=settings.SERVER_THREADS, watch_interval=settings.WATCH_INTERVAL,
+          idle_timeout=settings.SERVER_IDLE_TIMEOUT):
+    ''' Loads the transaction file and answers requests until interrupted. '''
+    service = QueryService(data_file, watch_interval)
+    server = QueryServer((host, port), service, threads, idle_timeout)
+    service.start_watching()
+    print(str(service.transactions.count) + ' transactions loaded. Serving on http://' +
+          host + ':' + str(server.server_address[1]) + '/')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop_watching()
+        server.server_close()
@@ -2,13 +2,27 @@
 Settings file that contains global settings for the mint project.
 '''
 import os
-import inspect
 
 
-MAIN_DIRECTORY = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+MAIN_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
 DATA_FILE = os.path.join(MAIN_DIRECTORY, 'transactions.csv')
 #DATA_FILE = os.path.join(MAIN_DIRECTORY, 'chase.csv')
+# Name of the sources.Source transaction files are read with. None picks it from the header.
+FILE_FORMAT = None
 OTHER_LIMIT = 300
+# Where chart images are written and cached.
+CHART_DIRECTORY = os.path.join(MAIN_DIRECTORY, 'images')
+# Number of transactions shown at a time by interactive listings.
+PAGE_SIZE = 50
+
+# Query server (python mint.py --serve).
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 8642
+SERVER_THREADS = 8
+# Seconds a keep-alive connection may sit idle before the server closes it and frees its thread.
+SERVER_IDLE_TIMEOUT = 2.0
+# Seconds between checks of the transaction file for changes.
+WATCH_INTERVAL = 2.0
 
 
 if __name__ == '__main__':  # pragma: no cover
@@ -0,0 +1,243 @@
+'''
+Binary snapshot of a loaded transaction file.
+
+The snapshot is written next to the transaction file and is keyed on the size, modification
+time and content hash of that file. Numeric columns are stored as raw arrays so that loading
+a snapshot maps the file into memory and hands out memoryviews over it instead of copying.
+
+Layout of a snapshot file:
+    8 byte magic, 4 byte header length, JSON header, then each column padded to 8 bytes.
+'''
+import os
+import sys
+import json
+import mmap
+import struct
+import hashlib
+import itertools
+from array import array
+
+
+MAGIC = b'MINTSNAP'
+VERSION = 4
+EXTENSION = '.snapshot'
+PREFIX = struct.Struct('<8sI')
+ALIGNMENT = 8
+
+
+def snapshot_path(data_file):
+    ''' Returns the location of the snapshot for data_file. '''
+    return data_file + EXTENSION
+
+
+def file_hash(data_file, start=0, length=None):
+    '''
+    Returns the sha1 hex digest of data_file.
+    start and length can be used to hash part of the file.
+    '''
+    digest = hashlib.sha1()
+    with open(data_file, 'rb') as fhand:
+        fhand.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            size = 1 << 20 if remaining is None else min(1 << 20, remaining)
+            chunk = fhand.read(size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def source_key(data_file):
+    ''' Returns the size and modification time of data_file. '''
+    stat = os.stat(data_file)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+class StringColumn:
+    '''
+    Column of strings backed by a utf-8 blob and an array of offsets.
+    Strings are decoded one at a time as they are asked for.
+    Strings appended after loading are kept in a plain list (tail) so that the blob
+    can stay memory mapped.
+    '''
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+        self.base_length = len(offsets) - 1
+        self.tail = []
+
+
+    def __len__(self):
+        return self.base_length + len(self.tail)
+
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index >= self.base_length:
+            return self.tail[index - self.base_length]
+        return str(self.blob[self.offsets[index]:self.offsets[index + 1]], 'utf-8')
+
+
+    def append(self, value):
+        self.tail.append(value)
+
+
+    def extend(self, values):
+        self.tail.extend(values)
+
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+def encode_strings(values):
+    '''
+    Encodes a sequence of strings into a utf-8 blob and an array of offsets.
+    The blob and offsets of a StringColumn are reused so that only its tail is encoded.
+    '''
+    if isinstance(values, StringColumn):
+        offsets = array('q')
+        offsets.frombytes(memoryview(values.offsets).cast('B'))
+        position = offsets[-1]
+        tail = [value.encode('utf-8') for value in values.tail]
+        offsets.extend(position + length for length in itertools.accumulate(map(len, tail)))
+        encoded = [values.blob[0:position]] + tail
+    else:
+        encoded = [value.encode('utf-8') for value in values]
+        offsets = array('q', itertools.accumulate(map(len, encoded), initial=0))
+    return b''.join(encoded), offsets
+
+
+def save(data_file, store, meta, sha1=None):
+    '''
+    Writes a snapshot of store for data_file.
+    meta is a dictionary of extra values (such as the transaction count) to keep in the header.
+    sha1 is the content hash of data_file if the caller already knows it.
+    The snapshot is written to a temporary file first and then moved into place.
+    Failing to write a snapshot is not an error. The next load will just parse the file again.
+    '''
+    sections = []
+    for name in store.ARRAY_COLUMNS:
+        column = getattr(store, name)
+        sections.append((name, column.typecode if hasattr(column, 'typecode') else column.format,
+                         memoryview(column).cast('B')))
+    for name in store.TEXT_COLUMNS:
+        blob, offsets = encode_strings(getattr(store, name))
+        sections.append((name + '.offsets', 'q', memoryview(offsets).cast('B')))
+        sections.append((name + '.blob', 'B', memoryview(blob)))
+
+    header = {
+        'version': VERSION,
+        'byteorder': sys.byteorder,
+        'source': source_key(data_file),
+        'sha1': sha1 or file_hash(data_file),
+        'meta': meta,
+        'dictionaries': {name: getattr(store, name).values for name in store.DICTIONARIES},
+        'sections': []
+    }
+
+    # Work out where each section will go. The offsets are relative to the end of the header.
+    position = 0
+    for name, typecode, data in sections:
+        position += -position % ALIGNMENT
+        header['sections'].append([name, typecode, position, data.nbytes])
+        position += data.nbytes
+
+    encoded_header = json.dumps(header).encode('utf-8')
+    start = PREFIX.size + len(encoded_header)
+    start += -start % ALIGNMENT
+
+    path = snapshot_path(data_file)
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as fhand:
+            fhand.write(PREFIX.pack(MAGIC, len(encoded_header)))
+            fhand.write(encoded_header)
+            fhand.write(b'\0' * (start - PREFIX.size - len(encoded_header)))
+            written = 0
+            for (name, typecode, data), section in zip(sections, header['sections']):
+                fhand.write(b'\0' * (section[2] - written))
+                fhand.write(data)
+                written = section[2] + data.nbytes
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+    return True
+
+
+def read_header(path):
+    ''' Returns the header of a snapshot file or None if the file is not a usable snapshot. '''
+    try:
+        with open(path, 'rb') as fhand:
+            prefix = fhand.read(PREFIX.size)
+            if len(prefix) < PREFIX.size:
+                return None
+            magic, header_length = PREFIX.unpack(prefix)
+            if magic != MAGIC:
+                return None
+            header = json.loads(fhand.read(header_length).decode('utf-8'))
+    except (OSError, ValueError):
+        return None
+
+    if header.get('version') != VERSION or header.get('byteorder') != sys.byteorder:
+        return None
+    header['start'] = PREFIX.size + header_length + (-(PREFIX.size + header_length) % ALIGNMENT)
+    return header
+
+
+def is_current(data_file, header):
+    '''
+    Checks the key in a snapshot header against data_file.
+    Size and modification time are checked first. If they do not match the content
+    hash is checked so that a file which was only touched or copied is not parsed again.
+    '''
+    key = source_key(data_file)
+    if key == header['source']:
+        return True
+    if key['size'] != header['source']['size']:
+        return False
+    return file_hash(data_file) == header['sha1']
+
+
+def load(data_file, store):
+    '''
+    Fills an empty store from the snapshot of data_file.
+    Returns the meta dictionary that was saved with the snapshot, or None if there is no
+    snapshot or the snapshot is out of date.
+    '''
+    path = snapshot_path(data_file)
+    header = read_header(path)
+    if header is None or not is_current(data_file, header):
+        return None
+
+    with open(path, 'rb') as fhand:
+        buffer = mmap.mmap(fhand.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(buffer)
+    start = header['start']
+
+    sections = dict()
+    for name, typecode, offset, length in header['sections']:
+        section = view[start + offset:start + offset + length]
+        sections[name] = section.cast(typecode) if typecode != 'B' else section
+
+    for name in store.ARRAY_COLUMNS:
+        setattr(store, name, sections[name])
+    for name in store.TEXT_COLUMNS:
+        setattr(store, name, StringColumn(sections[name + '.blob'], sections[name + '.offsets']))
+    for name in store.DICTIONARIES:
+        getattr(store, name).extend(header['dictionaries'][name])
+    store.buffer = buffer
+
+    # The file was touched but its content is the same so refresh the key in the snapshot.
+    if header['source'] != source_key(data_file):
+        save(data_file, store, header['meta'], header['sha1'])
+
+    return header['meta']
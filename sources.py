@@ -0,0 +1,324 @@
+'''
+Parsers for the transaction files of different banks and apps.
+
+A Source describes one export format: the column that holds each field of a transaction,
+how dates are written and which way round amounts are signed. Sources are kept in a
+registry by name. The source of a file is picked from its header unless one is named.
+
+A source compiles a Parser for each header it is used with. The parser holds the
+position of every field in that header, so lines are decoded a column at a time without
+looking anything up by name. Parsers do not change once they are compiled, so files in
+different formats can be parsed at the same time, into one store.
+
+To read another bank's export register a Source for it:
+    sources.register(sources.Source('bank', {'date': 'posted', 'description': 'payee', 'amount': 'amount'},
+                                    date_format='yyyy/mm/dd', sign=sources.NEGATIVE_DEBITS,
+                                    defaults={'account_name': 'Checking'}))
+'''
+import operator
+import threading
+import convert
+
+
+# Fields of a transaction, the same as the attributes of data.Transaction.
+FIELDS = ('date', 'description', 'original_description', 'amount', 'transaction_type',
+          'category', 'account_name', 'tags', 'notes')
+
+# How amounts are signed.
+# TYPE_COLUMN      amounts are positive and a column says whether each one is a debit or a credit.
+# NEGATIVE_DEBITS  money going out is negative and money coming in is positive (bank accounts).
+# POSITIVE_DEBITS  money going out is positive and money coming in is negative (some card statements).
+TYPE_COLUMN = 'type column'
+NEGATIVE_DEBITS = 'negative debits'
+POSITIVE_DEBITS = 'positive debits'
+SIGN_CONVENTIONS = (TYPE_COLUMN, NEGATIVE_DEBITS, POSITIVE_DEBITS)
+
+DEBIT = 'debit'
+CREDIT = 'credit'
+
+
+class UnknownFileFormat(ValueError):
+    ''' The format of a transaction file could not be found in the registry. '''
+    pass
+
+
+class InvalidDate(ValueError):
+    ''' A line of a transaction file has a date that cannot be read in the date format of the file. '''
+    pass
+
+
+class Source:
+    '''
+    One export format.
+    columns maps fields to the header of their column. Headers are matched ignoring case.
+    A field can be given a list of headers, in which case the first one in the file is used.
+    Fields without a column take their value from defaults ('' unless given there).
+    original_description falls back to the description column.
+    date_format is one of convert.DATE_FORMATS, or None to detect it from each file.
+    sign is one of SIGN_CONVENTIONS. Amounts are always stored as positive amounts with a
+    transaction type of debit or credit, the way Mint writes them.
+    Transactions in a category that starts with hidden_prefix are left out.
+    '''
+
+    def __init__(self, name, columns, date_format=None, sign=TYPE_COLUMN, defaults=None, hidden_prefix='hide'):
+        if sign not in SIGN_CONVENTIONS:
+            raise ValueError('Unknown sign convention: ' + str(sign))
+        if date_format is not None and date_format not in convert.DATE_FORMATS:
+            raise convert.InvalidDateFormat('Invalid date format ' + date_format + '.')
+        unknown = [field for field in columns if field not in FIELDS]
+        if unknown:
+            raise ValueError('Unknown fields: ' + ', '.join(unknown))
+
+        self.name = name
+        self.columns = {field: [header.lower() for header in ([headers] if isinstance(headers, str) else headers)]
+                        for field, headers in columns.items()}
+        self.date_format = date_format
+        self.sign = sign
+        self.defaults = dict(defaults or {})
+        self.hidden_prefix = hidden_prefix.lower()
+        self.required = ('date', 'description', 'amount') + (('transaction_type',) if sign == TYPE_COLUMN else ())
+        self._parsers = dict()
+        self._lock = threading.Lock()
+
+
+    def __repr__(self):
+        return 'Source(' + repr(self.name) + ')'
+
+
+    def __getstate__(self):
+        # Sources are sent to worker processes without their compiled parsers and lock.
+        state = dict(self.__dict__)
+        del state['_parsers'], state['_lock']
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._parsers = dict()
+        self._lock = threading.Lock()
+
+
+    def position(self, field, header):
+        ''' Returns the position of the column for field in header (a list of lower case names) or None. '''
+        for name in self.columns.get(field, []):
+            if name in header:
+                return header.index(name)
+        return None
+
+
+    def matches(self, header):
+        ''' Returns True if header has a column for every field this source needs. '''
+        header = [name.strip().lower() for name in header]
+        return all(self.position(field, header) is not None for field in self.required)
+
+
+    def compile(self, header):
+        '''
+        Returns the Parser for a header line. Each distinct header is only compiled once.
+        Raises UnknownFileFormat if the header is missing a column the source needs.
+        '''
+        key = tuple(header)
+        parser = self._parsers.get(key)
+        if parser is None:
+            with self._lock:
+                parser = self._parsers.get(key)
+                if parser is None:
+                    parser = self._parsers[key] = Parser(self, key)
+        return parser
+
+
+class Parser:
+    '''
+    Decodes the lines of a file with one header for a Source.
+    getters holds an operator.itemgetter for every field that has a column. Fields that
+    do not have one are filled with their default.
+    '''
+
+    def __init__(self, source, header):
+        self.source = source
+        self.header = list(header)
+        lowered = [name.strip().lower() for name in header]
+        missing = [field for field in source.required if source.position(field, lowered) is None]
+        if missing:
+            raise UnknownFileFormat('The header of the file has no column for ' + ', '.join(missing) +
+                                    ' needed by the ' + source.name + ' format.')
+
+        self.positions = {field: source.position(field, lowered) for field in FIELDS}
+        if self.positions['original_description'] is None and 'original_description' not in source.defaults:
+            self.positions['original_description'] = self.positions['description']
+        self.getters = {field: operator.itemgetter(position)
+                        for field, position in self.positions.items() if position is not None}
+        self.width = max(position for position in self.positions.values() if position is not None) + 1
+
+
+    def column(self, field, lines):
+        ''' Returns the values of a field for a list of lines. '''
+        getter = self.getters.get(field)
+        if getter is None:
+            return [self.source.defaults.get(field, '')] * len(lines)
+        return list(map(getter, lines))
+
+
+    def value(self, field, line):
+        ''' Returns the value of a field for one line. '''
+        getter = self.getters.get(field)
+        if getter is None:
+            return self.source.defaults.get(field, '')
+        return getter(line)
+
+
+    def visible(self, lines):
+        '''
+        Returns the lines that are long enough to hold every column and are not in a
+        hidden category.
+        '''
+        width = self.width
+        getter = self.getters.get('category')
+        prefix = self.source.hidden_prefix
+        if getter is None or not prefix:
+            return [line for line in lines if len(line) >= width]
+        length = len(prefix)
+        return [line for line in lines if len(line) >= width and getter(line).lower()[0:length] != prefix]
+
+
+    def date_format(self, lines):
+        ''' Returns the date format of the source or, if it does not have one, detects it from lines. '''
+        if self.source.date_format is not None:
+            return self.source.date_format
+        return convert.detect_date_format(map(self.getters['date'], lines))
+
+
+    def ordinals(self, lines, date_format=None):
+        '''
+        Returns an array of date ordinals for lines.
+        Raises InvalidDate, naming the first bad value, if a date is empty or cannot be read.
+        '''
+        if date_format is None:
+            date_format = self.date_format(lines)
+        values = self.column('date', lines)
+        try:
+            ordinals = convert.to_ordinals(values, date_format)
+        except convert.InvalidDateFormat:
+            raise
+        except (ValueError, IndexError):
+            ordinals = None
+        if ordinals is None or 0 in ordinals:
+            for value in values:
+                self.ordinal(value, date_format)
+        return ordinals
+
+
+    def ordinal(self, value, date_format):
+        ''' Returns the date ordinal of one date value. Raises InvalidDate if it is empty or cannot be read. '''
+        try:
+            ordinal = convert.ORDINAL_PARSERS[date_format](value)
+        except (ValueError, IndexError) as error:
+            raise InvalidDate('Invalid date ' + repr(value) + ' in a ' + self.source.name +
+                              ' file with dates written ' + date_format + '.') from error
+        if ordinal == 0:
+            raise InvalidDate('Missing date in a ' + self.source.name + ' file.')
+        return ordinal
+
+
+    def amounts(self, lines):
+        '''
+        Returns the amounts of lines as an array of positive whole cents, the transaction
+        type of each line and the number of amounts that could not be converted.
+        '''
+        cents, invalid = convert.to_cents(self.column('amount', lines))
+        sign = self.source.sign
+        if sign == TYPE_COLUMN:
+            return cents, self.column('transaction_type', lines), invalid.count(1)
+
+        debit_is_negative = sign == NEGATIVE_DEBITS
+        types = [DEBIT if (amount < 0) == debit_is_negative else CREDIT for amount in cents]
+        for position, amount in enumerate(cents):
+            if amount < 0:
+                cents[position] = -amount
+        return cents, types, invalid.count(1)
+
+
+    def amount(self, line):
+        ''' Returns the amount of one line in positive whole cents and its transaction type. '''
+        cents = convert.to_cent(self.value('amount', line))
+        sign = self.source.sign
+        if sign == TYPE_COLUMN:
+            return cents, self.value('transaction_type', line)
+        debit = (cents < 0) == (sign == NEGATIVE_DEBITS)
+        return abs(cents), DEBIT if debit else CREDIT
+
+
+    def key(self, line, date_format):
+        '''
+        Returns the key used to tell whether a line has already been loaded.
+        Matches data.ColumnStore.row_keys.
+        Raises InvalidDate if the date is empty or cannot be read, the same as loading the line does.
+        '''
+        return (self.ordinal(self.value('date', line), date_format),
+                self.value('original_description', line),
+                self.amount(line)[0],
+                self.value('account_name', line))
+
+
+# Registered sources by name, in the order they are tried when detecting the format of a file.
+SOURCES = dict()
+
+
+def register(source):
+    ''' Adds a source to the registry, replacing any source with the same name. Returns the source. '''
+    SOURCES[source.name] = source
+    return source
+
+
+def restore(registered):
+    '''
+    Replaces the registry with registered, a list of sources in the order they are tried.
+    Used to give worker processes the sources registered in the process that started them,
+    which they do not have unless they were forked from it.
+    '''
+    SOURCES.clear()
+    for source in registered:
+        register(source)
+
+
+def get_source(name):
+    if name not in SOURCES:
+        raise UnknownFileFormat('Unknown file format: ' + str(name) + '. Known formats: ' + ', '.join(SOURCES))
+    return SOURCES[name]
+
+
+def detect(header):
+    ''' Returns the first registered source that can read a file with header. '''
+    for source in SOURCES.values():
+        if source.matches(header):
+            return source
+    raise UnknownFileFormat('No known file format has the columns: ' + ', '.join(header))
+
+
+def parser_for(header, name=None):
+    ''' Returns the compiled Parser for a header using the named source or, without a name, the detected one. '''
+    source = detect(header) if name is None else get_source(name)
+    return source.compile(header)
+
+
+MINT = register(Source('mint', {'date': 'date',
+                                 'description': 'description',
+                                 'original_description': 'original description',
+                                 'amount': 'amount',
+                                 'transaction_type': 'transaction type',
+                                 'category': 'category',
+                                 'account_name': 'account name',
+                                 'tags': 'labels',
+                                 'notes': 'notes'}))
+
+# The header Mint writes. Used to read lines that come without a header.
+MINT_HEADER = ['Date', 'Description', 'Original Description', 'Amount', 'Transaction Type',
+               'Category', 'Account Name', 'Labels', 'Notes']
+
+# Chase credit card activity download. Purchases are negative and payments positive.
+CHASE = register(Source('chase', {'date': 'transaction date',
+                                  'description': 'description',
+                                  'amount': 'amount',
+                                  'category': 'category',
+                                  'notes': 'memo'},
+                        date_format='mm/dd/yyyy', sign=NEGATIVE_DEBITS, defaults={'account_name': 'Chase'}))
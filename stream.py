@@ -0,0 +1,128 @@
+'''
+Single pass reports over a transaction file that is never loaded into memory as a whole.
+The file is read a chunk at a time. Each chunk is converted into a small ColumnStore,
+filtered and then dropped, so memory use depends on the chunk size and the number of
+groups being totalled rather than on the size of the file.
+'''
+import csv
+import os
+import datetime
+import convert
+import settings
+import data
+import sources
+
+
+class StreamTotals:
+    '''
+    Totals collected in one pass over a transaction file.
+    categories and days only include transactions of the requested type.
+    accounts includes every transaction type, the same as Transactions.get_accounts.
+    rows_read is the number of lines read from the file and rows_matched the number of
+    transactions behind categories and days.
+    '''
+
+    def __init__(self):
+        self.categories = dict()
+        self.days = dict()
+        self.accounts = dict()
+        self.rows_read = 0
+        self.rows_matched = 0
+
+
+def read_stores(data_file=None, chunk_size=data.CHUNK_SIZE, file_format=None):
+    '''
+    Yields a ColumnStore for each chunk of lines in the transaction file along with the
+    number of lines read for the chunk. Hidden transactions are read but left out of the store.
+    The file is read with the sources.Source named by file_format, or the one picked from
+    its header. The date format is detected from the first chunk.
+    '''
+    if data_file is None:
+        data_file = settings.DATA_FILE
+    if file_format is None:
+        file_format = settings.FILE_FORMAT
+
+    if not os.path.isfile(data_file):
+        raise data.MissingTransactionFile('Missing transaction file: ' + data_file)
+
+    with open(data_file, 'r') as fhand:
+        reader = csv.reader(fhand)
+        header = next(reader, None)
+        if header is None:
+            return
+        parser = sources.parser_for(header, file_format)
+        date_format = None
+        for lines in data.read_chunks(reader, chunk_size):
+            store = data.ColumnStore()
+            line_count = len(lines)
+            lines = parser.visible(lines)
+            if date_format is None and len(lines) > 0:
+                date_format = parser.date_format(lines)
+            store.extend_lines(lines, parser, date_format)
+            yield store, line_count
+
+
+def matching_rows(store, tran_type=None, start_date=None, end_date=None):
+    '''
+    Yields the rows of a store that are of type tran_type and fall between start_date and
+    end_date (inclusive). A value of None means no limit.
+    '''
+    start = start_date.toordinal() if start_date is not None else 0
+    end = end_date.toordinal() if end_date is not None else datetime.date.max.toordinal()
+    type_codes = None if tran_type is None else store.type_names.find(tran_type)
+
+    row = 0
+    for day, type_code in zip(store.dates, store.types):
+        if start <= day <= end and (type_codes is None or type_code in type_codes):
+            yield row
+        row += 1
+
+
+def iter_transactions(data_file=None, tran_type=None, start_date=None, end_date=None,
+                      chunk_size=data.CHUNK_SIZE, file_format=None):
+    '''
+    Yields a Transaction object for each matching transaction in the file.
+    file_format is passed on to read_stores.
+    '''
+    for store, _ in read_stores(data_file, chunk_size, file_format):
+        for row in matching_rows(store, tran_type, start_date, end_date):
+            yield store.transaction(row)
+
+
+def aggregate(data_file=None, start_date=None, end_date=None, tran_type='debit',
+              chunk_size=data.CHUNK_SIZE, file_format=None):
+    '''
+    Works out category totals and daily spending for a date range, and account totals for
+    the whole file, in a single pass over the file. file_format is passed on to read_stores.
+    Returns a StreamTotals object.
+    '''
+    totals = StreamTotals()
+    for store, line_count in read_stores(data_file, chunk_size, file_format):
+        totals.rows_read += line_count
+        category_names = store.category_names.values
+        account_names = store.account_names.values
+
+        # Accounts are totalled over every row, the same as Transactions.get_accounts.
+        for code, amount in zip(store.accounts, store.cents):
+            add(totals.accounts, account_names[code], amount)
+
+        for row in matching_rows(store, tran_type, start_date, end_date):
+            totals.rows_matched += 1
+            amount = store.cents[row]
+            add(totals.categories, category_names[store.categories[row]], amount)
+            add(totals.days, store.dates[row], amount)
+
+    # Dates are kept as ordinals and amounts as whole cents while totalling.
+    # Hand them back as dates in order and as amounts.
+    totals.days = {datetime.date.fromordinal(day): convert.to_dollars(totals.days[day]) for day in sorted(totals.days)}
+    totals.categories = {name: convert.to_dollars(cents) for name, cents in totals.categories.items()}
+    totals.accounts = {name: convert.to_dollars(cents) for name, cents in totals.accounts.items()}
+    return totals
+
+
+def add(totals, key, amount):
+    ''' Adds amount to the total for key. '''
+    if key in totals:
+        totals[key] += amount
+    else:
+        totals[key] = amount
@@ -1,18 +1,27 @@
 '''
 Fixtures to be used by unit tests.
 '''
+import os
 import datetime
 import calendar
 import pytest
 import settings
 import data
+import benchmark
 
 
 @pytest.fixture(scope='session')
-def transactions():
-    ''' Fixture that will return a list of transactions.'''
+def transactions(tmp_path_factory):
+    '''
+    Fixture that will return a list of transactions.
+    When there is no transaction file in settings a synthetic export that ends today is used.
+    '''
     print('Calling the transaction fixture.')
-    trans = data.Transactions()
+    data_file = settings.DATA_FILE
+    if not os.path.isfile(data_file):
+        data_file = str(tmp_path_factory.mktemp('data') / 'transactions.csv')
+        benchmark.generate(data_file, 3000, end_date=datetime.date.today())
+    trans = data.Transactions(data_file)
     yield trans
     trans = None
 
@@ -64,3 +73,41 @@ def current_month():
     start_date = datetime.date(year, month, 1)
     end_date = datetime.date(year, month, last_day)
     return (start_date, end_date)
+
+
+SAMPLE_LINES = [
+    '"Date","Description","Original Description","Amount","Transaction Type","Category","Account Name","Labels","Notes"',
+    '"3/15/2017","Stop & Shop","STOP & SHOP 0123","45.10","debit","Groceries","Visa","Keith",""',
+    '"3/14/2017","Wells Fargo","WELLS FARGO HOME MTG","1500.00","debit","Mortgage & Rent","Checking","Lake House","March"',
+    '"3/14/2017","Shell","SHELL OIL 5511","30.25","debit","Gas & Fuel","Visa","Eileen Split",""',
+    '"3/10/2017","Payroll","ACME CORP PAYROLL","2500.00","credit","Paycheck","Checking","",""',
+    '"3/02/2017","Transfer","ONLINE TRANSFER","200.00","debit","Hide from Budgets & Trends","Checking","",""',
+    '"2/27/2017","Stop & Shop","STOP & SHOP 0123","62.40","debit","Groceries","Amex","",""',
+    '"2/03/2017","Payroll","ACME CORP PAYROLL","2500.00","credit","Paycheck","Checking","",""',
+]
+
+
+@pytest.fixture
+def sample_lines():
+    ''' Fixture that returns the lines of the small Mint export used by sample_file, header first. '''
+    return list(SAMPLE_LINES)
+
+
+@pytest.fixture
+def sample_file(tmp_path):
+    '''
+    Fixture that writes a small Mint export to a temporary directory and returns its path.
+    One of the transactions is in a hidden category.
+    '''
+    data_file = tmp_path / 'transactions.csv'
+    data_file.write_text('\n'.join(SAMPLE_LINES) + '\n')
+    return str(data_file)
+
+
+@pytest.fixture
+def sample(sample_file):
+    ''' Fixture that returns the sample file loaded into a Transactions object. '''
+    trans = data.Transactions(sample_file)
+    trans.start_date = datetime.date(2017, 3, 1)
+    trans.end_date = datetime.date(2017, 3, 31)
+    return trans
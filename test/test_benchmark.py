@@ -0,0 +1,46 @@
+'''
+Module to test the benchmark module.
+'''
+import csv
+import data
+import benchmark
+
+
+def test_generate(tmp_path):
+    path = str(tmp_path / 'synthetic.csv')
+    benchmark.generate(path, 2000, seed=1)
+    with open(path, newline='') as fhand:
+        rows = list(csv.reader(fhand))
+    assert rows[0] == benchmark.HEADER
+    assert len(rows) == 2001
+    categories = {row[5] for row in rows[1:]}
+    assert 'Hide from Budgets & Trends' in categories
+    assert {row[4] for row in rows[1:]} == {'debit', 'credit'}
+    # Newest first, the way Mint writes the file.
+    assert rows[1][0] == '12/31/2024'
+
+    # The same seed gives the same file.
+    again = str(tmp_path / 'again.csv')
+    benchmark.generate(again, 2000, seed=1)
+    with open(again, newline='') as fhand:
+        assert list(csv.reader(fhand)) == rows
+
+    transactions = data.Transactions(path, use_snapshot=False)
+    hidden = sum(1 for row in rows[1:] if row[5] == 'Hide from Budgets & Trends')
+    assert len(transactions.store) == 2000 - hidden
+
+
+def test_run_stages(tmp_path):
+    path = benchmark.synthetic_file(500, str(tmp_path))
+    records = benchmark.run_stages(path, 500)
+    assert [record['stage'] for record in records] == [
+        'load', 'load_snapshot', 'get_transactions_by_type', 'get_categories', 'get_category_totals',
+        'get_daily_spending', 'render_transactions', 'render_totals', 'query_category_month']
+    assert all(record['seconds'] >= 0 and record['rows'] == 500 for record in records)
+
+
+def test_compare():
+    baseline = [{'rows': 10, 'stage': 'load', 'seconds': 1.0}, {'rows': 10, 'stage': 'render_totals', 'seconds': 1.0}]
+    records = [{'rows': 10, 'stage': 'load', 'seconds': 1.1}, {'rows': 10, 'stage': 'render_totals', 'seconds': 2.0},
+               {'rows': 20, 'stage': 'load', 'seconds': 9.0}]
+    assert benchmark.compare(records, baseline) == [(10, 'render_totals', 1.0, 2.0)]
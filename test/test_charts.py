@@ -0,0 +1,68 @@
+'''
+Module to test the charts module.
+'''
+import os
+import datetime
+import pytest
+import settings
+import charts
+
+
+MARCH = (datetime.date(2017, 3, 1), datetime.date(2017, 3, 31))
+TOTALS = {'Mortgage & Rent': 1500.0, 'Groceries': 45.1, 'Gas & Fuel': 30.25, 'Shopping': 400.0}
+
+
+def test_pie_slices():
+    labels, sizes = charts.pie_slices(TOTALS, 300)
+    assert labels == ['Mortgage & Rent', 'Shopping', 'Other']
+    assert sizes == [1500.0, 400.0, 45.1 + 30.25]
+
+
+def test_chart_key():
+    key = charts.chart_key('pie', {'totals': TOTALS, 'other_limit': 300})
+    assert key == charts.chart_key('pie', {'other_limit': 300, 'totals': dict(TOTALS, Groceries=45.1000000001)})
+    assert key != charts.chart_key('pie', {'totals': TOTALS, 'other_limit': 100})
+    assert key != charts.chart_key('day', {'totals': TOTALS, 'other_limit': 300})
+
+
+def test_chart_path(tmp_path):
+    path = charts.chart_path('pie', {'totals': TOTALS}, 'svg', str(tmp_path))
+    assert os.path.dirname(path) == str(tmp_path)
+    assert path.endswith('.svg')
+    with pytest.raises(ValueError):
+        charts.chart_path('pie', {'totals': TOTALS}, 'gif', str(tmp_path))
+
+
+def test_render_is_cached(tmp_path, monkeypatch):
+    pytest.importorskip('matplotlib')
+    path = charts.category_pie_image(TOTALS, MARCH[0], MARCH[1], 'png', str(tmp_path))
+    with open(path, 'rb') as fhand:
+        assert fhand.read(8) == b'\x89PNG\r\n\x1a\n'
+
+    # A second request for the same chart does not draw anything.
+    monkeypatch.setattr(charts, 'headless_figure', None)
+    assert charts.category_pie_image(TOTALS, MARCH[0], MARCH[1], 'png', str(tmp_path)) == path
+
+    # Changing OTHER_LIMIT changes the chart.
+    monkeypatch.setattr(settings, 'OTHER_LIMIT', 10)
+    with pytest.raises(TypeError):
+        charts.category_pie_image(TOTALS, MARCH[0], MARCH[1], 'png', str(tmp_path))
+
+
+def test_render_leaves_backend_alone(tmp_path):
+    matplotlib = pytest.importorskip('matplotlib')
+    backend = matplotlib.get_backend()
+    charts.category_pie_image(TOTALS, MARCH[0], MARCH[1], 'png', str(tmp_path))
+    assert matplotlib.get_backend() == backend
+
+
+def test_trend_and_daily_images(sample, tmp_path):
+    pytest.importorskip('matplotlib')
+    directory = str(tmp_path / 'images')
+    months = [(2017, 2), (2017, 3)]
+    trend_path = charts.monthly_trend_image(months, sample.get_monthly_trend('debit', months), 'svg', directory)
+    with open(trend_path) as fhand:
+        assert '<svg' in fhand.read()
+    day_path = charts.daily_spending_image(sample.get_daily_spending(), 'png', directory)
+    assert os.path.getsize(day_path) > 0
+    assert len(os.listdir(directory)) == 2
@@ -63,3 +63,90 @@ def test_to_float_2():
 
 def test_to_float_3():
     assert convert.to_float('') == 0
+
+
+def test_to_date_8():
+    test_value = '2017-03-15'
+    valid_date = datetime.date(2017, 3, 15)
+    assert convert.to_date(test_value, 'yyyy/mm/dd') == valid_date
+
+
+def test_to_date_cache():
+    convert.to_date('3/16/2017')
+    convert.to_date('3/16/2017')
+    cache_info = convert.DATE_PARSERS['mm/dd/yyyy'].cache_info()
+    assert cache_info.hits > 0
+    assert cache_info.maxsize == convert.DATE_CACHE_SIZE
+
+
+def test_detect_date_format():
+    assert convert.detect_date_format(['3/15/2017', '3/16/2017']) == 'mm/dd/yyyy'
+    assert convert.detect_date_format(['3/10/2017', '15/3/2017']) == 'dd/mm/yyyy'
+    assert convert.detect_date_format(['', '20170315']) == 'yyyymmdd'
+    assert convert.detect_date_format(['2017-03-15']) == 'yyyy/mm/dd'
+    assert convert.detect_date_format([]) == 'mm/dd/yyyy'
+
+
+def test_to_dates():
+    dates = convert.to_dates(['15/3/2017', '', '1/4/2017'])
+    assert dates == [datetime.date(2017, 3, 15), None, datetime.date(2017, 4, 1)]
+
+
+def test_to_ordinals():
+    ordinals = convert.to_ordinals(['3/15/2017', ''], 'mm/dd/yyyy')
+    assert list(ordinals) == [datetime.date(2017, 3, 15).toordinal(), 0]
+
+
+def test_to_ordinals_error():
+    with pytest.raises(convert.InvalidDateFormat):
+        convert.to_ordinals(['3/15/2017'], 'abcdefg')
+
+
+def test_to_float_4():
+    assert convert.to_float('(1,234.50)') == -1234.50
+    assert convert.to_float('-$5.00') == -5.00
+
+
+def test_to_floats_plain():
+    floats, mask = convert.to_floats(['1.50', '-2', '3e2'])
+    assert list(floats) == [1.50, -2.0, 300.0]
+    assert mask == bytearray(3)
+
+
+def test_to_floats_formatted():
+    floats, mask = convert.to_floats(['$1,234.56', '(12.00)', 'n/a', '', ' 7 '])
+    assert list(floats) == [1234.56, -12.00, 0, 0, 7.0]
+    assert list(mask) == [0, 0, 1, 1, 0]
+
+
+def test_to_floats_not_finite():
+    floats, mask = convert.to_floats(['1.50', 'nan', 'inf', '-Infinity'])
+    assert list(floats) == [1.50, 0, 0, 0]
+    assert list(mask) == [0, 1, 1, 1]
+
+
+def test_to_cents():
+    cents, mask = convert.to_cents(['$0.29', '(1,000.10)', 'xxx'])
+    assert list(cents) == [29, -100010, 0]
+    assert list(mask) == [0, 0, 1]
+
+
+def test_to_cents_not_finite():
+    cents, mask = convert.to_cents(['12.34', 'nan', 'inf', '-inf', '1e300'])
+    assert list(cents) == [1234, 0, 0, 0, 0]
+    assert list(mask) == [0, 1, 1, 1, 1]
+    assert convert.to_cent('nan') == 0
+    assert convert.to_cent('Infinity') == 0
+    assert convert.to_cent('-1e300') == 0
+
+
+def test_to_cent():
+    assert convert.to_cent('0.29') == 29
+    assert convert.to_cent('$1,000.10') == 100010
+    assert convert.to_cent('n/a') == 0
+    assert convert.to_dollars(100010) == 1000.10
+
+
+def test_total_amounts_is_exact():
+    assert sum([0.1] * 10) != 1.0
+    assert convert.total_amounts([0.1] * 10) == 1.0
@@ -0,0 +1,59 @@
+'''
+Module to test the cube module.
+'''
+import datetime
+import pytest
+import cube
+
+
+def test_month_range():
+    assert cube.month_range(201611, 201702) == [201611, 201612, 201701, 201702]
+
+
+def test_whole_months():
+    assert cube.whole_months(datetime.date(2017, 2, 1), datetime.date(2017, 3, 31)) == (201702, 201703)
+    assert cube.whole_months(datetime.date(2017, 2, 2), datetime.date(2017, 3, 31)) is None
+    assert cube.whole_months(datetime.date(2017, 2, 1), datetime.date(2017, 3, 30)) is None
+
+
+def test_cube_totals(sample):
+    debit = sample.store.type_names.find('debit')
+    totals = sample.cube.totals(201703, 201703, debit)
+    assert totals == {'Groceries': 45.10, 'Mortgage & Rent': 1500.00, 'Gas & Fuel': 30.25}
+    assert sample.cube.counts(201702, 201703)['Paycheck'] == 2
+    assert sample.cube.totals(201702, 201703, dimension='account')['Amex'] == 62.40
+
+
+def test_cube_matches_transactions(sample):
+    from_cube = sample.get_category_totals_by_type('debit', datetime.date(2017, 2, 1), datetime.date(2017, 3, 31))
+    debits = sample.get_transactions_by_type('debit', datetime.date(2017, 2, 1), datetime.date(2017, 3, 31))
+    from_rows = sample.get_category_totals(sample.get_categories(debits))
+    assert from_cube.keys() == from_rows.keys()
+    for name in from_cube:
+        assert from_cube[name] == pytest.approx(from_rows[name])
+
+
+def test_category_totals_partial_month(sample):
+    totals = sample.get_category_totals_by_type('debit', datetime.date(2017, 3, 15), datetime.date(2017, 3, 31))
+    assert totals == {'Groceries': 45.10}
+
+
+def test_monthly_trend(sample):
+    trend = sample.get_monthly_trend('debit', [(2017, 1), (2017, 2), (2017, 3)])
+    assert trend['Groceries'] == [0, 62.40, 45.10]
+    assert trend['Gas & Fuel'] == [0, 0, 30.25]
+
+
+def test_refresh_updates_cube(sample):
+    sample.cube
+    with open(sample.data_file, 'a') as fhand:
+        fhand.write('"3/20/2017","Shell","SHELL OIL 5511","20.00","debit","Gas & Fuel","Visa","",""\n')
+    sample.refresh()
+    totals = sample.get_category_totals_by_type('debit')
+    assert totals['Gas & Fuel'] == 30.25 + 20.00
+
+
+def test_month_helpers():
+    assert cube.month_dates(2016, 2) == (datetime.date(2016, 2, 1), datetime.date(2016, 2, 29))
+    assert cube.previous_month(2017, 1) == (2016, 12)
+    assert cube.last_months(datetime.date(2017, 2, 10), 3) == [(2016, 12), (2017, 1), (2017, 2)]
@@ -1,9 +1,14 @@
 '''
 Module to test the dataaccess module.
 '''
+import os
+import datetime
 import pytest
 import settings
 import data
+import search
+import sources
+import stream
 #from test_fixtures import transactions, previous_month, current_month
 
 
@@ -77,3 +82,332 @@ def test_get_transactions_by_type_2(transactions, previous_month):
 
     debits_list = transactions.get_transactions_by_type('debit')
     assert debits_list != None
+
+
+def test_columnar_load(sample):
+    ''' Hidden transactions are counted but not stored. '''
+    assert sample.count == 7
+    assert len(sample.store) == 6
+    assert len(sample.store.category_names) == 4
+
+
+def test_transaction_list_matches_columns(sample):
+    transaction = sample.transaction_list[0]
+    assert transaction.transaction_date == datetime.date(2017, 3, 15)
+    assert transaction.amount == 45.10
+    assert transaction.category == 'Groceries'
+    assert transaction.tags == 'Keith'
+    assert len(sample.transaction_list) == 6
+
+
+def test_transaction_record_is_compact(sample):
+    first, second = [transaction for transaction in sample.transaction_list if transaction.category == 'Groceries']
+    assert not hasattr(first, '__dict__')
+    assert first.cents == 4510
+    # Low cardinality fields and dates are shared between records.
+    assert first.category is second.category
+    assert first.description is second.description
+    assert sample.transaction_list[1].transaction_date is sample.transaction_list[2].transaction_date
+    first.amount = 45.20
+    assert first.cents == 4520
+
+
+def test_get_transactions_by_type_rows(sample):
+    debits = sample.get_transactions_by_type('debit')
+    assert isinstance(debits, data.Rows)
+    assert len(debits) == 3
+    assert [t.description for t in debits] == ['Wells Fargo', 'Shell', 'Stop & Shop']
+
+
+def test_get_transactions_by_type_range(sample):
+    credits = sample.get_transactions_by_type('credit', datetime.date(2017, 2, 1), datetime.date(2017, 3, 9))
+    assert [t.transaction_date for t in credits] == [datetime.date(2017, 2, 3)]
+    assert len(sample.get_transactions_by_type('transfer')) == 0
+
+
+def test_get_categories_rows_match_list(sample):
+    from_rows = sample.get_category_totals(sample.get_categories(sample.all_rows()))
+    from_list = sample.get_category_totals(sample.get_categories(sample.transaction_list))
+    assert from_rows == from_list
+    assert from_rows['Groceries'] == 45.10 + 62.40
+
+
+def test_get_tags_rows(sample):
+    tags = sample.get_tags(sample.all_rows())
+    assert list(tags) == ['Keith', 'Eileen', 'Split', 'Lake House']
+    assert tags['Split'][0].description == 'Shell'
+
+
+def test_get_accounts_totals(sample):
+    accounts = sample.get_accounts()
+    assert accounts['Checking'] == 1500.00 + 2500.00 + 2500.00
+
+
+def test_get_daily_spending_columns(sample):
+    days = sample.get_daily_spending()
+    assert days == {datetime.date(2017, 3, 15): 45.10, datetime.date(2017, 3, 14): 1500.00 + 30.25}
+
+
+def test_rows_sort(sample):
+    debits = sample.get_transactions_by_type('debit')
+    debits.sort(key=lambda x: x.amount)
+    assert debits[0].description == 'Shell'
+    assert debits[2].description == 'Wells Fargo'
+
+
+NEW_LINE = '"3/20/2017","Shell","SHELL OIL 5511","20.00","debit","Gas & Fuel","Visa","",""'
+
+
+def rewrite(data_file, lines):
+    ''' Writes a new version of the sample file. '''
+    with open(data_file, 'w') as fhand:
+        fhand.write('\n'.join(lines) + '\n')
+
+
+def test_refresh_unchanged(sample):
+    assert sample.refresh() == 0
+
+
+def test_refresh_new_rows_at_top(sample_file, sample_lines):
+    transactions = data.Transactions(sample_file)
+    rewrite(sample_file, sample_lines[:1] + [NEW_LINE] + sample_lines[1:])
+    assert transactions.refresh() == 1
+    assert transactions.count == 8
+    assert transactions.store.descriptions[-1] == 'Shell'
+    assert transactions.store.cents[-1] == 2000
+
+
+def test_refresh_new_rows_at_bottom(sample_file, sample_lines):
+    transactions = data.Transactions(sample_file, use_snapshot=False)
+    rewrite(sample_file, sample_lines + [NEW_LINE, NEW_LINE])
+    assert transactions.refresh() == 2
+    assert transactions.count == 9
+
+
+def test_refresh_file_without_trailing_newline(sample_file, sample_lines):
+    with open(sample_file, 'w') as fhand:
+        fhand.write('\n'.join(sample_lines))
+    transactions = data.Transactions(sample_file)
+    assert len(transactions.store) == 6
+
+    # The last line is added to. On its own the added text would look like a whole row.
+    with open(sample_file, 'a') as fhand:
+        fhand.write(',' + NEW_LINE + '\n')
+    transactions.refresh()
+    assert len(transactions.store) == 6
+    assert list(transactions.store.descriptions) == list(data.Transactions(sample_file, use_snapshot=False).store.descriptions)
+
+    # A line is added to a file that ends without a line break.
+    with open(sample_file, 'w') as fhand:
+        fhand.write('\n'.join(sample_lines))
+    transactions = data.Transactions(sample_file)
+    with open(sample_file, 'a') as fhand:
+        fhand.write('\n' + NEW_LINE)
+    assert transactions.refresh() == 1
+    assert sorted(transactions.store.cents) == sorted(data.Transactions(sample_file, use_snapshot=False).store.cents)
+
+
+def test_refresh_reordered_file(sample_file, sample_lines):
+    transactions = data.Transactions(sample_file)
+    rewrite(sample_file, sample_lines[:1] + list(reversed(sample_lines[1:])) + [NEW_LINE])
+    assert transactions.refresh() == 1
+    assert len(transactions.store) == 7
+
+
+def test_refresh_removed_rows(sample_file, sample_lines):
+    transactions = data.Transactions(sample_file)
+    rewrite(sample_file, sample_lines[:2] + [NEW_LINE])
+    assert transactions.refresh() == 1
+    assert transactions.count == 2
+    assert len(transactions.store) == 2
+
+
+def test_refresh_saves_snapshot(sample_file, sample_lines):
+    transactions = data.Transactions(sample_file)
+    rewrite(sample_file, sample_lines[:1] + [NEW_LINE] + sample_lines[1:])
+    transactions.refresh()
+    reloaded = data.Transactions(sample_file)
+    assert isinstance(reloaded.store.dates, memoryview)
+    assert list(reloaded.store.descriptions) == list(transactions.store.descriptions)
+    assert reloaded.refresh() == 0
+
+
+def test_refresh_updates_date_index(sample_file, sample_lines):
+    transactions = data.Transactions(sample_file)
+    transactions.get_transactions_by_type('debit')
+    rewrite(sample_file, sample_lines[:1] + [NEW_LINE] + sample_lines[1:])
+    transactions.refresh()
+    debits = transactions.get_transactions_by_type('debit', datetime.date(2017, 3, 1), datetime.date(2017, 3, 31))
+    assert debits[-1].amount == 20.00
+
+
+def test_group_rows_uses_cache(sample):
+    debits = sample.get_transactions_by_type('debit')
+    first = sample.get_categories(debits)
+    again = sample.get_categories(sample.get_transactions_by_type('debit'))
+    assert first['Groceries'] is again['Groceries']
+    assert sample.get_category_totals(again)['Groceries'] == 45.10
+
+
+def test_refresh_updates_group_indexes(sample_file, sample_lines):
+    transactions = data.Transactions(sample_file)
+    assert transactions.get_accounts()['Visa'] == 45.10 + 30.25
+    before = transactions.get_categories(transactions.all_rows())['Gas & Fuel']
+    rewrite(sample_file, sample_lines + [NEW_LINE])
+    transactions.refresh()
+    assert transactions.get_accounts()['Visa'] == 45.10 + 30.25 + 20.00
+    after = transactions.get_categories(transactions.all_rows())['Gas & Fuel']
+    assert len(before) == 1
+    assert len(after) == 2
+
+
+def test_load_formatted_amounts(tmp_path, sample_lines):
+    data_file = tmp_path / 'bank.csv'
+    data_file.write_text(sample_lines[0] + '\n' +
+                         '"3/15/2017","Shop","SHOP","$1,234.56","debit","Shopping","Visa","",""\n' +
+                         '"3/16/2017","Shop","SHOP","n/a","debit","Shopping","Visa","",""\n')
+    transactions = data.Transactions(str(data_file), use_snapshot=False)
+    assert list(transactions.store.cents) == [123456, 0]
+    assert transactions.ingest_state['invalid_amounts'] == 1
+
+
+def test_load_amounts_that_are_not_finite(tmp_path, sample_lines):
+    data_file = tmp_path / 'bank.csv'
+    data_file.write_text(sample_lines[0] + '\n' +
+                         '"3/15/2017","Shop","SHOP","12.50","debit","Shopping","Visa","",""\n' +
+                         '"3/16/2017","Shop","SHOP","nan","debit","Shopping","Visa","",""\n' +
+                         '"3/17/2017","Shop","SHOP","inf","debit","Shopping","Visa","",""\n')
+    transactions = data.Transactions(str(data_file), use_snapshot=False)
+    assert list(transactions.store.cents) == [1250, 0, 0]
+    assert transactions.ingest_state['invalid_amounts'] == 2
+
+
+def test_load_blank_date(tmp_path, sample_lines):
+    data_file = tmp_path / 'bank.csv'
+    data_file.write_text(sample_lines[0] + '\n' +
+                         '"3/15/2017","Shop","SHOP","12.50","debit","Shopping","Visa","",""\n' +
+                         '"","Shop","SHOP","7.50","debit","Shopping","Visa","",""\n')
+    with pytest.raises(sources.InvalidDate):
+        data.Transactions(str(data_file), use_snapshot=False)
+    with pytest.raises(sources.InvalidDate):
+        stream.aggregate(str(data_file))
+
+
+def test_totals_are_exact(tmp_path, sample_lines):
+    # Adding 0.10 a thousand times as floats gives 99.9999999999986.
+    data_file = tmp_path / 'coffee.csv'
+    data_file.write_text(sample_lines[0] + '\n' + ''.join(
+        '"3/{0}/2017","Coffee","COFFEE","0.10","debit","Coffee Shops","Visa","",""\n'.format(day % 28 + 1)
+        for day in range(1000)))
+    transactions = data.Transactions(str(data_file), use_snapshot=False)
+    transactions.start_date = datetime.date(2017, 3, 1)
+    transactions.end_date = datetime.date(2017, 3, 31)
+    debits = transactions.get_transactions_by_type('debit')
+    assert debits.cents() == 10000
+    assert debits.total() == 100.0
+    assert transactions.get_category_totals_by_type('debit') == {'Coffee Shops': 100.0}
+    assert transactions.get_category_totals(transactions.get_categories(list(debits))) == {'Coffee Shops': 100.0}
+    assert sum(transactions.get_daily_spending().values()) == 100.0
+
+
+def write_files(tmp_path, sample_lines):
+    ''' Writes two exports that share one transaction. The second has its columns in another order. '''
+    first = tmp_path / 'checking.csv'
+    first.write_text('\n'.join(sample_lines[0:4]) + '\n')
+    second = tmp_path / 'visa.csv'
+    second.write_text('"Category","Amount","Date","Description","Original Description","Transaction Type",'
+                      '"Account Name","Labels","Notes"\n'
+                      '"Gas & Fuel","30.25","3/14/2017","Shell","SHELL OIL 5511","debit","Visa","Eileen Split",""\n'
+                      '"Gas & Fuel","20.00","3/20/2017","Shell","SHELL OIL 5511","debit","Visa","",""\n')
+    return [str(first), str(second)]
+
+
+def test_load_file_list(tmp_path, sample_lines):
+    transactions = data.Transactions(write_files(tmp_path, sample_lines), workers=1)
+    assert transactions.count == 5
+    assert len(transactions.store) == 4
+    assert transactions.get_category_totals(transactions.get_categories(transactions.all_rows()))['Gas & Fuel'] == 50.25
+
+
+def test_load_file_glob_in_parallel(tmp_path, sample_lines):
+    write_files(tmp_path, sample_lines)
+    transactions = data.Transactions(str(tmp_path / '*.csv'), workers=2)
+    serial = data.Transactions(str(tmp_path / '*.csv'), workers=1)
+    assert len(transactions.store) == 4
+    assert list(transactions.store.descriptions) == list(serial.store.descriptions)
+    assert transactions.get_accounts() == serial.get_accounts()
+
+
+def test_load_file_glob_skips_derived_files(tmp_path, sample_lines):
+    write_files(tmp_path, sample_lines)
+    transactions = data.Transactions(str(tmp_path / '*'), workers=1)
+    (tmp_path / 'checking.csv.words').write_bytes(b'\x00\xff')
+    (tmp_path / 'visa.csv.snapshot.tmp').write_bytes(b'\x00\xff')
+    transactions = data.Transactions(str(tmp_path / '*'), workers=1)
+    assert len(transactions.store) == 4
+    assert data.find_files(str(tmp_path / '*')) == [str(tmp_path / 'checking.csv'), str(tmp_path / 'visa.csv')]
+
+
+def test_load_file_glob_no_match(tmp_path):
+    with pytest.raises(data.MissingTransactionFile):
+        data.Transactions(str(tmp_path / '*.csv'))
+
+
+def test_refresh_file_list(tmp_path, sample_lines):
+    data_files = write_files(tmp_path, sample_lines)
+    transactions = data.Transactions(data_files, workers=1)
+    assert transactions.refresh() == 0
+    with open(data_files[1], 'a') as fhand:
+        fhand.write('"Groceries","10.00","3/21/2017","Shop","SHOP","debit","Visa","",""\n')
+    assert transactions.refresh() == 1
+    with open(data_files[0], 'w') as fhand:
+        fhand.write('\n'.join(sample_lines[0:2]) + '\n')
+    assert transactions.refresh() == 0
+    assert len(transactions.store) == 4
+
+
+def test_new_rows_counts_duplicates(sample):
+    store = sample.store
+    other = data.ColumnStore()
+    other.extend_store(store)
+    other.extend_store(store)
+    # Every row of other is in store once, so the second copy of each row is new.
+    assert len(store.new_rows(other)) == len(store)
+
+
+def test_search_categories(sample):
+    matches = sample.search_categories('g', sample.all_rows())
+    assert [name for name, _ in matches] == ['Groceries', 'Gas & Fuel', 'Mortgage & Rent']
+    assert sample.get_category_by_name('gas', sample.transaction_list)[0].description == 'Shell'
+
+
+def test_search_tags(sample):
+    matches = sample.search_tags('e', sample.all_rows())
+    assert [name for name, _ in matches] == ['Eileen', 'Keith', 'Lake House']
+
+
+def test_find_transactions(sample, sample_file):
+    matches = sample.find_transactions('stop & shop')
+    assert [t.transaction_date for t in matches] == [datetime.date(2017, 2, 27), datetime.date(2017, 3, 15)]
+    assert len(sample.find_transactions('stop', start_date=datetime.date(2017, 3, 1))) == 1
+    assert len(sample.find_transactions('acme', 'debit')) == 0
+    assert os.path.isfile(search.text_index_path(sample_file))
+
+    # The saved index is used by the next load and kept up to date by refresh.
+    trans = data.Transactions(sample_file)
+    assert trans.text_index.postings == sample.text_index.postings
+    with open(sample_file, 'a') as fhand:
+        fhand.write('"3/20/2017","Stop & Shop","STOP & SHOP 0123","12.00","debit","Groceries","Visa","",""\n')
+    assert trans.refresh() == 1
+    assert len(trans.find_transactions('shop')) == 3
+    assert len(data.Transactions(sample_file).find_transactions('shop')) == 3
+
+
+def test_rows_by_date(sample):
+    rows = sample.all_rows()
+    ordered = rows.by_date()
+    assert [sample.store.dates[row] for row in ordered.row_ids] == sorted(sample.store.dates)
+    assert ordered.by_date() is ordered
+    assert ordered[1:3].in_date_order
+    debits = sample.get_transactions_by_type('debit')
+    assert debits.by_date() is debits
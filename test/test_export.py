@@ -0,0 +1,62 @@
+'''
+Module to test the export module.
+'''
+import io
+import csv
+import json
+import datetime
+import export
+
+
+def test_transactions_csv(sample):
+    table = export.transactions_table(sample.get_transactions_by_type('debit'))
+    out = io.StringIO()
+    export.write_csv(table, out)
+    rows = list(csv.reader(io.StringIO(out.getvalue())))
+    assert rows[0] == table.names()
+    assert rows[1][0:4] == ['2017-03-14', 'Wells Fargo', 'WELLS FARGO HOME MTG', '1500.0']
+    assert len(rows) == 4
+
+
+def test_transactions_from_list(sample):
+    rows_table = export.transactions_table(sample.all_rows())
+    list_table = export.transactions_table(sample.transaction_list)
+    assert rows_table.columns == list_table.columns
+
+
+def test_category_totals_jsonl(sample):
+    totals = {'Groceries': 45.1, 'Credit Card Payment': 500.0, 'Gas & Fuel': 30.25}
+    out = io.StringIO()
+    export.write_jsonl(export.category_totals_table(totals), out)
+    rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert rows == [{'category': 'Groceries', 'total': 45.1}, {'category': 'Gas & Fuel', 'total': 30.25}]
+
+
+def test_columns_round_trip(sample):
+    tables = [export.transactions_table(sample.all_rows()),
+              export.daily_spending_table(sample.get_daily_spending()),
+              export.accounts_table(sample.get_accounts()),
+              export.category_comparison_table({'Groceries': 10.0, 'Rent': 5.0}, {'Groceries': 4.0})]
+    for table in tables:
+        out = io.BytesIO()
+        export.write(table, 'columns', out)
+        out.seek(0)
+        loaded = export.read_columns(out)
+        assert loaded.name == table.name
+        assert loaded.fields == table.fields
+        assert loaded.columns == [list(column) for column in table.columns]
+
+
+def test_daily_spending_dates(sample):
+    table = export.daily_spending_table(sample.get_daily_spending())
+    assert table.values()[0] == ['2017-03-14', '2017-03-15']
+    assert table.columns[0][0] == datetime.date(2017, 3, 14).toordinal()
+
+
+def test_export_to_file(sample, tmp_path):
+    path = str(tmp_path / 'accounts.csv')
+    export.export(export.accounts_table(sample.get_accounts()), 'csv', path)
+    with open(path, newline='') as fhand:
+        rows = list(csv.reader(fhand))
+    assert rows[0] == ['account', 'total']
+    assert sorted(row[0] for row in rows[1:]) == ['Amex', 'Checking', 'Visa']
@@ -0,0 +1,51 @@
+'''
+Module to test the start up cost of the command line.
+Each import is timed in a fresh interpreter so that modules loaded by other tests do not hide the cost.
+'''
+import os
+import sys
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds that importing mint may take. Text only commands should not pay for more than the standard library.
+IMPORT_TIME_BUDGET = 0.3
+
+# Modules that are only needed by some commands and must not be loaded at start up.
+DEFERRED_MODULES = ['matplotlib', 'http.server', 'concurrent.futures',
+                    'export', 'server', 'stream', 'cProfile', 'tracemalloc']
+
+SCRIPT = '''
+import sys
+import time
+start = time.perf_counter()
+import {0}
+print(time.perf_counter() - start)
+print(' '.join(sys.modules))
+'''
+
+
+def import_module(module):
+    ''' Imports module in a new interpreter. Returns the seconds it took and the names of the loaded modules. '''
+    result = subprocess.run([sys.executable, '-c', SCRIPT.format(module)], cwd=ROOT,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    seconds, modules = result.stdout.splitlines()[-2:]
+    return float(seconds), set(modules.split())
+
+
+def test_mint_import_is_light():
+    _, modules = import_module('mint')
+    assert 'mint' in modules
+    assert [name for name in DEFERRED_MODULES if name in modules] == []
+
+
+def test_mint_import_time():
+    # The best of a few runs so that a busy machine does not fail the test.
+    seconds = min(import_module('mint')[0] for _ in range(3))
+    assert seconds < IMPORT_TIME_BUDGET
+
+
+def test_charts_import_is_light():
+    _, modules = import_module('charts')
+    assert 'matplotlib' not in modules
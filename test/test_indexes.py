@@ -0,0 +1,54 @@
+'''
+Module to test the indexes module.
+'''
+import datetime
+import indexes
+
+
+def ordinal(month, day):
+    return datetime.date(2017, month, day).toordinal()
+
+
+def test_date_index_order(sample):
+    index = indexes.DateIndex(sample.store)
+    dates = [sample.store.dates[row] for row in index.all.rows]
+    assert dates == sorted(dates)
+    assert list(index.all.dates) == dates
+
+
+def test_date_index_partitions(sample):
+    index = indexes.DateIndex(sample.store)
+    debit = sample.store.type_names.codes['debit']
+    credit = sample.store.type_names.codes['credit']
+    assert len(index.types[debit]) == 4
+    assert len(index.types[credit]) == 2
+    assert len(index.find(ordinal(3, 1), ordinal(3, 31), {debit})) == 3
+    assert len(index.find(ordinal(3, 1), ordinal(3, 31), {debit, credit})) == 4
+    assert len(index.find(ordinal(3, 14), ordinal(3, 14))) == 2
+
+
+def test_date_index_empty_range(sample):
+    index = indexes.DateIndex(sample.store)
+    assert len(index.find(ordinal(4, 1), ordinal(4, 30))) == 0
+    assert len(index.find(ordinal(3, 1), ordinal(3, 31), {99})) == 0
+
+
+def test_date_partition_insert():
+    partition = indexes.DatePartition(indexes.array('i', [1, 3, 3, 5]), indexes.array('I', [0, 1, 2, 3]))
+    partition.insert(3, 4)
+    assert list(partition.rows) == [0, 1, 2, 4, 3]
+    assert list(partition.find(2, 4)) == [1, 2, 4]
+
+
+def test_group_index(sample):
+    store = sample.store
+    index = indexes.GroupIndex(store, 'categories', lambda code: [store.category_names.values[code]])
+    assert index.totals['Groceries'] == 4510 + 6240
+    assert len(index.rows['Paycheck']) == 2
+
+
+def test_group_index_many_groups(sample):
+    store = sample.store
+    index = indexes.GroupIndex(store, 'tags', lambda code: store.tag_names.values[code].split())
+    assert set(index.rows) == {'Keith', 'Lake', 'House', 'Eileen', 'Split'}
+    assert index.totals['Split'] == 3025
@@ -0,0 +1,63 @@
+'''
+Module to test the command line in the mint module.
+'''
+import mint
+
+
+def test_batch_commands(sample_file, capsys):
+    exit_code = mint.main(['--file', sample_file, '-c', 'dr 3/1/2017 3/31/2017', '-c', 'a', '-c', 'spending'])
+    out = capsys.readouterr().out
+    assert exit_code == mint.EXIT_OK
+    assert 'Accounts' in out
+    assert 'Wells Fargo' in out
+
+
+def test_batch_failures(sample_file, capsys):
+    exit_code = mint.main(['--file', sample_file, '-c', 'bogus', '-c', 'dr 3/1/2017', '-c', 'a'])
+    captured = capsys.readouterr()
+    assert exit_code == mint.EXIT_FAILED
+    assert 'Unrecognized command: bogus' in captured.err
+    assert 'Command failed: dr 3/1/2017' in captured.err
+    assert 'Accounts' in captured.out
+
+
+def test_batch_script(sample_file, tmp_path, capsys):
+    script = tmp_path / 'nightly.txt'
+    script.write_text('# nightly reports\n\ndr 3/1/2017 3/31/2017\ncat\nquit\nbogus\n')
+    exit_code = mint.main(['--file', sample_file, '--script', str(script)])
+    assert exit_code == mint.EXIT_OK
+    assert 'Mortgage & Rent' in capsys.readouterr().out
+
+
+def test_missing_file(tmp_path, capsys):
+    exit_code = mint.main(['--file', str(tmp_path / 'missing.csv'), '-c', 'a'])
+    assert exit_code == mint.EXIT_FAILED
+    assert 'Missing transaction file' in capsys.readouterr().err
+
+
+def test_unreadable_file(tmp_path, capsys):
+    data_file = tmp_path / 'bank.csv'
+    data_file.write_text('When,What,How Much\n3/1/2017,Coffee,4.50\n')
+    exit_code = mint.main(['--file', str(data_file), '-c', 'a'])
+    assert exit_code == mint.EXIT_FAILED
+    assert 'When' in capsys.readouterr().err
+
+    data_file.write_text('Date,Description,Original Description,Amount,Transaction Type,Category,Account Name,'
+                         'Labels,Notes\n3/32/2017,Coffee,COFFEE,4.50,debit,Coffee Shops,Visa,,\n')
+    exit_code = mint.main(['--file', str(data_file), '-c', 'a'])
+    assert exit_code == mint.EXIT_FAILED
+    assert '3/32/2017' in capsys.readouterr().err
+
+
+def test_file_that_is_not_text(tmp_path, capsys):
+    data_file = tmp_path / 'bank.csv'
+    data_file.write_bytes('Date,Description,Original Description,Amount,Transaction Type,Category,Account Name,'
+                          'Labels,Notes\n3/1/2017,Caf\xe9,CAF\xc9,4.50,debit,Coffee Shops,Visa,,\n'.encode('cp1252'))
+    exit_code = mint.main(['--file', str(data_file), '-c', 'a'])
+    assert exit_code == mint.EXIT_FAILED
+    assert 'codec' in capsys.readouterr().err
+
+    data_file.write_bytes(bytes(range(256)) * 4)
+    exit_code = mint.main(['--file', str(data_file), '-c', 'a'])
+    assert exit_code == mint.EXIT_FAILED
+    assert capsys.readouterr().err
@@ -0,0 +1,99 @@
+'''
+Module to test the instrumentation in the profiling module.
+'''
+import io
+import json
+import time
+import profiling
+import mint
+
+
+def test_nothing_measured():
+    assert profiling.command('cat') is profiling.NULL_STAGE
+    assert profiling.stage('filter') is profiling.NULL_STAGE
+    profiling.rows(10)
+
+
+def test_stages_are_exclusive():
+    recorder = profiling.Recorder()
+    with recorder.measure('cat groceries'):
+        with profiling.stage('load'):
+            time.sleep(0.01)
+            with profiling.stage('parse'):
+                time.sleep(0.02)
+                profiling.rows(100, 90)
+            profiling.rows(90)
+        with profiling.stage('render'):
+            pass
+
+    record = recorder.records[0]
+    assert record['command'] == 'cat'
+    assert record['params'] == 'groceries'
+    assert record['stages']['parse']['seconds'] >= 0.02
+    assert 0.01 <= record['stages']['load']['seconds'] < 0.02
+    assert record['stages']['parse']['rows_scanned'] == 100
+    assert record['stages']['parse']['rows_returned'] == 90
+    assert record['stages']['load']['rows_returned'] == 90
+    assert record['stages']['render']['calls'] == 1
+    assert sum(stage['seconds'] for stage in record['stages'].values()) <= record['seconds']
+    assert profiling.stage('load') is profiling.NULL_STAGE
+
+
+def test_transactions_are_instrumented(sample):
+    recorder = profiling.Recorder()
+    with recorder.measure('cat'):
+        debits = sample.get_transactions_by_type('debit')
+        sample.get_category_totals(sample.get_categories(debits))
+    stages = recorder.records[0]['stages']
+    assert stages['filter']['rows_returned'] == 3
+    assert stages['group']['rows_scanned'] == 3
+    assert stages['group']['rows_returned'] == 3
+
+
+def test_profile_and_memory():
+    recorder = profiling.Recorder(profile=True, trace_memory=True)
+    with recorder.measure('spending'):
+        sorted(str(number) for number in range(10000))
+    record = recorder.records[0]
+    assert len(record['profile']) > 0
+    assert record['memory']['peak_kb'] > 0
+
+
+def test_failed_command():
+    recorder = profiling.Recorder()
+    try:
+        with recorder.measure('dr 3/1/2017'):
+            raise IndexError('list index out of range')
+    except IndexError:
+        pass
+    assert 'IndexError' in recorder.records[0]['error']
+
+
+def test_summarize():
+    records = [{'command': 'cat', 'seconds': 0.3, 'other_seconds': 0.1,
+                'stages': {'filter': {'seconds': 0.2, 'calls': 1, 'rows_scanned': 10, 'rows_returned': 5}}},
+               {'command': 'cat', 'seconds': 0.5, 'other_seconds': 0.1,
+                'stages': {'filter': {'seconds': 0.4, 'calls': 1, 'rows_scanned': 10, 'rows_returned': 5}}}]
+    summary = profiling.summarize(records)
+    assert [(group['command'], group['stage']) for group in summary] == \
+        [('cat', 'filter'), ('cat', 'other'), ('cat', 'total')]
+    assert summary[0]['runs'] == 2
+    assert round(summary[0]['mean_seconds'], 6) == 0.3
+    assert summary[0]['max_seconds'] == 0.4
+    assert summary[0]['rows_scanned'] == 20
+
+    out = io.StringIO()
+    profiling.print_summary(summary, out)
+    assert 'filter' in out.getvalue()
+
+
+def test_timing_option(sample_file, tmp_path, capsys):
+    timing_file = tmp_path / 'timings.jsonl'
+    exit_code = mint.main(['--file', sample_file, '--timing', str(timing_file),
+                           '-c', 'dr 3/1/2017 3/31/2017', '-c', 'spending'])
+    capsys.readouterr()
+    assert exit_code == mint.EXIT_OK
+    records = [json.loads(line) for line in timing_file.read_text().splitlines()]
+    assert [record['command'] for record in records] == ['load', 'dr', 'spending']
+    assert records[2]['stages']['render']['calls'] > 0
+    assert profiling.command('cat') is profiling.NULL_STAGE
@@ -0,0 +1,109 @@
+'''
+Module to test the query planner and executor in the queries module.
+'''
+import datetime
+import pytest
+import queries
+import profiling
+import convert
+
+
+def test_category_totals_from_cube(sample):
+    query = queries.Query(tran_type='debit', start_date=datetime.date(2017, 3, 1), end_date=datetime.date(2017, 3, 31),
+                          group_by='category', aggregates=('sum', 'count'))
+    assert query.plan(sample).access == 'cube'
+    assert query.run(sample) == {'Gas & Fuel': {'sum': 30.25, 'count': 1},
+                                 'Groceries': {'sum': 45.10, 'count': 1},
+                                 'Mortgage & Rent': {'sum': 1500.00, 'count': 1}}
+
+
+def test_date_range_pushed_down(sample):
+    query = queries.Query(tran_type='debit', start_date=datetime.date(2017, 3, 15), end_date=datetime.date(2017, 3, 31),
+                          group_by='category')
+    plan = query.plan(sample)
+    assert plan.access == 'date'
+    assert len(plan.rows) == 1
+    assert plan.checks == []
+    assert query.run(sample) == {'Groceries': {'sum': 45.10}}
+
+
+def test_several_dimensions(sample):
+    totals = sample.query(('category', 'month'), queries.AGGREGATES, tran_type='debit')
+    assert list(totals) == [('Gas & Fuel', 201703), ('Groceries', 201702), ('Groceries', 201703),
+                            ('Mortgage & Rent', 201703)]
+    assert totals[('Groceries', 201702)] == {'sum': 62.40, 'count': 1, 'avg': 62.40, 'min': 62.40, 'max': 62.40}
+    totals = sample.query(('type',), ('count', 'avg', 'min', 'max'))
+    assert totals['credit'] == {'count': 2, 'avg': 2500.00, 'min': 2500.00, 'max': 2500.00}
+    assert sample.query() == {(): {'sum': 6637.75}}
+
+
+def test_tags(sample):
+    query = queries.Query(tag='split', group_by='account', aggregates='count')
+    assert query.plan(sample).access == 'tag'
+    assert query.run(sample) == {'Visa': {'count': 1}}
+    assert list(sample.query('tag')) == ['Eileen', 'Keith', 'Lake House', 'Split']
+    assert sample.query('tag', tran_type='debit', account='Visa') == \
+        {'Eileen': {'sum': 30.25}, 'Keith': {'sum': 45.10}, 'Split': {'sum': 30.25}}
+
+
+def test_select(sample):
+    rows = sample.select(min_amount=40, max_amount=100)
+    assert [transaction.amount for transaction in rows] == [62.40, 45.10]
+    assert rows.in_date_order
+    rows = sample.select(account=['visa', 'amex'], category='groceries')
+    assert [transaction.transaction_date for transaction in rows] == [datetime.date(2017, 2, 27), datetime.date(2017, 3, 15)]
+    assert len(sample.select(category='No Such Category')) == 0
+
+
+def test_single_pass(sample):
+    recorder = profiling.Recorder()
+    with recorder.measure('query'):
+        sample.query(('category',), ('sum',), tran_type='debit', start_date=datetime.date(2017, 3, 10),
+                     max_amount=100)
+    stages = recorder.records[0]['stages']
+    assert stages['group']['calls'] == 1
+    assert stages['group']['rows_scanned'] == 3
+    assert stages['group']['rows_returned'] == 2
+
+
+def test_unknown_names():
+    with pytest.raises(ValueError):
+        queries.Query(group_by='week')
+    with pytest.raises(ValueError):
+        queries.Query(aggregates=('median',))
+
+
+def matches(transaction, start_date, tran_type, category, min_amount):
+    return ((start_date is None or transaction.transaction_date >= start_date)
+            and (tran_type is None or transaction.transaction_type == tran_type)
+            and (category is None or transaction.category == category)
+            and (min_amount is None or transaction.amount >= min_amount))
+
+
+@pytest.mark.parametrize('start_date, tran_type, category, min_amount', [
+    (None, None, None, None),
+    (None, 'debit', None, None),
+    (datetime.date(2016, 1, 1), None, 'Groceries', None),
+    (datetime.date(2016, 6, 17), 'debit', None, 50),
+    (None, 'credit', 'Paycheck', 100),
+])
+def test_matches_plain_loop(transactions, start_date, tran_type, category, min_amount):
+    totals = dict()
+    for transaction in transactions.transaction_list:
+        if matches(transaction, start_date, tran_type, category, min_amount):
+            key = (transaction.account_name, transaction.transaction_type)
+            totals[key] = totals.get(key, 0) + transaction.cents
+
+    results = transactions.query(('account', 'type'), ('sum',), start_date=start_date, tran_type=tran_type,
+                                 category=category, min_amount=min_amount)
+    assert results == {key: {'sum': convert.to_dollars(totals[key])} for key in sorted(totals)}
+
+
+def test_running_range(transactions):
+    amounts = dict()
+    for transaction in transactions.transaction_list:
+        amounts.setdefault(transaction.transaction_date.year * 100 + transaction.transaction_date.month, []).append(
+            transaction.amount)
+    results = transactions.query('month', ('count', 'min', 'max'))
+    assert results == {month: {'count': len(amounts[month]), 'min': min(amounts[month]), 'max': max(amounts[month])}
+                       for month in sorted(amounts)}
@@ -1,3 +1,4 @@
+import io
 import datetime
 import calendar
 import pytest
@@ -70,4 +71,78 @@ def test_print_category_comparison(transactions, previous_month, current_month):
     reports.print_category_comparison(previous_month_totals, current_month_totals)
     assert current_month_totals != None
     assert previous_month_totals != None
-    
\ No newline at end of file
+    
+
+def test_pad():
+    assert reports.pad('abc', 5) == 'abc  '
+    assert reports.pad('abcdef', 3) == 'abc'
+    assert reports.pad(datetime.date(2017, 3, 1), 12) == '2017-03-01  '
+
+
+def test_table():
+    table = reports.Table([reports.Column('Name', 6), reports.Column('Amount', 12, reports.money)])
+    assert table.headings == 'Name  Amount      '
+    assert table.row(('Groceries', 1234.5)) == 'Grocer$ 1,234.50  '
+    assert table.rows([('a', 1), ('b', 2)]) == ['a     $     1.00  ', 'b     $     2.00  ']
+
+
+class CountingWriter(io.StringIO):
+    ''' StringIO that counts calls to write. '''
+
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        return super().write(text)
+
+
+def test_print_transactions_to_file(sample):
+    out = CountingWriter()
+    debits = sample.get_transactions_by_type('debit')
+    reports.print_transactions('Debits', debits, out)
+    lines = out.getvalue().split('\n')
+    assert out.writes == 1
+    assert lines[2] == 'Debits'
+    assert lines[4].startswith('Date           Description')
+    assert lines[5].startswith('2017-03-14     Wells Fargo')
+    assert lines[5].endswith('$ 1,500.00          ')
+
+
+def test_print_daily_spending_to_file(sample):
+    out = io.StringIO()
+    reports.print_daily_spending(sample.get_daily_spending(), out)
+    assert 'Total          $ 1,575.35' in out.getvalue()
+
+
+def test_print_transactions_leaves_list_alone(sample):
+    transactions = list(reversed(sample.transaction_list))
+    before = list(transactions)
+    out = io.StringIO()
+    reports.print_transactions('All', transactions, out)
+    assert transactions == before
+    assert out.getvalue().split('\n')[5].startswith('2017-02-03')
+
+
+def test_print_transactions_limit_offset(sample):
+    out = io.StringIO()
+    reports.print_transactions('All', sample.all_rows(), out, limit=2, offset=1)
+    rows = out.getvalue().split('\n')[5:-1]
+    assert [row[0:10] for row in rows] == ['2017-02-27', '2017-03-10']
+
+
+def test_page_transactions(sample):
+    out = CountingWriter()
+    answers = iter(['', 'q'])
+    prompts = []
+
+    def ask(prompt):
+        prompts.append(prompt)
+        return next(answers)
+
+    shown = reports.page_transactions('All', sample.all_rows(), 2, out, ask)
+    assert shown == 4
+    assert out.writes == 2
+    assert prompts[0].startswith('2 of 6 shown.')
+    assert reports.page_transactions('All', sample.all_rows(), 10, io.StringIO(), ask) == 6
@@ -0,0 +1,75 @@
+'''
+Module to test the search module.
+'''
+import sys
+import search
+
+
+NAMES = ['Groceries', 'Mortgage & Rent', 'Gas & Fuel', 'Rental Car & Taxi', 'Home Improvement', 'Rent']
+
+
+def test_trigrams():
+    assert search.trigrams('rent') == {'ren', 'ent'}
+    assert search.trigrams('re') == set()
+
+
+def test_candidates():
+    index = search.NameIndex(NAMES)
+    assert {index.names[i] for i in index.candidates('rent')} == {'Mortgage & Rent', 'Rental Car & Taxi', 'Rent'}
+    assert index.candidates('zzz') == set()
+    assert len(index.candidates('g')) == len(NAMES)
+
+
+def test_search_ranking():
+    index = search.NameIndex(NAMES)
+    assert index.search('rent') == ['Rent', 'Rental Car & Taxi', 'Mortgage & Rent']
+
+
+def test_search_regex():
+    index = search.NameIndex(NAMES)
+    assert index.search('^g') == ['Groceries', 'Gas & Fuel']
+    assert index.search('(fuel|taxi)$') == ['Gas & Fuel', 'Rental Car & Taxi']
+    assert search.compile_pattern.cache_info().currsize > 0
+
+
+def test_search_no_match():
+    index = search.NameIndex(NAMES)
+    assert index.search('zzzzz') == []
+
+
+def test_name_index_grows():
+    index = search.NameIndex(['Groceries'])
+    index.extend(['Gifts'])
+    assert 'Gifts' in index
+    assert index.search('gif') == ['Gifts']
+
+
+def test_words():
+    assert search.words('AMAZON.COM*MK1 Amzn_Mktp') == ['amazon', 'com', 'mk1', 'amzn', 'mktp']
+
+
+def test_text_index_find(sample):
+    index = search.TextIndex(sample.store)
+    assert len(index.find('stop shop')) == 2
+    assert len(index.find('payroll')) == 2
+    assert len(index.find('mar')) == 1
+    assert len(index.find('she')) == 1
+    assert len(index.find('stop payroll')) == 0
+    assert len(index.find('  ')) == 0
+
+
+def test_text_index_saved(sample, sample_file):
+    key = ['a', 'b', len(sample.store)]
+    index = search.TextIndex(sample.store)
+    assert search.save_text_index(sample_file, index, key)
+    loaded = search.load_text_index(sample_file, sample.store, key)
+    assert loaded.postings == index.postings
+    assert list(loaded.find('shop')) == list(index.find('shop'))
+    assert search.load_text_index(sample_file, sample.store, ['c', 'd', 1]) is None
+
+
+def test_text_index_other_byteorder(sample, sample_file, monkeypatch):
+    key = ['a', 'b', len(sample.store)]
+    assert search.save_text_index(sample_file, search.TextIndex(sample.store), key)
+    monkeypatch.setattr(sys, 'byteorder', 'big' if sys.byteorder == 'little' else 'little')
+    assert search.load_text_index(sample_file, sample.store, key) is None
@@ -0,0 +1,156 @@
+'''
+Module to test the server module.
+'''
+import json
+import time
+import threading
+import http.client
+import urllib.request
+import pytest
+import server
+
+
+MARCH = {'start': '3/1/2017', 'end': '3/31/2017'}
+
+
+def query(service, **request):
+    return json.loads(service.query(request).decode('utf-8'))['result']
+
+
+def test_answers(sample_file):
+    service = server.QueryService(sample_file)
+    accounts = query(service, command='a')
+    assert sorted(row[0] for row in accounts['rows']) == ['Amex', 'Checking', 'Visa']
+
+    categories = query(service, command='cat', **MARCH)
+    assert categories['rows'][0] == ['Mortgage & Rent', 1500.0]
+
+    spending = query(service, command='spending', limit=1, offset=1, **MARCH)
+    assert spending['count'] == 3
+    assert len(spending['rows']) == 1
+    assert spending['rows'][0][0:2] == ['2017-03-14', 'Shell']
+
+    matches = query(service, command='cat gro', **MARCH)['matches']
+    assert [match['match'] for match in matches] == ['Groceries']
+
+    found = query(service, command='find payroll')
+    assert found['count'] == 2
+    assert found['credits'] == 5000.0
+
+    trend = query(service, command='trend 2', **MARCH)
+    assert trend['months'] == ['2017-02', '2017-03']
+    assert trend['trend']['Groceries'] == [62.4, 45.1]
+
+
+def test_bad_requests(sample_file):
+    service = server.QueryService(sample_file)
+    with pytest.raises(server.BadRequest):
+        service.query({'command': 'bogus'})
+    with pytest.raises(server.BadRequest):
+        service.query({'command': 'day', 'start': 'bad'})
+    for start in ('3/1', '2017', ' ', '13/45/2017'):
+        with pytest.raises(server.BadRequest):
+            service.query({'command': 'day', 'start': start})
+    with pytest.raises(server.BadRequest):
+        service.query({'command': 'spending', 'limit': 'ten'})
+    with pytest.raises(server.BadRequest):
+        service.query({'command': 'find'})
+
+
+def test_cache_and_refresh(sample_file):
+    service = server.QueryService(sample_file)
+    first = service.query(dict(command='spending', **MARCH))
+    assert service.query(dict(command='spending', **MARCH)) is first
+    assert service.refresh() == 0
+    assert service.query(dict(command='spending', **MARCH)) is first
+
+    with open(sample_file, 'a') as fhand:
+        fhand.write('"3/20/2017","Target","TARGET 0042","19.99","debit","Shopping","Visa","",""\n')
+    assert query(service, command='lf')['added'] == 1
+    assert query(service, command='spending', **MARCH)['count'] == 4
+
+
+def test_http(sample_file):
+    service = server.QueryService(sample_file)
+    httpd = server.QueryServer(('127.0.0.1', 0), service, threads=2)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    url = 'http://127.0.0.1:' + str(httpd.server_address[1]) + '/'
+    try:
+        request = urllib.request.Request(url, data=json.dumps(dict(command='day', **MARCH)).encode('utf-8'))
+        with urllib.request.urlopen(request) as response:
+            days = json.loads(response.read().decode('utf-8'))['result']
+        assert days['rows'] == [['2017-03-14', 1530.25], ['2017-03-15', 45.1]]
+
+        with urllib.request.urlopen(url + '?command=help') as response:
+            assert 'cat' in json.loads(response.read().decode('utf-8'))['result']['commands']
+
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(url + '?command=bogus')
+        assert error.value.code == 400
+
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(url + '?command=day&start=3/1')
+        assert error.value.code == 400
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_watcher(sample_file):
+    service = server.QueryService(sample_file, watch_interval=0.01)
+    assert query(service, command='find target')['count'] == 0
+    service.start_watching()
+    try:
+        with open(sample_file, 'a') as fhand:
+            fhand.write('"3/20/2017","Target","TARGET 0042","19.99","debit","Shopping","Visa","",""\n')
+        for _ in range(500):
+            if query(service, command='find target')['count'] == 1:
+                break
+            threading.Event().wait(0.01)
+        assert query(service, command='find target')['count'] == 1
+        assert len(service.transactions.store) == 7
+    finally:
+        service.stop_watching()
+
+
+def test_idle_connections(sample_file):
+    service = server.QueryService(sample_file)
+    httpd = server.QueryServer(('127.0.0.1', 0), service, threads=2, idle_timeout=0.2)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    port = httpd.server_address[1]
+    idle = []
+    try:
+        # More idle keep-alive clients than threads.
+        for _ in range(3):
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/?command=help')
+            assert connection.getresponse().read()
+            idle.append(connection)
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+        connection.request('GET', '/?command=help')
+        assert connection.getresponse().status == 200
+        connection.close()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        for connection in idle:
+            connection.close()
+
+
+def test_close_with_idle_connection(sample_file):
+    service = server.QueryService(sample_file)
+    httpd = server.QueryServer(('127.0.0.1', 0), service, threads=2, idle_timeout=60)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    connection = http.client.HTTPConnection('127.0.0.1', httpd.server_address[1], timeout=5)
+    try:
+        connection.request('GET', '/?command=help')
+        assert connection.getresponse().read()
+        started = time.monotonic()
+        httpd.shutdown()
+        httpd.server_close()
+        assert time.monotonic() - started < 5
+    finally:
+        connection.close()
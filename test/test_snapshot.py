@@ -0,0 +1,61 @@
+'''
+Module to test the snapshot module.
+'''
+import os
+import data
+import snapshot
+
+
+def test_snapshot_written(sample_file):
+    data.Transactions(sample_file)
+    assert os.path.isfile(snapshot.snapshot_path(sample_file))
+
+
+def test_snapshot_loaded(sample_file):
+    parsed = data.Transactions(sample_file)
+    cached = data.Transactions(sample_file)
+    assert isinstance(cached.store.dates, memoryview)
+    assert cached.count == parsed.count
+    assert list(cached.store.cents) == list(parsed.store.cents)
+    assert list(cached.store.descriptions) == list(parsed.store.descriptions)
+    assert cached.store.category_names.values == parsed.store.category_names.values
+    assert cached.get_accounts() == parsed.get_accounts()
+
+
+def test_snapshot_not_used(sample_file):
+    transactions = data.Transactions(sample_file, use_snapshot=False)
+    assert not os.path.exists(snapshot.snapshot_path(sample_file))
+    assert isinstance(transactions.store.dates, data.array)
+
+
+def test_snapshot_rebuilt_when_file_changes(sample_file):
+    data.Transactions(sample_file)
+    with open(sample_file, 'a') as fhand:
+        fhand.write('"3/20/2017","Shell","SHELL OIL 5511","20.00","debit","Gas & Fuel","Visa","",""\n')
+    transactions = data.Transactions(sample_file)
+    assert transactions.count == 8
+    assert isinstance(transactions.store.dates, data.array)
+
+
+def test_snapshot_used_when_only_touched(sample_file):
+    data.Transactions(sample_file)
+    stat = os.stat(sample_file)
+    os.utime(sample_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5000000000))
+    transactions = data.Transactions(sample_file)
+    assert isinstance(transactions.store.dates, memoryview)
+    header = snapshot.read_header(snapshot.snapshot_path(sample_file))
+    assert header['source'] == snapshot.source_key(sample_file)
+
+
+def test_snapshot_ignores_bad_file(sample_file):
+    with open(snapshot.snapshot_path(sample_file), 'wb') as fhand:
+        fhand.write(b'not a snapshot')
+    transactions = data.Transactions(sample_file)
+    assert len(transactions.store) == 6
+
+
+def test_string_column():
+    blob, offsets = snapshot.encode_strings(['a', '', 'café'])
+    column = snapshot.StringColumn(memoryview(blob), offsets)
+    assert list(column) == ['a', '', 'café']
+    assert column[-1] == 'café'
@@ -0,0 +1,143 @@
+'''
+Module to test the parser registry in the sources module.
+'''
+import csv
+import datetime
+import multiprocessing
+import pytest
+import data
+import sources
+
+
+CHASE_LINES = [
+    'Transaction Date,Post Date,Description,Category,Type,Amount,Memo',
+    '03/20/2017,03/21/2017,SHELL OIL 5511,Gas,Sale,-20.00,',
+    '03/16/2017,03/17/2017,STOP & SHOP 0123,Groceries,Sale,-12.34,weekly shop',
+    '03/18/2017,03/18/2017,Payment Thank You-Mobile,,Payment,500.00,',
+]
+
+
+def write_lines(path, lines):
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+def header(lines):
+    return next(csv.reader(lines[0:1]))
+
+
+def test_detect(sample_lines):
+    assert sources.detect(header(sample_lines)) is sources.MINT
+    assert sources.detect(header(CHASE_LINES)) is sources.CHASE
+    with pytest.raises(sources.UnknownFileFormat):
+        sources.detect(['When', 'What', 'How Much'])
+    with pytest.raises(sources.UnknownFileFormat):
+        sources.parser_for(header(sample_lines), 'no such bank')
+
+
+def test_compiled_once(sample_lines):
+    parser = sources.parser_for(header(sample_lines))
+    assert sources.parser_for(header(sample_lines)) is parser
+    assert parser.positions['amount'] == 3
+    assert sources.parser_for(header(CHASE_LINES)) is not parser
+
+
+def test_chase_signs(tmp_path):
+    transactions = data.Transactions(write_lines(tmp_path / 'chase.csv', CHASE_LINES), use_snapshot=False)
+    store = transactions.store
+    assert list(store.cents) == [2000, 1234, 50000]
+    assert [store.type_names.values[code] for code in store.types] == ['debit', 'debit', 'credit']
+    assert list(store.notes) == ['', 'weekly shop', '']
+    assert list(store.original_descriptions) == list(store.descriptions)
+    assert transactions.get_accounts() == {'Chase': 532.34}
+
+
+def test_transaction_from_line(sample_lines):
+    parser = sources.parser_for(header(CHASE_LINES))
+    transaction = data.Transaction(next(csv.reader(CHASE_LINES[1:2])), parser)
+    assert transaction.transaction_date == datetime.date(2017, 3, 20)
+    assert transaction.amount == 20.0
+    assert transaction.transaction_type == 'debit'
+    assert transaction.account_name == 'Chase'
+    transaction = data.Transaction(next(csv.reader(sample_lines[1:2])))
+    assert transaction.category == 'Groceries'
+
+
+def test_register(tmp_path):
+    sources.register(sources.Source('test bank', {'date': 'posted', 'description': 'payee',
+                                                    'amount': ['amount', 'value']},
+                                      date_format='yyyy/mm/dd', sign=sources.POSITIVE_DEBITS,
+                                      defaults={'account_name': 'Savings', 'category': 'Uncategorized'}))
+    try:
+        data_file = write_lines(tmp_path / 'bank.csv', ['Posted,Payee,Value', '2017-03-05,Coffee,4.50',
+                                                        '2017-03-06,Interest,-1.25'])
+        transactions = data.Transactions(data_file, use_snapshot=False)
+        assert transactions.ingest_state['format'] == 'test bank'
+        assert list(transactions.store.cents) == [450, 125]
+        assert transactions.get_accounts() == {'Savings': 5.75}
+    finally:
+        del sources.SOURCES['test bank']
+
+    with pytest.raises(ValueError):
+        sources.Source('bad', {'date': 'date'}, sign='sideways')
+    with pytest.raises(ValueError):
+        sources.Source('bad', {'when': 'date'})
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_load_mixed_formats(tmp_path, workers, sample_lines):
+    data_files = [write_lines(tmp_path / 'mint.csv', sample_lines), write_lines(tmp_path / 'chase.csv', CHASE_LINES)]
+    transactions = data.Transactions(data_files, workers=workers)
+    assert len(transactions.store) == len(sample_lines) - 2 + len(CHASE_LINES) - 1
+    accounts = transactions.get_accounts()
+    assert accounts['Chase'] == 532.34
+    assert accounts['Visa'] == 75.35
+
+
+def test_named_format(tmp_path):
+    data_file = write_lines(tmp_path / 'chase.csv', CHASE_LINES)
+    with pytest.raises(sources.UnknownFileFormat):
+        data.Transactions(data_file, use_snapshot=False, file_format='mint')
+    transactions = data.Transactions(data_file, file_format='chase')
+    assert data.Transactions(data_file, file_format='chase').store.buffer is not None
+    assert len(transactions.store) == 3
+
+
+def test_refresh_other_format(tmp_path):
+    data_file = write_lines(tmp_path / 'chase.csv', CHASE_LINES)
+    transactions = data.Transactions(data_file, use_snapshot=False)
+    with open(data_file, 'a') as fhand:
+        fhand.write('03/22/2017,03/23/2017,SHELL OIL 5511,Gas,Sale,-15.00,\n')
+    assert transactions.refresh() == 1
+    assert list(transactions.store.cents) == [2000, 1234, 50000, 1500]
+
+
+def test_bad_dates(tmp_path):
+    data_file = write_lines(tmp_path / 'chase.csv', CHASE_LINES)
+    transactions = data.Transactions(data_file, use_snapshot=False)
+    for bad_line in [',,NO DATE,Gas,Sale,-1.00,', '3/32,03/26/2017,SHELL OIL 5511,Gas,Sale,-5.00,']:
+        # The file is reordered so that refresh merges it line by line.
+        write_lines(tmp_path / 'chase.csv', CHASE_LINES[0:1] + [bad_line] + list(reversed(CHASE_LINES[1:])))
+        with pytest.raises(sources.InvalidDate):
+            transactions.refresh()
+        with pytest.raises(sources.InvalidDate):
+            data.Transactions(data_file, use_snapshot=False)
+    assert len(transactions.store) == 3
+
+
+@pytest.mark.parametrize('start_method', ['fork', 'spawn'])
+def test_registered_in_workers(tmp_path, start_method):
+    if start_method not in multiprocessing.get_all_start_methods():
+        pytest.skip(start_method + ' is not available')
+    sources.register(sources.Source('test bank', {'date': 'posted', 'description': 'payee', 'amount': 'amt'},
+                                    sign=sources.NEGATIVE_DEBITS))
+    default_method = multiprocessing.get_start_method()
+    multiprocessing.set_start_method(start_method, force=True)
+    try:
+        data_files = [write_lines(tmp_path / 'one.csv', ['posted,payee,amt', '03/05/2017,Coffee,-4.50']),
+                      write_lines(tmp_path / 'two.csv', ['posted,payee,amt', '03/06/2017,Refund,1.25'])]
+        transactions = data.Transactions(data_files, use_snapshot=False, workers=2)
+        assert list(transactions.store.cents) == [450, 125]
+    finally:
+        multiprocessing.set_start_method(default_method, force=True)
+        del sources.SOURCES['test bank']
@@ -0,0 +1,60 @@
+'''
+Module to test the stream module.
+'''
+import datetime
+import pytest
+import data
+import sources
+import stream
+
+
+def test_read_stores(sample_file):
+    chunks = list(stream.read_stores(sample_file, chunk_size=3))
+    assert [line_count for _, line_count in chunks] == [3, 3, 1]
+    assert sum(len(store) for store, _ in chunks) == 6
+
+
+def test_iter_transactions(sample_file):
+    credits = list(stream.iter_transactions(sample_file, 'credit', chunk_size=2))
+    assert [t.transaction_date for t in credits] == [datetime.date(2017, 3, 10), datetime.date(2017, 2, 3)]
+
+
+def test_aggregate_matches_transactions(sample_file, sample):
+    totals = stream.aggregate(sample_file, sample.start_date, sample.end_date, chunk_size=2)
+    debits = sample.get_transactions_by_type('debit')
+    assert totals.categories == sample.get_category_totals(sample.get_categories(debits))
+    assert totals.days == sample.get_daily_spending()
+    assert totals.rows_read == 7
+    assert totals.rows_matched == len(debits)
+    assert totals.accounts == sample.get_accounts()
+
+
+def test_aggregate_accounts(sample_file, sample):
+    totals = stream.aggregate(sample_file)
+    assert totals.accounts == sample.get_accounts()
+
+
+def test_aggregate_missing_file():
+    with pytest.raises(data.MissingTransactionFile):
+        stream.aggregate('does_not_exist.csv')
+
+
+def test_named_format(tmp_path, sample_file):
+    with pytest.raises(sources.UnknownFileFormat):
+        stream.aggregate(sample_file, file_format='chase')
+    with pytest.raises(sources.UnknownFileFormat):
+        list(stream.iter_transactions(sample_file, file_format='chase'))
+
+    data_file = tmp_path / 'bank.csv'
+    data_file.write_text('Date,Payee,Amount\n03/05/2017,Coffee,-4.50\n03/06/2017,Refund,1.25\n')
+    sources.register(sources.Source('test bank', {'date': 'date', 'description': 'payee', 'amount': 'amount'},
+                                    sign=sources.NEGATIVE_DEBITS, defaults={'account_name': 'Checking'}))
+    try:
+        totals = stream.aggregate(str(data_file), file_format='test bank')
+        assert totals.categories == {'': 4.5}
+        assert totals.rows_matched == 1
+        assert totals.accounts == {'Checking': 5.75}
+        credits = list(stream.iter_transactions(str(data_file), 'credit', file_format='test bank'))
+        assert [t.description for t in credits] == ['Refund']
+    finally:
+        del sources.SOURCES['test bank']